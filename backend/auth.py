@@ -1,11 +1,20 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from gotrue.types import User # Keep User type for annotation
 import jwt # Import PyJWT
 import os
+import hashlib
+import json
+import secrets
+import threading
+import time
+import redis
+from collections import OrderedDict
 from dotenv import load_dotenv
 from typing import Optional
 
+from redis_client import async_redis_client
+
 # We don't need the supabase client here directly for JWT validation
 # from supabase_client import supabase
 
@@ -18,8 +27,69 @@ if not SUPABASE_JWT_SECRET:
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token") # Dummy tokenUrl
 
+# --- Verified Token Cache ---
+# Polling clients send the same bearer token every few seconds, so verified payloads are
+# kept (keyed by a digest of the token, never the token itself) until the token expires.
+# Tokens that failed verification are remembered briefly so retries don't re-verify either.
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+TOKEN_CACHE_NEGATIVE_TTL = 10 # seconds
+TOKEN_CACHE_NO_EXP_TTL = 300 # seconds, for tokens without an `exp` claim
+
+# digest -> (expires_at, payload or None, HTTPException or None)
+_token_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+_token_cache_stats = {"hits": 0, "misses": 0, "negative_hits": 0}
+
+def token_cache_stats() -> dict:
+    """Returns hit/miss counters and the current size of the verified-token cache."""
+    with _token_cache_lock:
+        return dict(_token_cache_stats, size=len(_token_cache))
+
+def _cache_token_result(digest: str, expires_at: float, payload: Optional[dict], error: Optional[HTTPException]):
+    with _token_cache_lock:
+        _token_cache[digest] = (expires_at, payload, error)
+        _token_cache.move_to_end(digest)
+        while len(_token_cache) > TOKEN_CACHE_MAX_ENTRIES:
+            _token_cache.popitem(last=False)
+
 def decode_jwt(token: str) -> Optional[dict]:
-    """Decodes the JWT using the project's secret and validates audience."""
+    """
+    Decodes the JWT using the project's secret and validates audience.
+    Results are served from the verified-token cache when possible; errors are identical either way.
+    """
+    digest = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    now = time.time()
+    with _token_cache_lock:
+        cached = _token_cache.get(digest)
+        if cached and cached[0] > now:
+            _token_cache.move_to_end(digest)
+            expires_at, payload, error = cached
+            if error is None:
+                _token_cache_stats["hits"] += 1
+                return dict(payload)
+            _token_cache_stats["negative_hits"] += 1
+        else:
+            if cached:
+                # Expired entry: drop it and let jwt.decode produce the exact error
+                del _token_cache[digest]
+            _token_cache_stats["misses"] += 1
+            error = None
+    if error is not None:
+        raise HTTPException(status_code=error.status_code, detail=error.detail, headers=error.headers)
+
+    try:
+        payload = _verify_jwt(token)
+    except HTTPException as e:
+        if e.status_code == status.HTTP_401_UNAUTHORIZED:
+            # Deterministic verification failure - safe to remember for a moment
+            _cache_token_result(digest, now + TOKEN_CACHE_NEGATIVE_TTL, None, e)
+        raise
+    exp = payload.get("exp")
+    expires_at = float(exp) if isinstance(exp, (int, float)) else now + TOKEN_CACHE_NO_EXP_TTL
+    _cache_token_result(digest, expires_at, dict(payload), None)
+    return payload
+
+def _verify_jwt(token: str) -> dict:
     try:
         # Explicitly verify the audience expected for Supabase authenticated users
         payload = jwt.decode(
@@ -87,4 +157,56 @@ async def get_current_user_id(payload: dict = Depends(get_current_user)) -> str:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not extract user ID from token",
         )
-    return user_id 
\ No newline at end of file
+    return user_id
+
+# --- Event Stream Tickets ---
+# Browsers' EventSource can't send an Authorization header, and a bearer token in the URL would
+# end up in access, proxy and CDN logs. So an authenticated POST issues a short-lived ticket for
+# one job's stream; only that goes in the query string, and it is spent on first use.
+STREAM_TICKET_TTL = 30 # seconds
+STREAM_TICKET_PREFIX = "stream_ticket"
+
+def _stream_ticket_key(ticket: str) -> str:
+    # Keyed by a digest so the tickets themselves never sit in Redis
+    return f"{STREAM_TICKET_PREFIX}:{hashlib.sha256(ticket.encode('utf-8')).hexdigest()}"
+
+async def issue_stream_ticket(user_id: str, job_id: str) -> str:
+    """Returns a single-use ticket that lets `user_id` open the status stream of `job_id`."""
+    ticket = secrets.token_urlsafe(32)
+    grant = json.dumps({"user_id": user_id, "job_id": job_id})
+    await async_redis_client.set(_stream_ticket_key(ticket), grant, ex=STREAM_TICKET_TTL)
+    return ticket
+
+async def get_stream_user_id(job_id: str, ticket: str = Query(...)) -> str:
+    """
+    Dependency for the job status event stream: redeems the `ticket` query parameter
+    (see issue_stream_ticket) and returns the user it was issued to.
+    """
+    try:
+        grant = await async_redis_client.getdel(_stream_ticket_key(ticket))
+    except redis.exceptions.RedisError as e:
+        print(f"Redis error redeeming stream ticket for job {job_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Status stream unavailable - Redis error.",
+        )
+    grant = json.loads(grant) if grant else {}
+    if grant.get("job_id") != job_id or not grant.get("user_id"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired stream ticket",
+        )
+    return grant["user_id"]
+
+
+# Users allowed to call the /api/debug endpoints (comma-separated Supabase user IDs)
+ADMIN_USER_IDS = {uid.strip() for uid in os.getenv("ADMIN_USER_IDS", "").split(",") if uid.strip()}
+
+async def get_admin_user_id(user_id: str = Depends(get_current_user_id)) -> str:
+    """Like get_current_user_id, but only for users listed in ADMIN_USER_IDS."""
+    if user_id not in ADMIN_USER_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized.",
+        )
+    return user_id
@@ -17,54 +17,38 @@ load_dotenv()
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 MEME_JOB_STREAM = "meme_jobs"
+# Same lanes as job_streams.py, highest priority first, then the original stream
+JOB_STREAMS = [f"{MEME_JOB_STREAM}:{lane}" for lane in ("continue:paid", "new:paid", "continue:free", "new:free", "debug")] + [MEME_JOB_STREAM]
+JOB_INDEX_KEY = "job_index"
+JOBS_TO_SHOW = int(os.getenv("CHECK_REDIS_JOBS", "5"))
+JOB_PAGE_SIZE = 100
 
-if not REDIS_URL:
-    print("[ERROR] REDIS_URL environment variable not set")
-    sys.exit(1)
 
-print(f"[INFO] Using Redis URL: {REDIS_URL.replace('://', '://*:*@').split('@')[-1]}")
-
-try:
-    # Create Redis client
-    redis_client = redis.from_url(REDIS_URL, decode_responses=True)
-    
-    # Check Redis connection
-    if redis_client.ping():
-        print("[OK] Successfully connected to Redis")
-    else:
-        print("[ERROR] Redis connection failed")
-        sys.exit(1)
-    
-    # Check basic Redis info
-    redis_info = redis_client.info()
-    print(f"[INFO] Redis version: {redis_info.get('redis_version', 'unknown')}")
-    print(f"[INFO] Used memory: {redis_info.get('used_memory_human', 'unknown')}")
-    print(f"[INFO] Connected clients: {redis_info.get('connected_clients', 'unknown')}")
-    
-    # Check stream existence
+def check_stream(stream_name):
+    """Prints a stream's length, consumer groups/consumers and most recent entries."""
     try:
-        stream_info = redis_client.xinfo_stream(MEME_JOB_STREAM)
-        print(f"[OK] Stream '{MEME_JOB_STREAM}' exists with {stream_info.get('length', 0)} entries")
+        stream_info = redis_client.xinfo_stream(stream_name)
+        print(f"[OK] Stream '{stream_name}' exists with {stream_info.get('length', 0)} entries")
         
         # Check stream details
         print(f"[INFO] First entry ID: {stream_info.get('first-entry')[0] if stream_info.get('first-entry') else 'none'}")
         print(f"[INFO] Last entry ID: {stream_info.get('last-entry')[0] if stream_info.get('last-entry') else 'none'}")
         
         # Check consumer groups
-        consumer_groups = redis_client.xinfo_groups(MEME_JOB_STREAM)
+        consumer_groups = redis_client.xinfo_groups(stream_name)
         print(f"[INFO] Found {len(consumer_groups)} consumer group(s)")
         
         for group in consumer_groups:
             group_name = group.get('name', 'unknown')
-            print(f"[INFO] Consumer group: {group_name}, Pending: {group.get('pending', 0)}, Consumers: {group.get('consumers', 0)}")
+            print(f"[INFO] Consumer group: {group_name}, Pending: {group.get('pending', 0)}, Lag: {group.get('lag', 'n/a')}, Consumers: {group.get('consumers', 0)}")
             
             # Check consumers in this group
-            consumers = redis_client.xinfo_consumers(MEME_JOB_STREAM, group_name)
+            consumers = redis_client.xinfo_consumers(stream_name, group_name)
             for consumer in consumers:
                 print(f"    - Consumer: {consumer.get('name', 'unknown')}, Pending: {consumer.get('pending', 0)}, Idle: {consumer.get('idle', 0)}ms")
         
         # Get recent stream entries
-        stream_entries = redis_client.xrevrange(MEME_JOB_STREAM, count=5)
+        stream_entries = redis_client.xrevrange(stream_name, count=5)
         print(f"[INFO] Recent stream entries (up to 5):")
         
         for entry_id, entry_data in stream_entries:
@@ -78,23 +62,66 @@ try:
     
     except redis.exceptions.ResponseError as e:
         if "no such key" in str(e).lower():
-            print(f"[WARN] Stream '{MEME_JOB_STREAM}' does not exist yet")
+            print(f"[WARN] Stream '{stream_name}' does not exist yet")
         else:
             print(f"[ERROR] Error checking stream: {e}")
+
+if not REDIS_URL:
+    print("[ERROR] REDIS_URL environment variable not set")
+    sys.exit(1)
+
+print(f"[INFO] Using Redis URL: {REDIS_URL.replace('://', '://*:*@').split('@')[-1]}")
+
+try:
+    # Create Redis client
+    redis_client = redis.from_url(REDIS_URL, decode_responses=True)
     
-    # Check job status keys
-    job_status_keys = redis_client.keys("job_status:*")
-    print(f"[INFO] Found {len(job_status_keys)} job status keys")
+    # Check Redis connection
+    if redis_client.ping():
+        print("[OK] Successfully connected to Redis")
+    else:
+        print("[ERROR] Redis connection failed")
+        sys.exit(1)
     
-    # Show details for up to 5 most recent jobs
-    if job_status_keys:
-        for key in job_status_keys[:5]:
-            job_data = redis_client.hgetall(key)
-            job_id = key.split(":")[-1]
-            status = job_data.get('status', 'unknown')
-            stage = job_data.get('stage', 'unknown')
-            user_id = job_data.get('user_id', 'unknown')
-            print(f"    - Job ID: {job_id}, Status: {status}, Stage: {stage}, User: {user_id}")
+    # Check basic Redis info
+    redis_info = redis_client.info()
+    print(f"[INFO] Redis version: {redis_info.get('redis_version', 'unknown')}")
+    print(f"[INFO] Used memory: {redis_info.get('used_memory_human', 'unknown')}")
+    print(f"[INFO] Connected clients: {redis_info.get('connected_clients', 'unknown')}")
+    
+    # Check every job stream (one per lane, plus the original stream)
+    for stream_name in JOB_STREAMS:
+        check_stream(stream_name)
+
+    # Check dead-letter streams (entries that failed repeatedly)
+    for stream_name in JOB_STREAMS:
+        dead_letter_stream = f"{stream_name}:dead"
+        dead_letter_count = redis_client.xlen(dead_letter_stream)
+        if not dead_letter_count:
+            continue
+        print(f"[INFO] Dead-letter stream '{dead_letter_stream}' has {dead_letter_count} entries")
+        for entry_id, entry_data in redis_client.xrevrange(dead_letter_stream, count=5):
+            print(f"    - Entry ID: {entry_id}, Original ID: {entry_data.get('original_id', 'unknown')}, Deliveries: {entry_data.get('delivery_count', '?')}, Last error: {entry_data.get('last_error', 'unknown')}")
+
+    # Check job status entries through the creation-time index (KEYS would block Redis on a large keyspace)
+    job_count = redis_client.zcard(JOB_INDEX_KEY)
+    print(f"[INFO] Found {job_count} indexed jobs")
+
+    # Show details for the most recent jobs, one page at a time
+    offset = 0
+    while offset < min(job_count, JOBS_TO_SHOW):
+        page = redis_client.zrevrange(JOB_INDEX_KEY, offset, offset + min(JOB_PAGE_SIZE, JOBS_TO_SHOW - offset) - 1)
+        if not page:
+            break
+        pipe = redis_client.pipeline(transaction=False)
+        for job_id in page:
+            pipe.hmget(f"job_status:{job_id}", ["status", "stage", "user_id"])
+        for job_id, (status, stage, user_id) in zip(page, pipe.execute()):
+            if status is None and stage is None:
+                print(f"    - Job ID: {job_id}, Status expired")
+                continue
+            print(f"    - Job ID: {job_id}, Status: {status or 'unknown'}, Stage: {stage or 'unknown'}, User: {user_id or 'unknown'}")
+        offset += len(page)
     
     print("\n[INFO] Diagnostics completed successfully")
 
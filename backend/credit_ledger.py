@@ -0,0 +1,307 @@
+"""
+Credit ledger: per-user credit balances held in Redis and written back to Supabase.
+
+The Redis key `credits:{user_id}` is the authoritative balance once it exists.
+It is seeded from the user's `profiles` row (read from the database, not the profile
+cache, which may still hold a pre-purchase balance) the first time the ledger needs it.
+Each job holds a reservation in `credit_reservation:{job_id}`:
+  - reserve_credit() atomically checks and decrements the balance (Lua), once per job,
+  - commit_credit() makes the charge final when the job has produced its video,
+  - refund_credit() returns the credit if the job failed, at most once.
+Every balance change adds the user to the `credits:dirty` set. A CreditWriteBehind
+thread in each worker drains that set in batches and writes the current balances
+to `profiles.credits`, so jobs never wait on the database to charge a credit and
+parallel jobs of the same user can't overdraw or lose a deduction. A user's balance
+is only written by one flush at a time (`credits:flush_lock:{user_id}`), and a flush
+that finds the balance moved on while it was writing marks the user dirty again,
+so an older balance can never be the last one written.
+
+Code that sets `profiles.credits` directly (Stripe webhook, profile setup) must
+call set_credit_balance()/async_set_credit_balance() too, or the ledger would
+keep serving (and writing back) the old balance. Those set the key even if the
+user isn't loaded yet, so a seed that read the row before the update can't win.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Optional
+
+import redis
+from postgrest.exceptions import APIError
+
+from redis_client import redis_client, async_redis_client
+from supabase_client import supabase
+from profile_cache import invalidate_profile
+
+CREDIT_BALANCE_PREFIX = "credits"
+CREDIT_RESERVATION_PREFIX = "credit_reservation"
+CREDIT_DIRTY_SET = "credits:dirty"
+CREDIT_FLUSH_LOCK_PREFIX = "credits:flush_lock"
+# Reservations outlive any job by far; they only need to exist while the job can still be retried
+CREDIT_RESERVATION_TTL = 7 * 24 * 3600
+CREDIT_FLUSH_INTERVAL = float(os.getenv("CREDIT_FLUSH_INTERVAL", "2"))
+CREDIT_FLUSH_BATCH_SIZE = int(os.getenv("CREDIT_FLUSH_BATCH_SIZE", "100"))
+# Must outlast one batched write, including the row-by-row fallback
+CREDIT_FLUSH_LOCK_TTL = int(os.getenv("CREDIT_FLUSH_LOCK_TTL", "60"))
+
+# Script results
+_RESERVED = 0
+_ALREADY_HELD = 1
+_INSUFFICIENT = -1
+_NOT_SEEDED = -2
+
+# KEYS: balance, reservation, dirty set. ARGV: user_id, amount, reservation ttl.
+# Returns {code, balance}. A job that already holds (or used) its credit is never charged twice.
+_RESERVE_LUA = """
+local state = redis.call('HGET', KEYS[2], 'state')
+if state == 'reserved' or state == 'committed' then
+    return {1, tonumber(redis.call('GET', KEYS[1]) or '0')}
+end
+local balance = redis.call('GET', KEYS[1])
+if not balance then
+    return {-2, 0}
+end
+balance = tonumber(balance)
+local amount = tonumber(ARGV[2])
+if balance < amount then
+    return {-1, balance}
+end
+balance = redis.call('DECRBY', KEYS[1], amount)
+redis.call('HSET', KEYS[2], 'user_id', ARGV[1], 'amount', amount, 'state', 'reserved')
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('SADD', KEYS[3], ARGV[1])
+return {0, balance}
+"""
+
+# KEYS: reservation. Returns 1 if the reservation was committed by this call.
+_COMMIT_LUA = """
+if redis.call('HGET', KEYS[1], 'state') ~= 'reserved' then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'state', 'committed')
+return 1
+"""
+
+# KEYS: balance, reservation, dirty set. ARGV: user_id.
+# Returns 1 if the credit was returned by this call, 0 if there was nothing to refund.
+_REFUND_LUA = """
+if redis.call('HGET', KEYS[2], 'state') ~= 'reserved' then
+    return 0
+end
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -2
+end
+redis.call('INCRBY', KEYS[1], redis.call('HGET', KEYS[2], 'amount'))
+redis.call('HSET', KEYS[2], 'state', 'refunded')
+redis.call('SADD', KEYS[3], ARGV[1])
+return 1
+"""
+
+# KEYS: flush locks. ARGV: the flush's lock token. Releases only the locks this flush still holds.
+_RELEASE_FLUSH_LOCKS_LUA = """
+for _, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        redis.call('DEL', key)
+    end
+end
+return 0
+"""
+
+_RESERVE_SCRIPT = redis_client.register_script(_RESERVE_LUA)
+_COMMIT_SCRIPT = redis_client.register_script(_COMMIT_LUA)
+_REFUND_SCRIPT = redis_client.register_script(_REFUND_LUA)
+_RELEASE_FLUSH_LOCKS_SCRIPT = redis_client.register_script(_RELEASE_FLUSH_LOCKS_LUA)
+
+
+def credit_balance_key(user_id: str) -> str:
+    return f"{CREDIT_BALANCE_PREFIX}:{user_id}"
+
+
+def credit_reservation_key(job_id: str) -> str:
+    return f"{CREDIT_RESERVATION_PREFIX}:{job_id}"
+
+
+def credit_flush_lock_key(user_id: str) -> str:
+    return f"{CREDIT_FLUSH_LOCK_PREFIX}:{user_id}"
+
+
+def _seed_balance(user_id: str) -> bool:
+    """Loads the user's balance from their profile into Redis, unless another process got there first."""
+    # Straight from the database: a cached profile can predate a purchase whose ledger update was a no-op
+    response = supabase.table('profiles').select('credits').eq('id', user_id).maybe_single().execute()
+    profile = response.data if response else None
+    if not profile:
+        return False
+    redis_client.set(credit_balance_key(user_id), int(profile.get('credits') or 0), nx=True)
+    return True
+
+
+def reserve_credit(user_id: str, job_id: str, amount: int = 1) -> bool:
+    """
+    Reserves `amount` credits from the user's balance for `job_id`.
+    Returns False if the user doesn't have enough credits. Calling it again for the
+    same job (e.g. after a redelivery) doesn't charge again.
+    """
+    keys = [credit_balance_key(user_id), credit_reservation_key(job_id), CREDIT_DIRTY_SET]
+    args = [user_id, amount, CREDIT_RESERVATION_TTL]
+    code, balance = _RESERVE_SCRIPT(keys=keys, args=args)
+    if code == _NOT_SEEDED:
+        if not _seed_balance(user_id):
+            logging.warning(f"[CREDITS] No profile found for user {user_id}; cannot reserve credits for job {job_id}.")
+            return False
+        code, balance = _RESERVE_SCRIPT(keys=keys, args=args)
+    if code == _INSUFFICIENT or code == _NOT_SEEDED:
+        return False
+    if code == _ALREADY_HELD:
+        logging.info(f"[CREDITS] Job {job_id} already holds its credit reservation (balance {balance}).")
+    else:
+        logging.info(f"[CREDITS] Reserved {amount} credit(s) from user {user_id} for job {job_id} (balance {balance}).")
+    return True
+
+
+def commit_credit(job_id: str) -> bool:
+    """Makes the job's reservation final. Returns True if it was still pending."""
+    try:
+        return bool(_COMMIT_SCRIPT(keys=[credit_reservation_key(job_id)]))
+    except redis.exceptions.RedisError as e:
+        # A reservation left pending just can't be refunded once it expires - the credit stays charged
+        logging.error(f"[CREDITS] Failed to commit credit reservation for job {job_id}: {e}")
+        return False
+
+
+def refund_credit(job_id: str) -> bool:
+    """Returns a failed job's reserved credit to its user. Returns True if a credit was refunded."""
+    try:
+        user_id = redis_client.hget(credit_reservation_key(job_id), 'user_id')
+        if not user_id:
+            return False
+        keys = [credit_balance_key(user_id), credit_reservation_key(job_id), CREDIT_DIRTY_SET]
+        refunded = _REFUND_SCRIPT(keys=keys, args=[user_id])
+        if refunded == _NOT_SEEDED and _seed_balance(user_id):
+            refunded = _REFUND_SCRIPT(keys=keys, args=[user_id])
+        if refunded == 1:
+            logging.info(f"[CREDITS] Refunded credit reservation of job {job_id} to user {user_id}.")
+            return True
+    except redis.exceptions.RedisError as e:
+        logging.error(f"[CREDITS] Failed to refund credit reservation for job {job_id}: {e}")
+    return False
+
+
+def get_credit_balance(user_id: str) -> Optional[int]:
+    """Returns the ledger balance, or None if the ledger hasn't loaded this user (use the profile then)."""
+    balance = redis_client.get(credit_balance_key(user_id))
+    return int(balance) if balance is not None else None
+
+
+async def async_get_credit_balance(user_id: str) -> Optional[int]:
+    """get_credit_balance for the API's event loop."""
+    balance = await async_redis_client.get(credit_balance_key(user_id))
+    return int(balance) if balance is not None else None
+
+
+def set_credit_balance(user_id: str, credits: int):
+    """Overwrites the ledger balance after `profiles.credits` was set directly (loading the user if needed)."""
+    pipe = redis_client.pipeline()
+    pipe.set(credit_balance_key(user_id), int(credits))
+    pipe.sadd(CREDIT_DIRTY_SET, user_id)
+    pipe.execute()
+
+
+async def async_set_credit_balance(user_id: str, credits: int):
+    """set_credit_balance for the API's event loop."""
+    pipe = async_redis_client.pipeline()
+    pipe.set(credit_balance_key(user_id), int(credits))
+    pipe.sadd(CREDIT_DIRTY_SET, user_id)
+    await pipe.execute()
+
+
+# --- Write-behind ---
+
+def flush_dirty_balances(batch_size: int = CREDIT_FLUSH_BATCH_SIZE) -> int:
+    """Writes up to `batch_size` changed balances to `profiles.credits`. Returns the number written."""
+    user_ids = redis_client.spop(CREDIT_DIRTY_SET, batch_size)
+    if not user_ids:
+        return 0
+
+    # Another worker may still be writing an older balance for some of these users. Leave those
+    # dirty for a later flush rather than racing it, so two writes for one user never overlap.
+    lock_token = uuid.uuid4().hex
+    pipe = redis_client.pipeline()
+    for user_id in user_ids:
+        pipe.set(credit_flush_lock_key(user_id), lock_token, nx=True, ex=CREDIT_FLUSH_LOCK_TTL)
+    acquired = pipe.execute()
+    locked = [user_id for user_id, ok in zip(user_ids, acquired) if ok]
+    busy = [user_id for user_id, ok in zip(user_ids, acquired) if not ok]
+    if busy:
+        redis_client.sadd(CREDIT_DIRTY_SET, *busy)
+    if not locked:
+        return 0
+
+    try:
+        # Balances changed after this read re-add the user to the dirty set, so the newest value always lands
+        balances = redis_client.mget([credit_balance_key(user_id) for user_id in locked])
+        rows = [{'id': user_id, 'credits': int(balance)} for user_id, balance in zip(locked, balances) if balance is not None]
+        if not rows:
+            return 0
+        try:
+            try:
+                supabase.table('profiles').upsert(rows, on_conflict='id').execute()
+            except APIError as e:
+                # Fall back to one update per row, e.g. if the table rejects partial upserts
+                logging.warning(f"[CREDITS] Batched credit write failed ({e}); writing {len(rows)} balances one by one.")
+                for row in rows:
+                    supabase.table('profiles').update({'credits': row['credits']}).eq('id', row['id']).execute()
+        except Exception:
+            redis_client.sadd(CREDIT_DIRTY_SET, *locked)
+            raise
+
+        # If a write outlived its lock, a newer balance may have been written before it. Whatever
+        # no longer matches the ledger is marked dirty again, so the next flush corrects it.
+        current = redis_client.mget([credit_balance_key(row['id']) for row in rows])
+        stale = [row['id'] for row, balance in zip(rows, current) if balance is not None and int(balance) != row['credits']]
+        if stale:
+            redis_client.sadd(CREDIT_DIRTY_SET, *stale)
+    finally:
+        _RELEASE_FLUSH_LOCKS_SCRIPT(keys=[credit_flush_lock_key(user_id) for user_id in locked], args=[lock_token])
+
+    for row in rows:
+        invalidate_profile(row['id'])
+    return len(rows)
+
+
+class CreditWriteBehind:
+    """Background thread that periodically writes changed ledger balances to Supabase."""
+
+    def __init__(self, interval: float = CREDIT_FLUSH_INTERVAL, batch_size: int = CREDIT_FLUSH_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="credit-write-behind", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """Stops the thread after writing out whatever is still pending."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def _run(self):
+        while True:
+            stopping = self._stop.wait(self.interval)
+            try:
+                # Keep draining while full batches come back
+                while flush_dirty_balances(self.batch_size) >= self.batch_size:
+                    pass
+            except Exception as e:
+                logging.error(f"[CREDITS] Failed to write credit balances to Supabase: {e}. Retrying in {self.interval}s...")
+                time.sleep(self.interval)
+            if stopping:
+                return
@@ -0,0 +1,87 @@
+"""
+Pooled HTTP sessions for provider APIs.
+
+Every provider (Twelve Labs, Lemon Slice, Creatomate, and whatever host serves
+the final videos) gets one long-lived `requests.Session` per process, so polls
+and submissions reuse warm keep-alive connections instead of paying a TCP+TLS
+handshake per call. Sessions apply a default (connect, read) timeout to every
+request and retry connection failures and gateway errors with backoff.
+"""
+
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+# Roughly one connection per job I/O thread plus the poll scheduler's threads
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+
+# Providers whose requests need a longer read timeout than the default
+PROVIDER_READ_TIMEOUTS = {
+    "twelve_labs": 90, # Summaries are generated synchronously
+    "video_host": 60,
+}
+
+
+class ProviderSession(requests.Session):
+    """A Session that applies a default timeout to any request made without one."""
+
+    def __init__(self, timeout: tuple[float, float]):
+        super().__init__()
+        self.default_timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.default_timeout
+        return super().request(method, url, **kwargs)
+
+
+_sessions: dict[str, ProviderSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def _build_retry() -> Retry:
+    # Connection errors happen before the request is sent, so they are safe to retry for any method.
+    # Read errors and 502/504 gateway responses are only retried for idempotent methods. 429s and
+    # 503s are left to the caller (and the poll scheduler, which reschedules around their
+    # Retry-After), and Retry-After is never slept on here, so it can't stall a shared thread.
+    return Retry(
+        total=HTTP_MAX_RETRIES,
+        connect=HTTP_MAX_RETRIES,
+        read=2,
+        status=HTTP_MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(502, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+
+
+def get_provider_session(provider: str, pool_maxsize: Optional[int] = None) -> requests.Session:
+    """Returns the process-wide pooled session for a provider, creating it on first use."""
+    with _sessions_lock:
+        session = _sessions.get(provider)
+        if session is None:
+            read_timeout = PROVIDER_READ_TIMEOUTS.get(provider, HTTP_READ_TIMEOUT)
+            session = ProviderSession(timeout=(HTTP_CONNECT_TIMEOUT, read_timeout))
+            pool_size = pool_maxsize or HTTP_POOL_MAXSIZE
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=_build_retry())
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[provider] = session
+        return session
+
+
+def close_provider_sessions():
+    """Closes every pooled session (used on worker shutdown)."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,357 @@
+"""
+Asyncio job engine for the meme worker.
+
+Claims up to `max_in_flight` entries from the job streams and runs each one as
+its own task, so a single worker process can keep many provider-bound jobs
+(lip sync, rendering, indexing) in flight at once instead of one at a time.
+With several streams, a StreamScheduler decides how free slots are split
+between them (see job_streams.py). With a UserConcurrencyLimiter, each claimed
+batch is started round-robin across users and jobs of users already at their
+in-flight limit are deferred (see user_concurrency.py).
+
+The handler may be a coroutine function: it then runs on the event loop, awaits
+provider waits (see PollScheduler.wait) and pushes only its short blocking steps
+onto threads of its own choosing, so jobs in flight aren't bounded by a thread
+count. A synchronous handler runs on a thread pool with one thread per in-flight
+slot instead. Redis stream I/O runs on a separate small pool so claiming never
+waits behind job work.
+"""
+
+import asyncio
+import logging
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Union
+
+import redis
+
+from job_streams import StreamScheduler
+from stream_reclaimer import StreamReclaimer
+from user_concurrency import UserConcurrencyLimiter
+
+
+class JobEngine:
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        streams: Union[str, list[str]],
+        group_name: str,
+        consumer_name: str,
+        handler: Callable[[str, dict], Union[None, Awaitable[None]]],
+        max_in_flight: int = 32,
+        block_ms: int = 5000,
+        reclaimers: Optional[list[StreamReclaimer]] = None,
+        reclaim_interval: float = 15,
+        prune_interval: float = 600,
+        trim_interval: float = 60,
+        scheduler: Optional[StreamScheduler] = None,
+        limiter: Optional[UserConcurrencyLimiter] = None,
+        job_owner: Optional[Callable[[dict], Optional[str]]] = None,
+    ):
+        self.redis_client = redis_client
+        # Highest priority first
+        self.streams = [streams] if isinstance(streams, str) else list(streams)
+        self.group_name = group_name
+        self.consumer_name = consumer_name
+        self.handler = handler
+        self.max_in_flight = max(1, max_in_flight)
+        self.block_ms = block_ms
+        self.reclaimers = {r.stream: r for r in (reclaimers or [])}
+        self.scheduler = scheduler or StreamScheduler(self.streams)
+        # job_owner maps an entry's fields to its user_id (None: not limited)
+        self.limiter = limiter
+        self.job_owner = job_owner
+        # Also used as the heartbeat period, so keep it well below the reclaimer's idle threshold
+        self.reclaim_interval = reclaim_interval
+        self.prune_interval = prune_interval
+        self.trim_interval = trim_interval
+
+        self._async_handler = asyncio.iscoroutinefunction(handler)
+        # Synchronous handlers block on provider calls, so they get one thread per in-flight slot
+        self._job_executor: Optional[ThreadPoolExecutor] = None
+        if not self._async_handler:
+            self._job_executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="job")
+        # Stream reads/acks get their own threads so they never queue behind job work
+        self._io_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="stream-io")
+        self._in_flight: set[asyncio.Task] = set()
+        # Entries are tracked as (stream, message_id): each stream generates its own IDs, so
+        # two lanes receiving an entry in the same millisecond both get e.g. `<ms>-0`.
+        # Every entry currently being processed (used by the heartbeat)
+        self._active: set[tuple[str, str]] = set()
+        self._reclaimed: set[tuple[str, str]] = set()
+        # (stream, message_id) -> user_id for running jobs holding a per-user slot
+        self._owners: dict[tuple[str, str], str] = {}
+        self._last_reclaim = 0.0
+        self._last_prune = 0.0
+        self._last_trim = 0.0
+        self._stopping: Optional[asyncio.Event] = None
+        # Start by re-reading entries this consumer claimed but never acknowledged
+        # (e.g. before a crash); the handlers resume them from their checkpoints.
+        self._pending_cursors: dict[str, str] = {stream: '0' for stream in self.streams}
+
+    # --- Public API ---
+
+    async def run(self):
+        """Claims and runs jobs until stopped (SIGINT/SIGTERM), then drains in-flight work."""
+        self._stopping = asyncio.Event()
+        self._install_signal_handlers()
+        logging.info(f"[ENGINE] Started consumer '{self.consumer_name}' on streams {self.streams} (policy: {self.scheduler.policy}, max in flight: {self.max_in_flight}).")
+        heartbeat = asyncio.create_task(self._heartbeat_loop(), name="engine-heartbeat")
+
+        while not self._stopping.is_set():
+            free_slots = self.max_in_flight - len(self._in_flight)
+            if free_slots <= 0:
+                # Every slot is busy - wait for at least one job to finish before claiming more
+                await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            try:
+                entries = await self._claim(free_slots)
+            except redis.exceptions.ConnectionError as e:
+                logging.error(f"[ENGINE] Redis connection error while claiming jobs: {e}. Retrying in 5s...")
+                await asyncio.sleep(5)
+                continue
+            except Exception as e:
+                logging.error(f"[ENGINE] Unexpected error while claiming jobs: {e}", exc_info=True)
+                await asyncio.sleep(2)
+                continue
+
+            await self._admit(entries)
+
+        await self._drain()
+        heartbeat.cancel()
+
+    def stop(self):
+        """Stops claiming new jobs; in-flight jobs are allowed to finish."""
+        if self._stopping and not self._stopping.is_set():
+            logging.info(f"[ENGINE] Stop requested. Waiting for {len(self._in_flight)} in-flight job(s) to finish...")
+            self._stopping.set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    # --- Internals ---
+
+    async def _claim(self, count: int) -> list[tuple[str, str, dict]]:
+        """
+        Reads up to `count` entries for this consumer. Returns (stream, message_id, fields) tuples.
+        Until this consumer's own pending entries are exhausted those are returned first.
+        """
+        if self.reclaimers and time.monotonic() - self._last_reclaim >= self.reclaim_interval:
+            self._last_reclaim = time.monotonic()
+            prune = time.monotonic() - self._last_prune >= self.prune_interval
+            if prune:
+                self._last_prune = time.monotonic()
+            trim = time.monotonic() - self._last_trim >= self.trim_interval
+            if trim:
+                self._last_trim = time.monotonic()
+            reclaimed = []
+            for reclaimer in self.reclaimers.values():
+                if len(reclaimed) < count:
+                    reclaimed.extend(await self._run_io(reclaimer.reclaim, count - len(reclaimed)))
+                if prune:
+                    await self._run_io(reclaimer.prune_consumers)
+                if trim:
+                    await self._run_io(reclaimer.trim)
+            if reclaimed:
+                self._reclaimed.update((stream, message_id) for stream, message_id, _ in reclaimed)
+                return reclaimed
+
+        for stream, cursor in list(self._pending_cursors.items()):
+            entries = await self._read({stream: cursor}, count, block_ms=None)
+            if entries:
+                self._pending_cursors[stream] = entries[-1][1]
+                logging.info(f"[ENGINE] Resuming {len(entries)} previously claimed job(s) from '{stream}' for consumer '{self.consumer_name}'.")
+                return entries
+            del self._pending_cursors[stream]
+
+        entries = await self._read_scheduled(count)
+        if entries:
+            return entries
+        # Every stream is empty: block until one gets an entry. Redis answers with just
+        # the stream that received it, so this claims a single job in practice.
+        # Don't hold finished jobs' slots hostage behind a long blocking read
+        block_ms = self.block_ms if not self._in_flight else min(self.block_ms, 1000)
+        return await self._read({stream: '>' for stream in self.streams}, 1, block_ms)
+
+    async def _read_scheduled(self, count: int) -> list[tuple[str, str, dict]]:
+        """
+        Non-blocking reads of new entries, split across streams by the scheduler. Slots a stream
+        couldn't fill go to the remaining streams in further rounds.
+        """
+        entries: list[tuple[str, str, dict]] = []
+        candidates = list(self.streams)
+        while len(entries) < count and candidates:
+            allocation = self.scheduler.allocate(count - len(entries), candidates)
+            if not allocation:
+                break
+            results = await self._run_io(self._read_many, allocation)
+            for stream, requested in allocation.items():
+                received = results.get(stream, [])
+                self.scheduler.record(stream, requested, len(received))
+                entries.extend(received)
+                if len(received) < requested:
+                    # Drained for now
+                    candidates.remove(stream)
+        return entries
+
+    def _read_many(self, allocation: dict[str, int]) -> dict[str, list[tuple[str, str, dict]]]:
+        """One round trip: a non-blocking XREADGROUP per stream, each with its own count."""
+        pipe = self.redis_client.pipeline(transaction=False)
+        streams = list(allocation)
+        for stream in streams:
+            pipe.xreadgroup(self.group_name, self.consumer_name, {stream: '>'}, count=allocation[stream])
+        results = {}
+        for stream, response in zip(streams, pipe.execute()):
+            results[stream] = self._entries(response)
+        return results
+
+    async def _read(self, stream_ids: dict[str, str], count: int, block_ms: Optional[int]) -> list[tuple[str, str, dict]]:
+        response = await self._run_io(
+            self.redis_client.xreadgroup,
+            self.group_name,
+            self.consumer_name,
+            stream_ids,
+            count=count,
+            block=block_ms,
+        )
+        return self._entries(response)
+
+    @staticmethod
+    def _entries(response) -> list[tuple[str, str, dict]]:
+        if not response:
+            return []
+
+        # Response format: [[stream_name, [[message_id, {field: value}]]]]
+        entries = []
+        for stream_name, messages in response:
+            for message_id, fields in messages:
+                entries.append((stream_name, message_id, fields or {}))
+        return entries
+
+    async def _admit(self, entries: list[tuple[str, str, dict]]):
+        """Starts the claimed entries, taking one per user in turn; entries whose user is at the limit are deferred."""
+        if not self.limiter or not self.job_owner:
+            for stream_name, message_id, fields in entries:
+                self._start(stream_name, message_id, fields)
+            return
+
+        by_owner: "OrderedDict[Optional[str], list]" = OrderedDict()
+        for entry in entries:
+            by_owner.setdefault(self.job_owner(entry[2]), []).append(entry)
+        while by_owner:
+            for owner in list(by_owner):
+                stream_name, message_id, fields = by_owner[owner].pop(0)
+                if not by_owner[owner]:
+                    del by_owner[owner]
+                if owner:
+                    try:
+                        admitted = await self._run_io(self.limiter.acquire, owner, stream_name, message_id, fields)
+                    except redis.exceptions.RedisError as e:
+                        # Better to briefly exceed a user's limit than to stall their job
+                        logging.error(f"[ENGINE] Per-user limit check for job {message_id} failed, running it anyway: {e}")
+                        admitted, owner = True, None
+                    if not admitted:
+                        # Parked and acknowledged by the limiter; it comes back once the user has a free slot
+                        if (stream_name, message_id) in self._reclaimed:
+                            self._reclaimed.discard((stream_name, message_id))
+                            await self._run_io(self.reclaimers[stream_name].clear_failure, message_id)
+                        continue
+                    if owner:
+                        self._owners[(stream_name, message_id)] = owner
+                self._start(stream_name, message_id, fields)
+
+    def _start(self, stream_name: str, message_id: str, fields: dict):
+        task = asyncio.create_task(self._run_job(stream_name, message_id, fields), name=f"job-{message_id}")
+        self._in_flight.add(task)
+        self._active.add((stream_name, message_id))
+        task.add_done_callback(self._in_flight.discard)
+        task.add_done_callback(lambda _: self._active.discard((stream_name, message_id)))
+
+    async def _run_job(self, stream_name: str, message_id: str, fields: dict):
+        try:
+            await self._process(stream_name, message_id, fields)
+        finally:
+            owner = self._owners.pop((stream_name, message_id), None)
+            if owner:
+                try:
+                    await self._run_io(self.limiter.release, owner, stream_name, message_id)
+                except redis.exceptions.RedisError as e:
+                    # The lease expires on its own; the heartbeat re-queues the user's deferred jobs then
+                    logging.error(f"[ENGINE] Failed to release per-user slot of job {message_id}: {e}")
+
+    async def _process(self, stream_name: str, message_id: str, fields: dict):
+        logging.info(f"\nReceived Job - Stream: {stream_name}, Message ID: {message_id} (in flight: {len(self._in_flight)}/{self.max_in_flight})")
+        loop = asyncio.get_running_loop()
+        try:
+            if self._async_handler:
+                await self.handler(message_id, fields)
+            else:
+                await loop.run_in_executor(self._job_executor, self.handler, message_id, fields)
+        except Exception as e:
+            # Leave the entry pending so the reclaimer can retry it (or dead-letter it)
+            logging.error(f"[ENGINE] Job {message_id} raised and will not be acknowledged: {e}", exc_info=True)
+            self._reclaimed.discard((stream_name, message_id))
+            reclaimer = self.reclaimers.get(stream_name)
+            if reclaimer:
+                await self._run_io(reclaimer.record_failure, message_id, f"{type(e).__name__}: {e}")
+            return
+
+        try:
+            await self._run_io(self.redis_client.xack, stream_name, self.group_name, message_id)
+            logging.info(f"Acknowledged job {message_id}.")
+        except redis.exceptions.RedisError as e:
+            logging.error(f"[ENGINE] Failed to acknowledge job {message_id}: {e}")
+        if (stream_name, message_id) in self._reclaimed:
+            self._reclaimed.discard((stream_name, message_id))
+            await self._run_io(self.reclaimers[stream_name].clear_failure, message_id)
+
+    async def _heartbeat_loop(self):
+        """
+        Resets the idle time of in-flight entries so other workers never reclaim live jobs,
+        and keeps their per-user slots leased.
+        """
+        while True:
+            await asyncio.sleep(self.reclaim_interval)
+            by_stream: dict[str, list[str]] = {}
+            for stream_name, message_id in list(self._active):
+                by_stream.setdefault(stream_name, []).append(message_id)
+            for stream_name, message_ids in by_stream.items():
+                try:
+                    await self._run_io(
+                        self.redis_client.xclaim,
+                        stream_name, self.group_name, self.consumer_name,
+                        min_idle_time=0, message_ids=message_ids, justid=True,
+                    )
+                except redis.exceptions.RedisError as e:
+                    logging.error(f"[ENGINE] Heartbeat for {len(message_ids)} in-flight job(s) failed: {e}")
+            if self.limiter:
+                try:
+                    await self._run_io(self.limiter.refresh, dict(self._owners))
+                    await self._run_io(self.limiter.requeue_ready)
+                except redis.exceptions.RedisError as e:
+                    logging.error(f"[ENGINE] Refreshing per-user job slots failed: {e}")
+
+    async def _drain(self):
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        if self._job_executor:
+            self._job_executor.shutdown(wait=True)
+        self._io_executor.shutdown(wait=True)
+        logging.info("[ENGINE] Stopped.")
+
+    async def _run_io(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_executor, lambda: func(*args, **kwargs))
+
+    def _install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                # Not supported on this platform / not in the main thread
+                pass
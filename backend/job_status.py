@@ -0,0 +1,224 @@
+"""
+Job status hash shared by the API and the worker.
+
+Each job's progress lives in the Redis hash `job_status:{job_id}`. Updates are
+applied atomically by a Lua script that:
+  - only touches fields whose value actually changed,
+  - bumps the hash's `version` field once per effective update,
+  - records the version each field last changed at in `job_status_versions:{job_id}`,
+  - publishes the changed fields (plus the new version) on the job's pub/sub channel.
+That lets the API push changes to clients (see /api/job-status/{job_id}/events)
+and answer `?since_version=` long-polls with just the fields that moved.
+
+The same script keeps `user_active_jobs:{user_id}`, a sorted set of the user's
+jobs that haven't completed or failed yet (scored by when they were first seen),
+so the dashboard can find every running job after a reload in one request.
+
+The worker's own bookkeeping (stage checkpoints with provider task IDs, poll
+counters) goes in a separate hash, `job_ckpt:{job_id}`, with the same TTL, so
+none of it is returned to clients or published with status changes.
+
+Every enqueued job is also recorded in the sorted set `job_index` (job_id scored
+by creation time), so diagnostics and listings can page through jobs newest
+first instead of running KEYS over the whole keyspace. Index entries older than
+the status TTL are pruned whenever a job is added.
+"""
+
+import logging
+import time
+from typing import Optional
+
+import redis
+
+from redis_client import redis_client, async_redis_client
+
+JOB_STATUS_TTL = 3600 * 24
+JOB_STATUS_CHANNEL_PREFIX = "job_status_events"
+# Statuses after which a job won't change again until the user acts on it
+JOB_STATUS_FINAL_STATES = ("completed", "failed", "error", "pending_review")
+# Statuses after which a job is no longer listed as active (pending_review still needs the user)
+JOB_STATUS_TERMINAL_STATES = ("completed", "failed", "error")
+USER_ACTIVE_JOBS_PREFIX = "user_active_jobs"
+JOB_CHECKPOINT_PREFIX = "job_ckpt"
+JOB_INDEX_KEY = "job_index"
+
+# KEYS: status hash, field-versions hash.
+# ARGV: ttl, pub/sub channel, job_id, active-jobs key prefix, now, field1, value1, field2, value2, ...
+# The active-jobs key is derived from the hash's user_id, so updates that don't pass
+# user_id (most worker stage updates) still keep the user's set in sync.
+_UPDATE_JOB_STATUS_LUA = """
+local changed = {}
+local changed_count = 0
+for i = 6, #ARGV, 2 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) ~= ARGV[i + 1] then
+        changed[ARGV[i]] = ARGV[i + 1]
+        changed_count = changed_count + 1
+    end
+end
+if changed_count == 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    return tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+end
+local version = redis.call('HINCRBY', KEYS[1], 'version', 1)
+for field, value in pairs(changed) do
+    redis.call('HSET', KEYS[1], field, value)
+    redis.call('HSET', KEYS[2], field, version)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+local user_id = redis.call('HGET', KEYS[1], 'user_id')
+if user_id and user_id ~= '' then
+    local active_key = ARGV[4] .. ':' .. user_id
+    -- JOB_STATUS_TERMINAL_STATES
+    local terminal = {completed = true, failed = true, error = true}
+    if terminal[redis.call('HGET', KEYS[1], 'status') or ''] then
+        redis.call('ZREM', active_key, ARGV[3])
+    else
+        redis.call('ZADD', active_key, 'NX', ARGV[5], ARGV[3])
+        -- Jobs whose status expired without finishing
+        redis.call('ZREMRANGEBYSCORE', active_key, '-inf', tonumber(ARGV[5]) - tonumber(ARGV[1]))
+        redis.call('EXPIRE', active_key, ARGV[1])
+    end
+end
+changed['version'] = tostring(version)
+redis.call('PUBLISH', ARGV[2], cjson.encode(changed))
+return version
+"""
+_UPDATE_JOB_STATUS_SCRIPT = redis_client.register_script(_UPDATE_JOB_STATUS_LUA)
+# Same script for the API's event loop
+_ASYNC_UPDATE_JOB_STATUS_SCRIPT = async_redis_client.register_script(_UPDATE_JOB_STATUS_LUA)
+
+
+def job_status_key(job_id: str) -> str:
+    return f"job_status:{job_id}"
+
+
+def job_status_versions_key(job_id: str) -> str:
+    return f"job_status_versions:{job_id}"
+
+
+def job_checkpoint_key(job_id: str) -> str:
+    return f"{JOB_CHECKPOINT_PREFIX}:{job_id}"
+
+
+def job_status_channel(job_id: str) -> str:
+    return f"{JOB_STATUS_CHANNEL_PREFIX}:{job_id}"
+
+
+def user_active_jobs_key(user_id: str) -> str:
+    return f"{USER_ACTIVE_JOBS_PREFIX}:{user_id}"
+
+
+def _status_update_payload(status_data: dict, user_id: Optional[str]) -> dict:
+    # Add user_id to the status data if provided and not already present
+    if user_id and 'user_id' not in status_data:
+        status_data['user_id'] = user_id
+    # Ensure all values are strings or primitive types suitable for Redis hash
+    return {k: str(v) if v is not None else '' for k, v in status_data.items()}
+
+
+def _status_script_call(job_id: str, update_payload: dict) -> dict:
+    args = [JOB_STATUS_TTL, job_status_channel(job_id), job_id, USER_ACTIVE_JOBS_PREFIX, time.time()]
+    for field, value in update_payload.items():
+        args.extend((field, value))
+    return {"keys": [job_status_key(job_id), job_status_versions_key(job_id)], "args": args}
+
+
+def update_job_status(job_id: str, status_data: dict, user_id: Optional[str] = None) -> Optional[int]:
+    """
+    Updates the job status hash in Redis (optionally including user_id) and publishes the change.
+    Returns the status version after the update, or None if Redis could not be updated.
+    """
+    try:
+        update_payload = _status_update_payload(status_data, user_id)
+        version = _UPDATE_JOB_STATUS_SCRIPT(**_status_script_call(job_id, update_payload))
+        logging.info(f"[Status Update] Job {job_id} (v{version}): {update_payload}")
+        return version
+    except redis.exceptions.RedisError as e:
+        logging.error(f"[ERROR] Failed to update Redis job status for {job_id}: {e}")
+    except Exception as e:
+         logging.error(f"[ERROR] Unexpected error updating job status for {job_id}: {e}")
+    return None
+
+
+async def async_update_job_status(job_id: str, status_data: dict, user_id: Optional[str] = None) -> Optional[int]:
+    """update_job_status for async callers (the API), using the async Redis client."""
+    try:
+        update_payload = _status_update_payload(status_data, user_id)
+        version = await _ASYNC_UPDATE_JOB_STATUS_SCRIPT(**_status_script_call(job_id, update_payload))
+        logging.info(f"[Status Update] Job {job_id} (v{version}): {update_payload}")
+        return version
+    except redis.exceptions.RedisError as e:
+        logging.error(f"[ERROR] Failed to update Redis job status for {job_id}: {e}")
+    except Exception as e:
+         logging.error(f"[ERROR] Unexpected error updating job status for {job_id}: {e}")
+    return None
+
+
+async def async_index_job(job_id: str, created_at: Optional[float] = None):
+    """Adds a job to the creation-time index and drops entries whose status has expired."""
+    created_at = created_at or time.time()
+    try:
+        pipe = async_redis_client.pipeline(transaction=False)
+        pipe.zadd(JOB_INDEX_KEY, {job_id: created_at})
+        pipe.zremrangebyscore(JOB_INDEX_KEY, '-inf', time.time() - JOB_STATUS_TTL)
+        await pipe.execute()
+    except redis.exceptions.RedisError as e:
+        logging.error(f"[ERROR] Failed to index job {job_id}: {e}")
+
+
+async def async_count_indexed_jobs() -> int:
+    """Jobs created within the status TTL."""
+    return await async_redis_client.zcount(JOB_INDEX_KEY, time.time() - JOB_STATUS_TTL, '+inf')
+
+
+async def async_get_indexed_jobs(offset: int = 0, limit: int = 50, fields: Optional[list[str]] = None) -> list[dict]:
+    """
+    One page of indexed jobs, newest first: [{"job_id", "created_at", <fields>...}]. The requested
+    status fields are read with one pipelined HMGET per job; jobs whose status expired have them empty.
+    """
+    page = await async_redis_client.zrevrange(JOB_INDEX_KEY, offset, offset + limit - 1, withscores=True)
+    # No user_id by default: this feeds diagnostics, which must not leak who owns which job
+    fields = fields or ["status", "stage"]
+    pipe = async_redis_client.pipeline(transaction=False)
+    for job_id, _ in page:
+        pipe.hmget(job_status_key(job_id), fields)
+    statuses = await pipe.execute() if page else []
+    jobs = []
+    for (job_id, created_at), values in zip(page, statuses):
+        job = {"job_id": job_id, "created_at": created_at}
+        job.update(zip(fields, values))
+        jobs.append(job)
+    return jobs
+
+
+async def async_get_user_active_jobs(user_id: str, fields: Optional[list[str]] = None) -> list[dict]:
+    """
+    The user's active jobs, oldest first, each with its status hash (or just `fields`) read in one
+    pipelined round trip. Jobs whose status has expired are dropped from the set on the way.
+    """
+    active_key = user_active_jobs_key(user_id)
+    job_ids = await async_redis_client.zrange(active_key, 0, -1)
+    statuses = await async_get_job_statuses(job_ids, fields)
+    expired = [job_id for job_id, status in zip(job_ids, statuses) if not status]
+    if expired:
+        await async_redis_client.zrem(active_key, *expired)
+    return [{"job_id": job_id, **status} for job_id, status in zip(job_ids, statuses) if status]
+
+
+async def async_get_job_statuses(job_ids: list[str], fields: Optional[list[str]] = None) -> list[dict]:
+    """Status hashes of many jobs in one pipelined round trip ({} for unknown/expired jobs)."""
+    if not job_ids:
+        return []
+    lookup = list(dict.fromkeys(fields + ["user_id", "version"])) if fields else None
+    pipe = async_redis_client.pipeline(transaction=False)
+    for job_id in job_ids:
+        if lookup:
+            pipe.hmget(job_status_key(job_id), lookup)
+        else:
+            pipe.hgetall(job_status_key(job_id))
+    results = await pipe.execute()
+    if not lookup:
+        return results
+    # A missing hash reads as all-None, which becomes {} here
+    return [{k: v for k, v in zip(lookup, values) if v is not None} for values in results]
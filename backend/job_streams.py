@@ -0,0 +1,138 @@
+"""
+Job streams split by job type and plan tier, and the policy workers use to pull from them.
+
+Jobs are enqueued on one stream per lane (highest priority first):
+    meme_jobs:continue:paid  - paying user waiting after script review
+    meme_jobs:new:paid
+    meme_jobs:continue:free
+    meme_jobs:new:free
+    meme_jobs:debug          - /api/debug/publish-test-job
+plus the original `meme_jobs` stream, still consumed (lowest priority) so entries
+queued before the split drain normally.
+
+Workers read all of them through one consumer group per stream. StreamScheduler
+decides how many entries to take from each stream whenever slots free up:
+  - "weighted": smooth weighted round-robin by JOB_STREAM_WEIGHTS, so every lane
+    progresses in proportion to its weight,
+  - "strict": always the highest-priority non-empty lane first.
+Either way a lane that hasn't been served for JOB_STREAM_STARVATION_SECONDS
+gets a slot before anyone else, so free-tier jobs are delayed, never stuck.
+"""
+
+import logging
+import os
+import time
+from typing import Optional
+
+from redis_client import MEME_JOB_STREAM
+
+JOB_LANES = ("continue:paid", "new:paid", "continue:free", "new:free", "debug")
+JOB_STREAMS = {lane: f"{MEME_JOB_STREAM}:{lane}" for lane in JOB_LANES}
+# Every stream workers consume, highest priority first (the legacy stream last)
+ALL_JOB_STREAMS = [JOB_STREAMS[lane] for lane in JOB_LANES] + [MEME_JOB_STREAM]
+# Consumer group the workers read every job stream through
+JOB_CONSUMER_GROUP = "meme_job_consumers"
+
+DEFAULT_JOB_STREAM_WEIGHTS = {"continue:paid": 8, "new:paid": 4, "continue:free": 2, "new:free": 1, "debug": 1}
+JOB_STREAM_POLICY = os.getenv("JOB_STREAM_POLICY", "weighted")
+JOB_STREAM_STARVATION_SECONDS = float(os.getenv("JOB_STREAM_STARVATION_SECONDS", "30"))
+
+FREE_PLANS = (None, "", "free")
+
+
+def is_paid_plan(plan: Optional[str]) -> bool:
+    return plan not in FREE_PLANS
+
+
+def job_stream_for(job_type: str, plan: Optional[str] = None) -> str:
+    """Stream a job is enqueued on. job_type: 'new', 'continue' or 'debug'."""
+    if job_type == "debug":
+        return JOB_STREAMS["debug"]
+    tier = "paid" if is_paid_plan(plan) else "free"
+    return JOB_STREAMS[f"{'continue' if job_type == 'continue' else 'new'}:{tier}"]
+
+
+def parse_stream_weights(spec: Optional[str]) -> dict[str, int]:
+    """
+    Parses "continue:paid=8,new:paid=4,..." into {stream: weight}. Lanes not mentioned
+    keep their default weight; the legacy stream always gets weight 1.
+    """
+    weights = dict(DEFAULT_JOB_STREAM_WEIGHTS)
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        lane, _, value = item.partition("=")
+        lane = lane.strip()
+        if lane not in weights:
+            logging.warning(f"[STREAMS] Ignoring weight for unknown job lane '{lane}'.")
+            continue
+        try:
+            weights[lane] = max(0, int(value))
+        except ValueError:
+            logging.warning(f"[STREAMS] Ignoring invalid weight '{item.strip()}'.")
+    stream_weights = {JOB_STREAMS[lane]: weight for lane, weight in weights.items()}
+    stream_weights[MEME_JOB_STREAM] = 1
+    return stream_weights
+
+
+class StreamScheduler:
+    """
+    Splits free worker slots across streams. Streams are given in priority order; the
+    engine calls allocate() once per read round and record() with what each read returned.
+    """
+
+    def __init__(
+        self,
+        streams: list[str],
+        weights: Optional[dict[str, int]] = None,
+        policy: str = "weighted",
+        starvation_seconds: float = JOB_STREAM_STARVATION_SECONDS,
+    ):
+        if policy not in ("weighted", "strict"):
+            raise ValueError(f"Unknown stream scheduling policy: {policy}")
+        self.streams = list(streams)
+        self.weights = {stream: (weights or {}).get(stream, 1) for stream in self.streams}
+        self.policy = policy
+        self.starvation_seconds = starvation_seconds
+        # Smooth weighted round-robin state
+        self._current = {stream: 0 for stream in self.streams}
+        now = time.monotonic()
+        self._last_served = {stream: now for stream in self.streams}
+
+    def allocate(self, slots: int, candidates: list[str]) -> dict[str, int]:
+        """Returns {stream: entries to read} for up to `slots` entries from `candidates`."""
+        candidates = [stream for stream in self.streams if stream in candidates]
+        allocation: dict[str, int] = {}
+        if slots <= 0 or not candidates:
+            return allocation
+
+        # Starvation protection comes first: one slot for each lane left waiting too long
+        now = time.monotonic()
+        starving = sorted(
+            (s for s in candidates if now - self._last_served[s] >= self.starvation_seconds),
+            key=lambda s: self._last_served[s],
+        )
+        for stream in starving[:slots]:
+            allocation[stream] = 1
+        slots -= len(allocation)
+
+        if self.policy == "strict":
+            if slots > 0:
+                top = candidates[0]
+                allocation[top] = allocation.get(top, 0) + slots
+            return allocation
+
+        weighted = [s for s in candidates if self.weights[s] > 0] or candidates
+        total = sum(max(1, self.weights[s]) for s in weighted)
+        for _ in range(slots):
+            for stream in weighted:
+                self._current[stream] += max(1, self.weights[stream])
+            chosen = max(weighted, key=lambda s: self._current[s])
+            self._current[chosen] -= total
+            allocation[chosen] = allocation.get(chosen, 0) + 1
+        return allocation
+
+    def record(self, stream: str, requested: int, received: int):
+        """Notes the outcome of a read. A stream that was served, or had nothing waiting, isn't starving."""
+        if requested > 0:
+            self._last_served[stream] = time.monotonic()
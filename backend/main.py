@@ -1,7 +1,8 @@
-from fastapi import FastAPI, Depends, HTTPException, Request, Header # Add Request, Header
+from fastapi import FastAPI, Depends, HTTPException, Request, Header, Query # Add Request, Header
 from fastapi.middleware.cors import CORSMiddleware # Import CORS middleware
+from fastapi.responses import StreamingResponse, Response
 # Use direct import for modules in the same directory when running script directly
-from auth import get_current_active_user, get_current_user_id # Import the dependency
+from auth import get_current_active_user, get_current_user_id, get_stream_user_id, get_admin_user_id, issue_stream_ticket, STREAM_TICKET_TTL # Import the dependency
 # from gotrue.types import User # No longer directly returning User type
 from typing import Dict, Optional, List # Import Dict, Optional, and List
 import boto3
@@ -9,25 +10,77 @@ from botocore.exceptions import ClientError
 import os
 from dotenv import load_dotenv
 import uuid # For generating unique object keys
-from supabase_client import supabase # Import the synchronous client
+from supabase_client import init_async_supabase, get_async_supabase # Async client for the event loop
+from profile_cache import async_get_profile, async_invalidate_profile
+from credit_ledger import async_get_credit_balance, async_set_credit_balance
+from multipart_uploads import (
+    MULTIPART_MAX_PART_URLS_PER_REQUEST, MULTIPART_PART_URL_EXPIRES,
+    choose_part_size, part_count, save_upload_session, get_upload_session, delete_upload_session,
+)
+from presign_cache import PresignCache
+from past_videos import (
+    async_get_past_videos_version, async_bump_past_videos_version, past_videos_etag, etag_matches,
+    encode_cursor, decode_cursor,
+)
 from pydantic import BaseModel, Field # Import BaseModel and Field
 from postgrest.exceptions import APIError
-from redis_client import redis_client, MEME_JOB_STREAM
+from redis_client import async_redis_client, MEME_JOB_STREAM
 import json # For serializing job data
 import stripe # Import stripe
 import redis # Import redis
-from worker import update_job_status # <-- Import the function
-from openai import OpenAI, OpenAIError # Import OpenAI client
+from job_status import (
+    async_update_job_status, job_status_key, job_status_versions_key, job_status_channel, JOB_STATUS_FINAL_STATES,
+    async_index_job, async_count_indexed_jobs, async_get_indexed_jobs,
+    async_get_user_active_jobs, async_get_job_statuses,
+)
+from job_streams import ALL_JOB_STREAMS, job_stream_for
+from queue_admission import QUEUE_MAX_BACKLOG, check_admission, is_over_backlog, retry_after_seconds
+from provider_callbacks import CALLBACK_PROVIDERS, verify_callback_token, async_publish_provider_callback
+from openai import AsyncOpenAI, OpenAIError # Import OpenAI client
 import time
 import datetime
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 load_dotenv() # Ensure env vars are loaded
 
 app = FastAPI()
 
+# Job status event streams: keep-alive comment interval, and max lifetime before the client reconnects
+JOB_STATUS_STREAM_KEEPALIVE_SECONDS = 15
+JOB_STATUS_STREAM_MAX_SECONDS = 30 * 60
+# Upper bound for ?wait= long-polls on /api/job-status
+JOB_STATUS_MAX_WAIT_SECONDS = 30
+# Job IDs accepted by one POST /api/job-status:batch
+JOB_STATUS_BATCH_MAX_JOBS = 100
+# /api/past-videos page sizes
+PAST_VIDEOS_DEFAULT_PAGE_SIZE = int(os.getenv("PAST_VIDEOS_DEFAULT_PAGE_SIZE", "50"))
+PAST_VIDEOS_MAX_PAGE_SIZE = 100
+
 # --- OpenAI Configuration ---
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+# --- Blocking Call Offload ---
+# Clients without an async API (Stripe) run here so they never stall the event loop.
+# Bounded so a slow dependency can't pile up unlimited threads.
+BLOCKING_IO_MAX_WORKERS = int(os.getenv("BLOCKING_IO_MAX_WORKERS", "16"))
+_blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_MAX_WORKERS, thread_name_prefix="blocking-io")
+
+async def run_blocking(func, *args, **kwargs):
+    """Runs a synchronous call on the bounded blocking-I/O pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_blocking_executor, partial(func, *args, **kwargs))
+
+@app.on_event("startup")
+async def init_async_clients():
+    await init_async_supabase()
+
+@app.on_event("shutdown")
+async def close_async_clients():
+    await async_redis_client.aclose()
+    _blocking_executor.shutdown(wait=False)
 
 # --- Pydantic Models --- 
 class UploadURLRequest(BaseModel):
@@ -35,6 +88,20 @@ class UploadURLRequest(BaseModel):
     content_type: str
     upload_type: str = 'video' # Add type: 'video' or 'avatar'
     duration: Optional[float] = None # Add duration in seconds
+    size: int = Field(..., gt=0) # File size in bytes, checked against the type's limit and signed into the upload
+
+class MultipartUploadRequest(UploadURLRequest):
+    pass # Same fields; the part size is derived from `size`
+
+class MultipartPartURLsRequest(BaseModel):
+    part_numbers: List[int] = Field(..., min_length=1, max_length=MULTIPART_MAX_PART_URLS_PER_REQUEST)
+
+class CompletedPart(BaseModel):
+    part_number: int = Field(..., ge=1)
+    etag: str
+
+class CompleteMultipartUploadRequest(BaseModel):
+    parts: Optional[List[CompletedPart]] = None # ETags from the part uploads, checked against S3's part listing (which is what gets completed)
 
 class GenerateMemeRequest(BaseModel):
     avatar_s3_key: str # Avatar is mandatory
@@ -58,6 +125,7 @@ class VideoCreation(BaseModel):
 
 class PastVideosResponse(BaseModel):
     videos: List[VideoCreation]
+    next_cursor: Optional[str] = None # Pass as ?cursor= to get the next (older) page; None on the last page
 
 class UpdateVideoRequest(BaseModel):
     title: str = Field(..., min_length=1, max_length=100) # Add validation
@@ -67,6 +135,10 @@ class ContinueGenerationRequest(BaseModel):
     script: str = Field(..., min_length=1)
     voice_id: Optional[str] = None # Optional voice selection
 
+class JobStatusBatchRequest(BaseModel):
+    job_ids: List[str] = Field(..., min_length=1, max_length=JOB_STATUS_BATCH_MAX_JOBS)
+    fields: Optional[List[str]] = None # Only these status fields (plus version), like ?fields= on /api/job-status
+
 # --- Script Regeneration Request ---
 class RegenerateScriptRequest(BaseModel):
     current_script: str = Field(..., min_length=1)
@@ -109,6 +181,8 @@ s3_client = boto3.client(
     region_name=AWS_S3_REGION,
     config=boto3.session.Config(signature_version='s3v4') # Required for presigned URLs
 )
+# Multipart part URLs: a client retrying a part gets the URL it already had
+upload_presign_cache = PresignCache(s3_client)
 
 # --- Stripe Configuration --- 
 stripe.api_key = os.getenv("STRIPE_API_KEY")
@@ -151,18 +225,15 @@ async def read_users_me(user_payload: Dict = Depends(get_current_active_user)):
 async def read_my_id(user_id: str = Depends(get_current_user_id)):
     return {"user_id": user_id}
 
-# --- Updated Upload URL Endpoint --- 
-@app.post("/api/upload-url")
-async def create_upload_url(request_body: UploadURLRequest, user_id: str = Depends(get_current_user_id)):
+def _upload_policy(request_body: UploadURLRequest, user_id: str) -> tuple[str, int]:
     """
-    Generates a presigned URL for uploading either a video or avatar image.
-    Requires filename, content_type, upload_type ('video' or 'avatar'), and (for video) duration in seconds in body.
+    Validates an upload request against its type's rules.
+    Returns the user's key prefix for the upload and the maximum size in bytes.
     """
     filename = request_body.filename
     content_type = request_body.content_type
     upload_type = request_body.upload_type
-    # Optionally get duration from request_body if present
-    duration = getattr(request_body, 'duration', None)
+    duration = request_body.duration
 
     if upload_type not in ['video', 'avatar']:
         raise HTTPException(status_code=400, detail="Invalid upload_type. Must be 'video' or 'avatar'.")
@@ -181,37 +252,45 @@ async def create_upload_url(request_body: UploadURLRequest, user_id: str = Depen
             raise HTTPException(status_code=400, detail=f"Unsupported video type: {content_type}")
         if duration is not None and duration > 60:
             raise HTTPException(status_code=400, detail="Video must be 1 minute or less.")
-    elif upload_type == 'avatar':
+    else:
         allowed_content_types = ["image/jpeg", "image/png", "image/webp"]
         max_size_bytes = 5 * 1024 * 1024 # 5MB for avatars - REMAINS THE SAME
         if content_type not in allowed_content_types:
            raise HTTPException(status_code=400, detail=f"Unsupported avatar image type: {content_type}")
-    else:
-         # Should not happen due to earlier check, but defensive
-         raise HTTPException(status_code=400, detail="Invalid upload type specified.")
 
-    # Generate a unique object key based on type
-    _, file_extension = os.path.splitext(filename)
+    if request_body.size > max_size_bytes:
+        raise HTTPException(status_code=413, detail=f"File is too large. Maximum size is {max_size_bytes // (1024 * 1024)} MB.")
+
     folder = "uploads/videos" if upload_type == 'video' else "uploads/avatars"
-    object_key = f"{folder}/{user_id}/{uuid.uuid4()}{file_extension}"
-    
-    # Conditions could also be adapted based on type if needed
-    conditions = [
-        {"bucket": AWS_S3_BUCKET_NAME},
-        ["starts-with", "$key", f"{folder}/{user_id}/"], 
-        # {"acl": "private"}, # Usually handled by bucket policy
-        {"Content-Type": content_type},
-        ["content-length-range", 1, max_size_bytes] 
-    ]
+    return f"{folder}/{user_id}", max_size_bytes
 
+# --- Updated Upload URL Endpoint --- 
+@app.post("/api/upload-url")
+async def create_upload_url(request_body: UploadURLRequest, user_id: str = Depends(get_current_user_id)):
+    """
+    Generates a presigned URL for uploading either a video or avatar image.
+    Requires filename, content_type, upload_type ('video' or 'avatar'), and (for video) duration in seconds in body.
+    """
+    filename = request_body.filename
+    content_type = request_body.content_type
+
+    folder, _ = _upload_policy(request_body, user_id)
+
+    # Generate a unique object key based on type
+    _, file_extension = os.path.splitext(filename)
+    object_key = f"{folder}/{uuid.uuid4()}{file_extension}"
+
+    params = {
+        'Bucket': AWS_S3_BUCKET_NAME,
+        'Key': object_key,
+        'ContentType': content_type,
+        # Signed into the URL, so S3 rejects a body of any other length
+        'ContentLength': request_body.size,
+    }
     try:
         presigned_url = s3_client.generate_presigned_url(
             'put_object',
-            Params={
-                'Bucket': AWS_S3_BUCKET_NAME,
-                'Key': object_key,
-                'ContentType': content_type,
-            },
+            Params=params,
             ExpiresIn=3600 
         )
         return {"upload_url": presigned_url, "object_key": object_key}
@@ -222,35 +301,207 @@ async def create_upload_url(request_body: UploadURLRequest, user_id: str = Depen
         print(f"Unexpected error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error.")
 
+# --- Multipart (Resumable) Upload Endpoints ---
+# Flow: start -> part-urls (in batches) -> PUT parts -> [parts, to resume] -> complete (or DELETE to abort).
+# The bucket's CORS config must expose the ETag header for browsers to read part ETags.
+
+def _list_uploaded_parts(object_key: str, upload_id: str) -> list[dict]:
+    parts = []
+    paginator = s3_client.get_paginator('list_parts')
+    for page in paginator.paginate(Bucket=AWS_S3_BUCKET_NAME, Key=object_key, UploadId=upload_id):
+        parts.extend(page.get('Parts', []))
+    return parts
+
+async def _require_upload_session(upload_id: str, user_id: str) -> dict:
+    session = await get_upload_session(upload_id, user_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found or expired.")
+    return session
+
+@app.post("/api/multipart-uploads")
+async def start_multipart_upload(request_body: MultipartUploadRequest, user_id: str = Depends(get_current_user_id)):
+    """
+    Starts a resumable multipart upload (same rules as /api/upload-url, plus the file size).
+    Returns the upload ID, object key and the part size/count the client must use.
+    """
+    folder, max_size_bytes = _upload_policy(request_body, user_id)
+    _, file_extension = os.path.splitext(request_body.filename)
+    object_key = f"{folder}/{uuid.uuid4()}{file_extension}"
+    part_size = choose_part_size(request_body.size)
+
+    try:
+        response = await run_blocking(
+            s3_client.create_multipart_upload,
+            Bucket=AWS_S3_BUCKET_NAME,
+            Key=object_key,
+            ContentType=request_body.content_type,
+        )
+    except ClientError as e:
+        print(f"Error starting multipart upload for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail="Could not start upload.")
+    upload_id = response['UploadId']
+    await save_upload_session(upload_id, {
+        "user_id": user_id,
+        "object_key": object_key,
+        "content_type": request_body.content_type,
+        "size": request_body.size,
+        "max_size": max_size_bytes,
+        "part_size": part_size,
+    })
+    return {
+        "upload_id": upload_id,
+        "object_key": object_key,
+        "part_size": part_size,
+        "part_count": part_count(request_body.size, part_size),
+    }
+
+@app.post("/api/multipart-uploads/{upload_id}/part-urls")
+async def get_multipart_part_urls(upload_id: str, request_body: MultipartPartURLsRequest, user_id: str = Depends(get_current_user_id)):
+    """Presigns upload URLs for a batch of part numbers. Asking again for a part (e.g. to retry it) is fine."""
+    session = await _require_upload_session(upload_id, user_id)
+    total_parts = part_count(session['size'], session['part_size'])
+    invalid = [n for n in request_body.part_numbers if n < 1 or n > total_parts]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Part numbers must be between 1 and {total_parts}.")
+
+    try:
+        urls = {
+            str(n): upload_presign_cache.get_url(
+                AWS_S3_BUCKET_NAME,
+                session['object_key'],
+                method='upload_part',
+                expires_in=MULTIPART_PART_URL_EXPIRES,
+                extra_params={'UploadId': upload_id, 'PartNumber': n},
+            )
+            for n in request_body.part_numbers
+        }
+    except ClientError as e:
+        print(f"Error presigning part URLs for upload {upload_id}: {e}")
+        raise HTTPException(status_code=500, detail="Could not generate part upload URLs.")
+    return {"upload_id": upload_id, "urls": urls}
+
+@app.get("/api/multipart-uploads/{upload_id}/parts")
+async def list_multipart_parts(upload_id: str, user_id: str = Depends(get_current_user_id)):
+    """Lists the parts S3 already has, so an interrupted upload only re-sends what's missing."""
+    session = await _require_upload_session(upload_id, user_id)
+    try:
+        parts = await run_blocking(_list_uploaded_parts, session['object_key'], upload_id)
+    except ClientError as e:
+        print(f"Error listing parts for upload {upload_id}: {e}")
+        raise HTTPException(status_code=500, detail="Could not list uploaded parts.")
+    return {
+        "upload_id": upload_id,
+        "object_key": session['object_key'],
+        "part_size": session['part_size'],
+        "part_count": part_count(session['size'], session['part_size']),
+        "parts": [{"part_number": p['PartNumber'], "etag": p['ETag'], "size": p['Size']} for p in parts],
+    }
+
+@app.post("/api/multipart-uploads/{upload_id}/complete")
+async def complete_multipart_upload(
+    upload_id: str,
+    request_body: Optional[CompleteMultipartUploadRequest] = None,
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    Completes the upload once every part is in place and the parts add up to the declared size
+    (which was checked against the upload type's limit when the upload started).
+    """
+    session = await _require_upload_session(upload_id, user_id)
+    object_key = session['object_key']
+    try:
+        uploaded = await run_blocking(_list_uploaded_parts, object_key, upload_id)
+    except ClientError as e:
+        print(f"Error listing parts for upload {upload_id}: {e}")
+        raise HTTPException(status_code=500, detail="Could not verify uploaded parts.")
+
+    # Enforce the size policy on what S3 actually received, not on what the client declared
+    total_parts = part_count(session['size'], session['part_size'])
+    uploaded_by_number = {p['PartNumber']: p for p in uploaded}
+    missing = [n for n in range(1, total_parts + 1) if n not in uploaded_by_number]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing parts: {missing[:20]}")
+    if len(uploaded_by_number) != total_parts:
+        raise HTTPException(status_code=400, detail="Unexpected extra parts were uploaded.")
+    oversized = [n for n, p in uploaded_by_number.items() if p['Size'] > session['part_size']]
+    total_size = sum(p['Size'] for p in uploaded)
+    if oversized or total_size != session['size'] or total_size > session['max_size']:
+        raise HTTPException(status_code=400, detail=f"Uploaded parts total {total_size} bytes, expected {session['size']}. Re-upload the affected parts.")
+
+    # Always complete with the parts that were size-checked above. Client ETags are only a
+    # consistency check: a part re-uploaded after the listing would have a different one.
+    etags = {n: p['ETag'] for n, p in uploaded_by_number.items()}
+    if request_body and request_body.parts:
+        client_etags = {p.part_number: p.etag.strip('"') for p in request_body.parts}
+        if client_etags != {n: etag.strip('"') for n, etag in etags.items()}:
+            raise HTTPException(status_code=409, detail="The listed parts don't match the uploaded parts. Re-check the parts and retry.")
+
+    try:
+        await run_blocking(
+            s3_client.complete_multipart_upload,
+            Bucket=AWS_S3_BUCKET_NAME,
+            Key=object_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': [{'PartNumber': n, 'ETag': etags[n]} for n in sorted(etags)]},
+        )
+    except ClientError as e:
+        print(f"Error completing multipart upload {upload_id}: {e}")
+        raise HTTPException(status_code=400, detail="Could not complete upload. Check the part ETags and retry.")
+    await delete_upload_session(upload_id)
+
+    # A part overwritten between the listing and the completion would still slip through - verify the result
+    try:
+        head = await run_blocking(s3_client.head_object, Bucket=AWS_S3_BUCKET_NAME, Key=object_key)
+    except ClientError as e:
+        print(f"Error verifying completed upload {upload_id}: {e}")
+        raise HTTPException(status_code=500, detail="Could not verify the completed upload.")
+    if head.get('ContentLength') != session['size']:
+        print(f"[UPLOAD] Completed upload {upload_id} is {head.get('ContentLength')} bytes, expected {session['size']}. Deleting {object_key}.")
+        await run_blocking(s3_client.delete_object, Bucket=AWS_S3_BUCKET_NAME, Key=object_key)
+        raise HTTPException(status_code=400, detail="Uploaded file size doesn't match the declared size. Please upload it again.")
+    return {"object_key": object_key}
+
+@app.delete("/api/multipart-uploads/{upload_id}")
+async def abort_multipart_upload(upload_id: str, user_id: str = Depends(get_current_user_id)):
+    """Aborts an upload and frees the parts S3 stored for it."""
+    session = await _require_upload_session(upload_id, user_id)
+    try:
+        await run_blocking(s3_client.abort_multipart_upload, Bucket=AWS_S3_BUCKET_NAME, Key=session['object_key'], UploadId=upload_id)
+    except ClientError as e:
+        print(f"Error aborting multipart upload {upload_id}: {e}")
+        raise HTTPException(status_code=500, detail="Could not abort upload.")
+    await delete_upload_session(upload_id)
+    return {"aborted": True}
+
 # --- Credits Endpoint --- 
-async def get_user_credits(user_id: str) -> int:
-    """Helper function to get current credits for a user."""
+async def get_user_profile(user_id: str) -> dict:
+    """Helper function to get a user's (cached) profile row; {} if the profile doesn't exist."""
     try:
-        response = supabase.table('profiles').select('credits').eq('id', user_id).maybe_single().execute()
-        if response.data:
-            return response.data.get('credits', 0)
-        else:
-            print(f"Warning: Profile not found for credit check, user {user_id}")
-            return 0 # Return 0 if profile doesn't exist
+        profile = await async_get_profile(user_id)
+        if not profile:
+            print(f"Warning: Profile not found for user {user_id}")
+        return profile or {}
     except APIError as e:
-        print(f"Supabase API Error fetching credits for user {user_id}: {e}")
+        print(f"Supabase API Error fetching profile for user {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Database error fetching credits.")
     except Exception as e:
-        print(f"Error fetching credits for user {user_id}: {e}")
+        print(f"Error fetching profile for user {user_id}: {e}")
         raise HTTPException(status_code=500, detail="Could not fetch credit balance.")
 
+def _ledger_credits(profile: dict, ledger_balance: Optional[int]) -> int:
+    # The credit ledger is ahead of `profiles.credits` until its write-behind catches up
+    return ledger_balance if ledger_balance is not None else profile.get('credits', 0)
+
+async def get_user_credits(user_id: str) -> int:
+    """Helper function to get current credits for a user."""
+    profile = await get_user_profile(user_id)
+    return _ledger_credits(profile, await async_get_credit_balance(user_id))
+
 @app.get("/api/credits")
 async def get_credits_endpoint(user_id: str = Depends(get_current_user_id)):
-    """Fetches the current user's credits and plan."""
-    credits = await get_user_credits(user_id)
-    # Fetch plan
-    try:
-        response = supabase.table('profiles').select('subscription_plan').eq('id', user_id).maybe_single().execute()
-        plan = (response.data or {}).get('subscription_plan', 'free')
-    except Exception as e:
-        print(f"[CREDITS] Error fetching plan for user {user_id}: {e}")
-        plan = 'free'
-    return {"credits": credits, "subscription": {"plan": plan}}
+    """Fetches the current user's credits and plan (one cached profile read plus the ledger balance)."""
+    profile, ledger_balance = await asyncio.gather(get_user_profile(user_id), async_get_credit_balance(user_id))
+    return {"credits": _ledger_credits(profile, ledger_balance), "subscription": {"plan": profile.get('subscription_plan', 'free')}}
 
 # --- Setup New User Profile ---
 async def ensure_user_profile(user_id: str, initial_credits: int = 1) -> None:
@@ -260,17 +511,18 @@ async def ensure_user_profile(user_id: str, initial_credits: int = 1) -> None:
     """
     try:
         # Check if profile exists
-        profile_response = supabase.table('profiles').select('id, credits, subscription_status, subscription_plan').eq('id', user_id).maybe_single().execute()
+        profile_response = await get_async_supabase().table('profiles').select('id, credits, subscription_status, subscription_plan').eq('id', user_id).maybe_single().execute()
 
         if not profile_response.data:
             # Create new profile with 1 credit
             print(f"[USER_SETUP] Creating new profile for user {user_id} with 1 credit")
-            supabase.table('profiles').insert({
+            await get_async_supabase().table('profiles').insert({
                 'id': user_id,
                 'credits': 1, # Always 1 for new users
                 'subscription_status': 'free',
                 'subscription_plan': 'free' # Explicitly set plan to free
             }).execute()
+            await async_invalidate_profile(user_id)
         else:
             # Profile exists, check if it's a free user with the old 3 credits
             print(f"[USER_SETUP] Profile exists for user {user_id}")
@@ -284,17 +536,21 @@ async def ensure_user_profile(user_id: str, initial_credits: int = 1) -> None:
 
             if current_credits == 3 and is_free_account:
                 print(f"[USER_SETUP] Updating user {user_id} from 3 credits to 1 credit (fixing old default for free user)")
-                supabase.table('profiles').update({
+                await get_async_supabase().table('profiles').update({
                     'credits': 1
                 }).eq('id', user_id).execute()
+                await async_invalidate_profile(user_id)
+                await async_set_credit_balance(user_id, 1)
             elif subscription_plan is None and subscription_status is None:
                 # If plan and status are completely missing, initialize them and set credits to 1
                 print(f"[USER_SETUP] Initializing plan/status and setting credits to 1 for user {user_id}")
-                supabase.table('profiles').update({
+                await get_async_supabase().table('profiles').update({
                     'credits': 1,
                     'subscription_status': 'free',
                     'subscription_plan': 'free'
                 }).eq('id', user_id).execute()
+                await async_invalidate_profile(user_id)
+                await async_set_credit_balance(user_id, 1)
 
     except Exception as e:
         print(f"[ERROR] Error ensuring user profile for {user_id}: {e}")
@@ -319,6 +575,8 @@ async def generate_meme(
     Trigger the meme generation pipeline.
     Requires avatar_s3_key, optionally video_s3_key.
     Enqueues job. Credits are now deducted in the worker, not here.
+    Refuses with 429 (Retry-After) while the queue ahead of the job is over QUEUE_MAX_BACKLOG;
+    otherwise returns an estimated start/finish time with the job ID.
     """
     # Extract keys from the request body model
     avatar_s3_key = request_data.avatar_s3_key
@@ -339,19 +597,48 @@ async def generate_meme(
         # Add other params as needed
     }
 
+    # Paying users' jobs go on their own stream so free-tier bursts don't queue in front of them
     try:
-        redis_stream_id = redis_client.xadd(MEME_JOB_STREAM, {"job_data": json.dumps(job_data)})
-        print(f"[GENERATE_MEME] Enqueued job {job_id} to stream {MEME_JOB_STREAM} with Redis Stream ID: {redis_stream_id}") # Log enqueue
+        plan = (await async_get_profile(user_id) or {}).get('subscription_plan')
+    except Exception as e:
+        print(f"[GENERATE_MEME] Could not look up plan for user {user_id}, queueing as free tier: {e}")
+        plan = None
+    job_stream = job_stream_for("new", plan)
+
+    # Refuse work the queue can't absorb instead of letting it grow without bound
+    estimate = await check_admission(job_stream)
+    if estimate and is_over_backlog(estimate):
+        retry_after = retry_after_seconds(estimate)
+        print(f"[GENERATE_MEME] Rejecting job for user {user_id}: {estimate.jobs_ahead} job(s) queued ahead on {job_stream} (limit {QUEUE_MAX_BACKLOG}). Retry after {retry_after}s.")
+        raise HTTPException(
+            status_code=429,
+            detail="We're generating a lot of videos right now. Please try again in a few minutes.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    # Written before enqueueing so it can't overwrite the worker's first update; lists the
+    # job under the user's active jobs (GET /api/jobs) while it waits
+    await async_update_job_status(job_id, {"status": "queued", "stage": "queued"}, user_id)
+
+    try:
+        redis_stream_id = await async_redis_client.xadd(job_stream, {"job_data": json.dumps(job_data)})
+        print(f"[GENERATE_MEME] Enqueued job {job_id} to stream {job_stream} with Redis Stream ID: {redis_stream_id}") # Log enqueue
+        await async_index_job(job_id)
     except redis.exceptions.ConnectionError as e:
          print(f"[GENERATE_MEME] Redis Connection Error during enqueue for job {job_id}: {e}") # Log specific error
+         await async_update_job_status(job_id, {"status": "failed", "stage": "error", "error_message": "Job queue unavailable."}, user_id)
          raise HTTPException(status_code=503, detail="Job queue unavailable.") 
     except Exception as e:
         print(f"[GENERATE_MEME] Error enqueuing job {job_id}: {e}") # Log specific error
+        await async_update_job_status(job_id, {"status": "failed", "stage": "error", "error_message": "Failed to enqueue generation job."}, user_id)
         raise HTTPException(status_code=500, detail="Failed to enqueue generation job.")
 
     # 2. Return Job ID
     print(f"[GENERATE_MEME] Returning job_id: {job_id} to frontend.") # Log job_id return
-    return {"job_id": job_id, "message": "Meme generation job queued successfully."} 
+    response = {"job_id": job_id, "message": "Meme generation job queued successfully."}
+    if estimate:
+        response["queue"] = estimate.as_dict()
+    return response
 
 # Note: Need to import get_current_active_user if it's used above
 from auth import get_current_active_user
@@ -437,7 +724,8 @@ async def stripe_webhook(request: Request, stripe_signature: Optional[str] = Hea
                      print("[WEBHOOK][ERROR] Stripe API key not configured for Session.retrieve!")
                      # Handle error appropriately - maybe don't try to update DB
                 else:
-                    session_with_line_items = stripe.checkout.Session.retrieve(
+                    session_with_line_items = await run_blocking(
+                        stripe.checkout.Session.retrieve,
                         checkout_session_id, # Use the session ID from the webhook event
                         expand=["line_items"]
                     )
@@ -510,7 +798,11 @@ async def stripe_webhook(request: Request, stripe_signature: Optional[str] = Hea
         else:
             print(f"[WEBHOOK][DB_UPDATE] Attempting to update Supabase for user {user_id} with payload: {update_payload}")
             try: 
-                db_response = supabase.table('profiles').update(update_payload).eq('id', user_id).execute()
+                db_response = await get_async_supabase().table('profiles').update(update_payload).eq('id', user_id).execute()
+                # Drop the cached profile before touching the ledger so nothing re-reads the old balance
+                await async_invalidate_profile(user_id)
+                if 'credits' in update_payload:
+                    await async_set_credit_balance(user_id, update_payload['credits'])
                 
                 # Proper check for PostgREST response
                 if db_response.data: # Successful update typically returns a list with the updated record(s)
@@ -523,7 +815,7 @@ async def stripe_webhook(request: Request, stripe_signature: Optional[str] = Hea
                     else:
                         # This case means no data returned, no error object. Could be RLS or record not found.
                         print(f"[WEBHOOK][DB_WARN] Supabase update for user {user_id} returned no data and no explicit error. Checking if profile exists...")
-                        profile_check = supabase.table('profiles').select('id').eq('id', user_id).maybe_single().execute()
+                        profile_check = await get_async_supabase().table('profiles').select('id').eq('id', user_id).maybe_single().execute()
                         if not profile_check.data:
                             print(f"[WEBHOOK][DB_ERROR] Profile for user {user_id} does not exist! Cannot update.")
                         else:
@@ -578,7 +870,8 @@ async def create_checkout_session(request_data: CheckoutSessionRequest, user_id:
     if price_id.startswith("price_"):
         print(f"[DEBUG] Price ID {price_id} starts with 'price_', allowing checkout")
         try:
-            checkout_session = stripe.checkout.Session.create(
+            checkout_session = await run_blocking(
+                stripe.checkout.Session.create,
                 success_url=f"{DOMAIN_URL}/dashboard?session_id={{CHECKOUT_SESSION_ID}}",
                 cancel_url=f"{DOMAIN_URL}/billing?canceled=true",
                 mode='subscription',
@@ -619,7 +912,8 @@ async def create_portal_session(request_data: PortalSessionRequest, user_id: str
     # TODO: Add security check: Ensure user_id matches customer_id owner in DB
     
     try:
-        portal_session = stripe.billing_portal.Session.create(
+        portal_session = await run_blocking(
+            stripe.billing_portal.Session.create,
             customer=customer_id,
             return_url=f"{DOMAIN_URL}/dashboard", 
         )
@@ -636,17 +930,12 @@ async def create_portal_session(request_data: PortalSessionRequest, user_id: str
 async def get_subscription_status(user_id: str = Depends(get_current_user_id)):
     """Fetches the current user's subscription details from the profiles table."""
     try:
-        # Select the relevant columns needed by the frontend
-        response = supabase.table('profiles')\
-            .select('subscription_status', 'stripe_customer_id', 'subscription_plan')\
-            .eq('id', user_id)\
-            .maybe_single()\
-            .execute()
+        profile = await async_get_profile(user_id)
         
-        if response.data:
-            status = response.data.get('subscription_status')
-            customer_id = response.data.get('stripe_customer_id')
-            plan = response.data.get('subscription_plan')
+        if profile:
+            status = profile.get('subscription_status')
+            customer_id = profile.get('stripe_customer_id')
+            plan = profile.get('subscription_plan')
             # Determine if considered active (can add more statuses later like 'past_due')
             is_active = status == 'active' 
             return {
@@ -673,42 +962,40 @@ async def get_subscription_status(user_id: str = Depends(get_current_user_id)):
 
 # --- Get Job Status Endpoint --- 
 @app.get("/api/job-status/{job_id}")
-async def get_job_status(job_id: str, user_id: str = Depends(get_current_user_id)):
-    """Fetches the status of a generation job from Redis."""
-    status_key = f"job_status:{job_id}"
-    print(f"[DEBUG] Fetching status for job {job_id} using key {status_key}") # Add logging
-    try:
-        status_data_bytes = redis_client.hgetall(status_key)
-        print(f"[DEBUG] Raw Redis response for {job_id}: {status_data_bytes}") # Add logging
-
-        if not status_data_bytes:
-            print(f"[WARN] Job {job_id} not found in Redis (key: {status_key}).") # Add logging
-            raise HTTPException(status_code=404, detail="Job not found or status expired.")
+async def get_job_status(
+    job_id: str,
+    user_id: str = Depends(get_current_user_id),
+    since_version: Optional[int] = Query(None, ge=0),
+    wait: float = Query(0, ge=0),
+    fields: Optional[str] = None,
+):
+    """
+    Fetches the status of a generation job from Redis.
 
-        status_data = {}
-        try:
-            # Decode bytes -> str safely
-            for k, v in status_data_bytes.items():
-                key_str = k.decode("utf-8") if isinstance(k, bytes) else str(k)
-                val_str = v.decode("utf-8") if isinstance(v, bytes) else str(v)
-                status_data[key_str] = val_str
-            print(f"[DEBUG] Decoded status data for {job_id}: {status_data}") # Add logging
-        except Exception as decode_err:
-            print(f"[ERROR] Failed to decode Redis hash for job {job_id}: {decode_err}") # Add logging
-            # If decoding fails, we can't proceed reliably
-            raise HTTPException(status_code=500, detail="Internal server error reading job status format.")
-
-        # Verify user owns this job
-        owner_user_id = status_data.get("user_id")
-        if owner_user_id and owner_user_id != user_id:
-             print(f"[AUTHZ ERROR] User {user_id} tried to access job {job_id} owned by {owner_user_id}") # Add logging
-             raise HTTPException(status_code=403, detail="Not authorized to view this job status.")
-        elif not owner_user_id:
-             # This case might be valid if user_id wasn't stored, but log it
-             print(f"[WARN] Job status for {job_id} does not contain a user_id field.") # Add logging
-             # Depending on requirements, you might allow access or deny it here.
-
-        print(f"[DEBUG] Returning status for job {job_id}: {status_data}") # Add logging
+    - `fields=status,stage,final_url` returns only those fields (plus `version`).
+    - `since_version=N` returns only the fields that changed after version N.
+    - `wait=S` (with since_version) long-polls for up to S seconds until the version moves.
+    With no changes the response is just `{"version": N}`.
+    """
+    requested_fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    wait = min(wait, JOB_STATUS_MAX_WAIT_SECONDS)
+    pubsub = None
+    try:
+        if since_version is not None and wait > 0:
+            # Subscribe before reading so an update between the read and the wait isn't missed
+            pubsub = async_redis_client.pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(job_status_channel(job_id))
+
+        status_data = await _read_job_status(job_id, requested_fields, user_id)
+        if pubsub and int(status_data.get("version") or 0) <= since_version:
+            deadline = time.monotonic() + wait
+            while (remaining := deadline - time.monotonic()) > 0:
+                if await pubsub.get_message(timeout=remaining):
+                    status_data = await _read_job_status(job_id, requested_fields, user_id)
+                    break
+
+        if since_version is not None:
+            status_data = await _job_status_delta(job_id, status_data, since_version)
         return status_data
 
     except redis.exceptions.ConnectionError as e: # Specific Redis connection errors
@@ -726,38 +1013,267 @@ async def get_job_status(job_id: str, user_id: str = Depends(get_current_user_id
         print(traceback.format_exc())
         print(f"!!! Error details: {e} !!!")
         # The frontend sees this generic message
-        raise HTTPException(status_code=500, detail="Internal server error fetching job status.")\
+        raise HTTPException(status_code=500, detail="Internal server error fetching job status.")
+    finally:
+        if pubsub:
+            await pubsub.aclose()
+
+async def _read_job_status(job_id: str, requested_fields: Optional[List[str]], user_id: str) -> dict:
+    """Reads a job's status hash (or just the requested fields) and verifies the user owns the job."""
+    status_key = job_status_key(job_id)
+    if requested_fields:
+        # Only fetch what was asked for - the script and summary fields can be large
+        lookup = list(dict.fromkeys(requested_fields + ["user_id", "version"]))
+        values = await async_redis_client.hmget(status_key, lookup)
+        status_data = {k: v for k, v in zip(lookup, values) if v is not None}
+    else:
+        status_data = await async_redis_client.hgetall(status_key)
+
+    if not status_data:
+        print(f"[WARN] Job {job_id} not found in Redis (key: {status_key}).") # Add logging
+        raise HTTPException(status_code=404, detail="Job not found or status expired.")
+
+    # Verify user owns this job
+    owner_user_id = status_data.get("user_id")
+    if owner_user_id and owner_user_id != user_id:
+         print(f"[AUTHZ ERROR] User {user_id} tried to access job {job_id} owned by {owner_user_id}") # Add logging
+         raise HTTPException(status_code=403, detail="Not authorized to view this job status.")
+    elif not owner_user_id:
+         # This case might be valid if user_id wasn't stored, but log it
+         print(f"[WARN] Job status for {job_id} does not contain a user_id field.") # Add logging
+         # Depending on requirements, you might allow access or deny it here.
+
+    if requested_fields and "user_id" not in requested_fields:
+        status_data.pop("user_id", None)
+    return status_data
+
+async def _job_status_delta(job_id: str, status_data: dict, since_version: int) -> dict:
+    """Keeps only the fields that changed after `since_version` (always including `version`)."""
+    field_versions = await async_redis_client.hgetall(job_status_versions_key(job_id))
+    if not field_versions:
+        # Status written before versioning existed - every field counts as changed
+        return status_data
+    return {
+        k: v for k, v in status_data.items()
+        if k == "version" or int(field_versions.get(k, 0)) > since_version
+    }
+
+@app.get("/api/jobs")
+async def list_jobs(
+    user_id: str = Depends(get_current_user_id),
+    state: str = Query("active"),
+    fields: Optional[str] = None,
+):
+    """
+    Lists the user's jobs that haven't completed or failed yet (queued, processing or awaiting
+    script review), oldest first, each with its status. `fields=` works like on /api/job-status.
+    """
+    if state != "active":
+        raise HTTPException(status_code=400, detail="Only state=active is supported.")
+    requested_fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        jobs = await async_get_user_active_jobs(user_id, requested_fields)
+    except redis.exceptions.RedisError as e:
+        print(f"Redis error listing active jobs for user {user_id}: {e}")
+        raise HTTPException(status_code=503, detail="Job list unavailable - Redis error.")
+    if requested_fields and "user_id" not in requested_fields:
+        for job in jobs:
+            job.pop("user_id", None)
+    return {"jobs": jobs}
+
+@app.post("/api/job-status:batch")
+async def get_job_statuses_batch(request_data: JobStatusBatchRequest, user_id: str = Depends(get_current_user_id)):
+    """
+    Statuses of many jobs in one request: {"jobs": {job_id: status}}. Jobs that don't exist, have
+    expired or belong to another user map to null instead of failing the whole batch.
+    """
+    job_ids = list(dict.fromkeys(request_data.job_ids))
+    try:
+        statuses = await async_get_job_statuses(job_ids, request_data.fields)
+    except redis.exceptions.RedisError as e:
+        print(f"Redis error fetching batch status for user {user_id}: {e}")
+        raise HTTPException(status_code=503, detail="Status check unavailable - Redis error.")
+
+    jobs = {}
+    for job_id, status_data in zip(job_ids, statuses):
+        owner_user_id = status_data.get("user_id")
+        if not status_data or (owner_user_id and owner_user_id != user_id):
+            jobs[job_id] = None
+            continue
+        if request_data.fields and "user_id" not in request_data.fields:
+            status_data.pop("user_id", None)
+        jobs[job_id] = status_data
+    return {"jobs": jobs}
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# --- Job Status Event Stream ---
+@app.post("/api/job-status/{job_id}/events/ticket")
+async def create_job_status_stream_ticket(job_id: str, user_id: str = Depends(get_current_user_id)):
+    """
+    Issues a single-use ticket for opening /api/job-status/{job_id}/events?ticket=...
+    within STREAM_TICKET_TTL seconds (EventSource can't send the Authorization header).
+    """
+    try:
+        # 404/403 now rather than on the stream
+        await _read_job_status(job_id, ["status"], user_id)
+        ticket = await issue_stream_ticket(user_id, job_id)
+    except redis.exceptions.RedisError as e:
+        print(f"Redis error issuing stream ticket for job {job_id}: {e}")
+        raise HTTPException(status_code=503, detail="Status stream unavailable - Redis error.")
+    return {"ticket": ticket, "expires_in": STREAM_TICKET_TTL}
+
+@app.get("/api/job-status/{job_id}/events")
+async def stream_job_status(job_id: str, request: Request, user_id: str = Depends(get_stream_user_id)):
+    """
+    Server-Sent Events stream of a job's status. Sends the full status once as a `status`
+    event, then each change as an `update` event (only the fields that changed) until the
+    job reaches a final state. Replaces polling GET /api/job-status/{job_id}.
+    Authenticated by a `ticket` from POST /api/job-status/{job_id}/events/ticket; reconnecting
+    takes a new one.
+    """
+    # Subscribe before reading the snapshot so no update can slip in between
+    pubsub = async_redis_client.pubsub(ignore_subscribe_messages=True)
+    try:
+        await pubsub.subscribe(job_status_channel(job_id))
+        status_data = await async_redis_client.hgetall(job_status_key(job_id))
+    except redis.exceptions.RedisError as e:
+        await pubsub.aclose()
+        print(f"Redis error opening status stream for job {job_id}: {e}")
+        raise HTTPException(status_code=503, detail="Status stream unavailable - Redis error.")
+
+    if not status_data:
+        await pubsub.aclose()
+        raise HTTPException(status_code=404, detail="Job not found or status expired.")
+    owner_user_id = status_data.get("user_id")
+    if owner_user_id and owner_user_id != user_id:
+        await pubsub.aclose()
+        print(f"[AUTHZ ERROR] User {user_id} tried to stream job {job_id} owned by {owner_user_id}")
+        raise HTTPException(status_code=403, detail="Not authorized to view this job status.")
+
+    async def event_stream():
+        try:
+            yield _sse_event("status", status_data)
+            if status_data.get("status") in JOB_STATUS_FINAL_STATES:
+                return
+            deadline = time.monotonic() + JOB_STATUS_STREAM_MAX_SECONDS
+            while time.monotonic() < deadline:
+                if await request.is_disconnected():
+                    return
+                message = await pubsub.get_message(timeout=JOB_STATUS_STREAM_KEEPALIVE_SECONDS)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                update = json.loads(message["data"])
+                yield _sse_event("update", update)
+                if update.get("status") in JOB_STATUS_FINAL_STATES:
+                    return
+        except redis.exceptions.RedisError as e:
+            print(f"[STREAM] Status stream for job {job_id} lost its Redis connection: {e}")
+        finally:
+            await pubsub.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# --- Provider Completion Callbacks ---
+@app.post("/api/provider-callback/{provider}/{job_id}")
+async def provider_callback(provider: str, job_id: str, request: Request, token: str = ""):
+    """
+    Called by Lemon Slice / Creatomate when a generation or render finishes.
+    Wakes the worker waiting on that stage so it checks the provider right away.
+    """
+    if provider not in CALLBACK_PROVIDERS:
+        raise HTTPException(status_code=404, detail="Unknown provider")
+    if not verify_callback_token(provider, job_id, token):
+        raise HTTPException(status_code=403, detail="Invalid callback token")
+
+    status = None
+    try:
+        body = await request.json()
+        if isinstance(body, dict):
+            status = body.get('status')
+    except ValueError:
+        pass # Body is informational only; the worker re-checks the provider's status API
+
+    try:
+        listeners = await async_publish_provider_callback(provider, job_id, status)
+        print(f"[CALLBACK] {provider} callback for job {job_id} (status: {status}) delivered to {listeners} worker(s).")
+    except redis.exceptions.RedisError as e:
+        # The worker's fallback polling will still pick up the result
+        print(f"[CALLBACK][ERROR] Failed to publish {provider} callback for job {job_id}: {e}")
+    return {"received": True}
 
 # --- Get Past Videos Endpoint --- 
 @app.get("/api/past-videos", response_model=PastVideosResponse)
-async def get_past_videos(user_id: str = Depends(get_current_user_id)):
-    """Fetches the list of generated videos for the current user from Supabase."""
+async def get_past_videos(
+    request: Request,
+    response: Response,
+    user_id: str = Depends(get_current_user_id),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(PAST_VIDEOS_DEFAULT_PAGE_SIZE, ge=1, le=PAST_VIDEOS_MAX_PAGE_SIZE),
+):
+    """
+    Fetches one page of the current user's generated videos from Supabase, newest first.
+    Pages continue from `cursor` (the previous page's `next_cursor`). Responses carry a weak
+    ETag; a matching If-None-Match is answered with 304 without querying the database.
+    """
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    etag = None
+    try:
+        etag = past_videos_etag(await async_get_past_videos_version(user_id), limit, cursor)
+    except redis.exceptions.RedisError as e:
+        print(f"[WARN] Could not read past videos version for user {user_id}, serving without ETag: {e}")
+    if etag:
+        cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=cache_headers)
+        response.headers.update(cache_headers)
+
     try:
-        # Query the generated_videos table, filtering by user_id and ordering by creation date
-        db_response = supabase.table('generated_videos')\
+        # Keyset pagination on (created_at, id): rows strictly after the cursor in newest-first order
+        query = get_async_supabase().table('generated_videos')\
             .select('id, created_at, title, video_url, thumbnail_url') \
-            .eq('user_id', user_id)\
+            .eq('user_id', user_id)
+        if after:
+            created_at, last_id = after[0].isoformat(), after[1]
+            query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{last_id})')
+        db_response = await query\
             .order('created_at', desc=True)\
-            .limit(50) \
+            .order('id', desc=True)\
+            .limit(limit + 1) \
             .execute()
 
-        if db_response.data:
-            # Map database results to the VideoCreation model
-            # Handle potential missing optional fields like title/thumbnail
-            videos = [
-                VideoCreation(
-                    id=item['id'],
-                    created_at=item['created_at'], 
-                    title=item.get('title'), # Use .get() for optional fields
-                    url=item['video_url'], # Rename video_url to url
-                    thumbnail=None if not item.get('thumbnail_url') or not item.get('thumbnail_url').strip() else item.get('thumbnail_url') # Handle empty strings
-                )
-                for item in db_response.data
-            ]
-            return PastVideosResponse(videos=videos)
-        else:
-            # No videos found for the user
-            return PastVideosResponse(videos=[])
+        rows = db_response.data or []
+        next_cursor = None
+        if len(rows) > limit:
+            # One extra row tells us there is another page without a count query
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+
+        # Map database results to the VideoCreation model
+        # Handle potential missing optional fields like title/thumbnail
+        videos = [
+            VideoCreation(
+                id=item['id'],
+                created_at=item['created_at'], 
+                title=item.get('title'), # Use .get() for optional fields
+                url=item['video_url'], # Rename video_url to url
+                thumbnail=None if not item.get('thumbnail_url') or not item.get('thumbnail_url').strip() else item.get('thumbnail_url') # Handle empty strings
+            )
+            for item in rows
+        ]
+        return PastVideosResponse(videos=videos, next_cursor=next_cursor)
 
     except APIError as e:
         print(f"Supabase API Error fetching past videos for user {user_id}: {e}")
@@ -778,7 +1294,7 @@ async def update_video_title(
 
     try:
         # Update the title only if the video_id exists AND belongs to the user_id
-        db_response = supabase.table('generated_videos')\
+        db_response = await get_async_supabase().table('generated_videos')\
             .update({'title': new_title})\
             .eq('id', str(video_id)) \
             .eq('user_id', user_id)\
@@ -791,7 +1307,7 @@ async def update_video_title(
         # If db_response.data is empty, it likely means no matching row was found (or RLS blocked).
         if not db_response.data or len(db_response.data) == 0:
              # Check if the video exists at all for this user to differentiate errors
-            check_response = supabase.table('generated_videos')\
+            check_response = await get_async_supabase().table('generated_videos')\
                  .select('id')\
                  .eq('id', str(video_id))\
                  .eq('user_id', user_id)\
@@ -805,6 +1321,10 @@ async def update_video_title(
                  # We can consider this a success if the video exists, maybe the title was the same?
                  # Or raise 500 if we expect data back.
 
+        try:
+            await async_bump_past_videos_version(user_id)
+        except redis.exceptions.RedisError as e:
+            print(f"[WARN] Could not bump past videos version for user {user_id}: {e}")
         return {"message": "Video title updated successfully"}
 
     except APIError as e:
@@ -830,7 +1350,7 @@ async def continue_generation(
     status_key = f"job_status:{job_id}"
     try:
         # 1. Retrieve current job status from Redis
-        status_data_bytes = redis_client.hgetall(status_key)
+        status_data_bytes = await async_redis_client.hgetall(status_key)
         if not status_data_bytes:
             raise HTTPException(status_code=404, detail="Job not found or status expired.")
         # Check if values are bytes and decode if necessary
@@ -878,8 +1398,7 @@ async def continue_generation(
 
         # 4. Fetch user's plan from Supabase
         try:
-            profile_response = supabase.table('profiles').select('subscription_plan').eq('id', user_id).maybe_single().execute()
-            plan = (profile_response.data or {}).get('subscription_plan', 'free')
+            plan = (await async_get_profile(user_id) or {}).get('subscription_plan', 'free')
             plan = (plan or 'free').lower()
         except Exception as e:
             print(f"[VOICE PLAN] Error fetching user plan for {user_id}: {e}")
@@ -912,17 +1431,18 @@ async def continue_generation(
              "job_data": json.dumps(continue_job_data)
         }
         # Update status immediately to prevent double-continuation
-        update_job_status(job_id, {"status": "processing", "stage": "continuation_triggered"}, user_id)
-        redis_stream_id = redis_client.xadd(MEME_JOB_STREAM, message_payload)
-        print(f"Enqueued 'continue' job {job_id} with Redis Stream ID: {redis_stream_id}")
+        await async_update_job_status(job_id, {"status": "processing", "stage": "continuation_triggered"}, user_id)
+        job_stream = job_stream_for("continue", plan)
+        redis_stream_id = await async_redis_client.xadd(job_stream, message_payload)
+        print(f"Enqueued 'continue' job {job_id} to stream {job_stream} with Redis Stream ID: {redis_stream_id}")
         return {"message": "Generation continuation job queued successfully.", "job_id": job_id}
     except redis.exceptions.RedisError as e:
         print(f"Redis error continuing job {job_id}: {e}")
-        update_job_status(job_id, {"status": "failed", "error_message": "Failed to queue continuation task.", "stage": "error"}, user_id)
+        await async_update_job_status(job_id, {"status": "failed", "error_message": "Failed to queue continuation task.", "stage": "error"}, user_id)
         raise HTTPException(status_code=503, detail="Job queue unavailable.")
     except Exception as e:
         print(f"Unexpected error continuing job {job_id}: {e}")
-        update_job_status(job_id, {"status": "failed", "error_message": f"Internal error: {e}", "stage": "error"}, user_id)
+        await async_update_job_status(job_id, {"status": "failed", "error_message": f"Internal error: {e}", "stage": "error"}, user_id)
         raise HTTPException(status_code=500, detail="Internal server error continuing job.")
 
 # --- New Regenerate Script Endpoint ---
@@ -965,7 +1485,7 @@ MODIFICATION REQUEST:
 
         # Call OpenAI API
         try:
-            response = openai_client.chat.completions.create(
+            response = await openai_client.chat.completions.create(
                 model="gpt-4o",  # Or other suitable model
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -994,15 +1514,19 @@ MODIFICATION REQUEST:
 # --- Debug Endpoints --- 
 
 @app.get("/api/debug/redis-status")
-async def debug_redis_status():
-    """Debug endpoint to check Redis connection and stream status."""
+async def debug_redis_status(
+    jobs_offset: int = Query(0, ge=0),
+    jobs_limit: int = Query(10, ge=1, le=100),
+    admin_user_id: str = Depends(get_admin_user_id),
+):
+    """Debug endpoint to check Redis connection and stream status. Recent jobs are paged from the job index."""
     try:
         # Check Redis connection
-        ping_result = redis_client.ping()
+        ping_result = await async_redis_client.ping()
         
         # Check if stream exists
         try:
-            stream_info = redis_client.xinfo_stream(MEME_JOB_STREAM)
+            stream_info = await async_redis_client.xinfo_stream(MEME_JOB_STREAM)
             stream_exists = True
             stream_length = stream_info.get('length', 0)
             first_entry = stream_info.get('first-entry', ['none'])[0] if stream_info.get('first-entry') else 'none'
@@ -1016,9 +1540,20 @@ async def debug_redis_status():
             else:
                 raise
 
-        # Count job status keys
-        job_status_count = len(redis_client.keys("job_status:*"))
-        
+        # Backlog of every job lane (missing streams count as empty)
+        pipe = async_redis_client.pipeline(transaction=False)
+        for job_stream in ALL_JOB_STREAMS:
+            pipe.xlen(job_stream)
+        stream_lengths = dict(zip(ALL_JOB_STREAMS, await pipe.execute()))
+
+        # Jobs come from the creation-time index; KEYS would block Redis on a large keyspace
+        job_status_count = await async_count_indexed_jobs()
+        # Status/stage only - no job or user IDs
+        recent_jobs = [
+            {"created_at": job["created_at"], "status": job.get("status"), "stage": job.get("stage")}
+            for job in await async_get_indexed_jobs(jobs_offset, jobs_limit)
+        ]
+
         # Return status information
         return {
             "redis_connected": bool(ping_result),
@@ -1026,7 +1561,9 @@ async def debug_redis_status():
             "stream_length": stream_length,
             "stream_first_entry": first_entry,
             "stream_last_entry": last_entry,
-            "job_status_count": job_status_count
+            "stream_lengths": stream_lengths,
+            "job_status_count": job_status_count,
+            "recent_jobs": recent_jobs,
         }
     except Exception as e:
         print(f"[ERROR] Redis status check failed: {e}")
@@ -1047,17 +1584,18 @@ async def debug_publish_test_job(user_id: str = Depends(get_current_user_id)):
         }
         
         # Add the job to the stream
-        stream_id = redis_client.xadd(MEME_JOB_STREAM, {"job_data": json.dumps(job_data)})
+        stream_id = await async_redis_client.xadd(job_stream_for("debug"), {"job_data": json.dumps(job_data)})
+        await async_index_job(job_id)
         
         # Create a job status entry manually
         status_key = f"job_status:{job_id}"
-        redis_client.hset(status_key, mapping={
+        await async_redis_client.hset(status_key, mapping={
             "status": "test_created",
             "stage": "test",
             "user_id": user_id,
             "created_at": datetime.datetime.now().isoformat()
         })
-        redis_client.expire(status_key, 3600 * 24)  # 24 hour expiry
+        await async_redis_client.expire(status_key, 3600 * 24)  # 24 hour expiry
         
         return {
             "success": True,
@@ -0,0 +1,168 @@
+"""
+Content-addressed caches for expensive provider results.
+
+Results are keyed by a fingerprint of the uploaded object's content (S3 ETag +
+size) rather than by its S3 key, so re-uploading the same clip under a new key
+still hits the cache. Entries live in Redis with a TTL, and a sorted set of
+last-access times bounds the number of entries (least recently used first out).
+"""
+
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import redis
+import requests
+from botocore.exceptions import ClientError
+
+from http_clients import get_provider_session
+from redis_client import redis_client
+
+VIDEO_SUMMARY_CACHE_TTL = int(os.getenv("VIDEO_SUMMARY_CACHE_TTL", str(30 * 24 * 3600)))
+VIDEO_SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("VIDEO_SUMMARY_CACHE_MAX_ENTRIES", "5000"))
+VIDEO_SUMMARY_CACHE_PREFIX = "video_summary_cache"
+
+LIP_SYNC_CACHE_TTL = int(os.getenv("LIP_SYNC_CACHE_TTL", str(30 * 24 * 3600)))
+LIP_SYNC_CACHE_MAX_ENTRIES = int(os.getenv("LIP_SYNC_CACHE_MAX_ENTRIES", "5000"))
+LIP_SYNC_CACHE_PREFIX = "lip_sync_cache"
+# Where cached talking-head videos are copied to in our own bucket
+LIP_SYNC_CACHE_S3_PREFIX = "generated/lip_sync"
+# Provider URLs may expire, so entries that only hold one are kept much shorter
+LIP_SYNC_PROVIDER_URL_TTL = 6 * 3600
+
+# Copies into our bucket run off the job's critical path
+_copy_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-copy")
+
+
+def get_s3_object_fingerprint(s3_client, bucket: str, key: str) -> Optional[str]:
+    """Returns a content fingerprint for an S3 object (hash of its ETag and size), or None if unavailable."""
+    try:
+        head = s3_client.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        logging.warning(f"[CACHE] Could not HEAD s3://{bucket}/{key} for fingerprinting: {e}")
+        return None
+    etag = (head.get('ETag') or '').strip('"')
+    size = head.get('ContentLength')
+    if not etag or size is None:
+        return None
+    return hashlib.sha256(f"{etag}:{size}".encode("utf-8")).hexdigest()
+
+
+def get_cached_video_summary(fingerprint: str) -> Optional[dict]:
+    """Returns {'video_id', 'summary', 'thumbnail_url'} for a previously summarized video, or None."""
+    cache_key = f"{VIDEO_SUMMARY_CACHE_PREFIX}:{fingerprint}"
+    try:
+        cached = redis_client.hgetall(cache_key)
+        if not cached or not cached.get('summary'):
+            return None
+        # Refresh recency and TTL on every hit
+        pipe = redis_client.pipeline()
+        pipe.zadd(f"{VIDEO_SUMMARY_CACHE_PREFIX}:lru", {fingerprint: time.time()})
+        pipe.expire(cache_key, VIDEO_SUMMARY_CACHE_TTL)
+        pipe.execute()
+        return cached
+    except redis.exceptions.RedisError as e:
+        logging.warning(f"[CACHE] Video summary cache lookup failed: {e}")
+        return None
+
+
+def cache_video_summary(fingerprint: str, video_id: Optional[str], summary: str, thumbnail_url: Optional[str]):
+    """Stores a video summary under its content fingerprint, evicting the least recently used entries."""
+    cache_key = f"{VIDEO_SUMMARY_CACHE_PREFIX}:{fingerprint}"
+    lru_key = f"{VIDEO_SUMMARY_CACHE_PREFIX}:lru"
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hset(cache_key, mapping={
+            "video_id": video_id or '',
+            "summary": summary,
+            "thumbnail_url": thumbnail_url or '',
+        })
+        pipe.expire(cache_key, VIDEO_SUMMARY_CACHE_TTL)
+        pipe.zadd(lru_key, {fingerprint: time.time()})
+        pipe.zcard(lru_key)
+        entry_count = pipe.execute()[-1]
+        if entry_count > VIDEO_SUMMARY_CACHE_MAX_ENTRIES:
+            _evict_least_recently_used(VIDEO_SUMMARY_CACHE_PREFIX, entry_count - VIDEO_SUMMARY_CACHE_MAX_ENTRIES)
+    except redis.exceptions.RedisError as e:
+        logging.warning(f"[CACHE] Failed to cache video summary: {e}")
+
+
+def _evict_least_recently_used(prefix: str, count: int):
+    lru_key = f"{prefix}:lru"
+    oldest = redis_client.zrange(lru_key, 0, count - 1)
+    if not oldest:
+        return
+    pipe = redis_client.pipeline()
+    pipe.delete(*[f"{prefix}:{fingerprint}" for fingerprint in oldest])
+    pipe.zrem(lru_key, *oldest)
+    pipe.execute()
+    logging.info(f"[CACHE] Evicted {len(oldest)} least recently used '{prefix}' entries.")
+
+
+def normalize_script(script_text: str) -> str:
+    """Collapses whitespace so cosmetic edits to a script don't defeat the cache."""
+    return " ".join(script_text.split())
+
+
+def get_lip_sync_cache_key(avatar_fingerprint: str, script_text: str, voice_id: str, resolution: str) -> str:
+    """Cache key for one talking-head render: (avatar content, normalized script, voice, resolution)."""
+    script_hash = hashlib.sha256(normalize_script(script_text).encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{avatar_fingerprint}|{script_hash}|{voice_id}|{resolution}".encode("utf-8")).hexdigest()
+
+
+def get_cached_lip_sync(cache_key: str) -> Optional[dict]:
+    """Returns {'s3_key'} (copy in our bucket) or {'video_url'} (provider URL) for a cached render, or None."""
+    redis_key = f"{LIP_SYNC_CACHE_PREFIX}:{cache_key}"
+    try:
+        cached = redis_client.hgetall(redis_key)
+        if not cached or not (cached.get('s3_key') or cached.get('video_url')):
+            return None
+        redis_client.zadd(f"{LIP_SYNC_CACHE_PREFIX}:lru", {cache_key: time.time()})
+        return cached
+    except redis.exceptions.RedisError as e:
+        logging.warning(f"[CACHE] Lip sync cache lookup failed: {e}")
+        return None
+
+
+def cache_lip_sync(cache_key: str, s3_key: Optional[str] = None, video_url: Optional[str] = None):
+    """Stores a finished render, preferring the copy in our bucket over the provider URL."""
+    redis_key = f"{LIP_SYNC_CACHE_PREFIX}:{cache_key}"
+    lru_key = f"{LIP_SYNC_CACHE_PREFIX}:lru"
+    try:
+        pipe = redis_client.pipeline()
+        pipe.delete(redis_key)
+        pipe.hset(redis_key, mapping={"s3_key": s3_key or '', "video_url": video_url or ''})
+        pipe.expire(redis_key, LIP_SYNC_CACHE_TTL if s3_key else LIP_SYNC_PROVIDER_URL_TTL)
+        pipe.zadd(lru_key, {cache_key: time.time()})
+        pipe.zcard(lru_key)
+        entry_count = pipe.execute()[-1]
+        if entry_count > LIP_SYNC_CACHE_MAX_ENTRIES:
+            _evict_least_recently_used(LIP_SYNC_CACHE_PREFIX, entry_count - LIP_SYNC_CACHE_MAX_ENTRIES)
+    except redis.exceptions.RedisError as e:
+        logging.warning(f"[CACHE] Failed to cache lip sync result: {e}")
+
+
+def store_lip_sync_result(s3_client, bucket: str, cache_key: str, video_url: str):
+    """
+    Caches a finished render in the background: the provider URL right away, then a copy
+    in our own bucket (which replaces the provider URL once the upload succeeds).
+    """
+    cache_lip_sync(cache_key, video_url=video_url)
+    _copy_executor.submit(_copy_lip_sync_to_s3, s3_client, bucket, cache_key, video_url)
+
+
+def _copy_lip_sync_to_s3(s3_client, bucket: str, cache_key: str, video_url: str):
+    s3_key = f"{LIP_SYNC_CACHE_S3_PREFIX}/{cache_key}.mp4"
+    try:
+        with get_provider_session("video_host").get(video_url, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            s3_client.upload_fileobj(response.raw, bucket, s3_key, ExtraArgs={"ContentType": "video/mp4"})
+    except (requests.exceptions.RequestException, ClientError) as e:
+        logging.warning(f"[CACHE] Could not copy lip sync video into s3://{bucket}/{s3_key}: {e}")
+        return
+    cache_lip_sync(cache_key, s3_key=s3_key)
+    logging.info(f"[CACHE] Stored lip sync video as s3://{bucket}/{s3_key}.")
@@ -0,0 +1,503 @@
+"""
+Media preflight: reads a video's container header with ranged reads and reports
+its duration, dimensions and codecs without downloading the file.
+
+Supported containers:
+  - MP4 / MOV (ISO BMFF): walks the top-level boxes to find `moov` (which may sit
+    after `mdat`, so only box headers are read on the way), then parses mvhd/mehd,
+    tkhd, mdhd, hdlr and stsd from it.
+  - WebM / Matroska (EBML): reads the EBML header and the Segment's Info and
+    Tracks elements, following the SeekHead when they come after the clusters.
+
+Reads go through a RangeReader, so the same code probes S3 objects
+(S3RangeReader) and local sample files (FileRangeReader).
+"""
+
+import os
+import struct
+from abc import ABC, abstractmethod
+from typing import Optional
+
+# Bytes fetched per read; small header reads are served from this read-ahead
+PROBE_READ_AHEAD = 64 * 1024
+# A larger `moov` / header element than this is treated as corrupt rather than downloaded
+PROBE_MAX_HEADER_BYTES = 32 * 1024 * 1024
+# Top-level boxes/elements walked before giving up on finding the header
+PROBE_MAX_ELEMENTS = 64
+
+
+class MediaProbeError(ValueError):
+    """The file isn't a supported container, or its header is corrupt."""
+
+
+class MediaInfo:
+    """What the preflight learned about a video. Any field may be None if the container doesn't say."""
+
+    def __init__(self, container: str):
+        self.container = container
+        self.duration: Optional[float] = None # seconds
+        self.width: Optional[int] = None
+        self.height: Optional[int] = None
+        self.video_codec: Optional[str] = None
+        self.audio_codec: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "container": self.container,
+            "duration": round(self.duration, 3) if self.duration is not None else None,
+            "width": self.width,
+            "height": self.height,
+            "video_codec": self.video_codec,
+            "audio_codec": self.audio_codec,
+        }
+
+    def __repr__(self):
+        return f"MediaInfo({self.as_dict()})"
+
+
+# --- Readers ---
+
+class RangeReader(ABC):
+    """Random access to an object's bytes."""
+
+    @abstractmethod
+    def size(self) -> int:
+        ...
+
+    @abstractmethod
+    def read_range(self, offset: int, length: int) -> bytes:
+        """Returns up to `length` bytes starting at `offset` (fewer only at the end of the object)."""
+
+
+class FileRangeReader(RangeReader):
+    """Reads a local file, e.g. sample videos when checking the parsers."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+
+    def read_range(self, offset: int, length: int) -> bytes:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+
+class S3RangeReader(RangeReader):
+    """Reads an S3 object with ranged GETs."""
+
+    def __init__(self, s3_client, bucket: str, key: str):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self._size: Optional[int] = None
+        self.requests = 0
+
+    def size(self) -> int:
+        if self._size is None:
+            self._size = self.s3_client.head_object(Bucket=self.bucket, Key=self.key)['ContentLength']
+        return self._size
+
+    def read_range(self, offset: int, length: int) -> bytes:
+        self.requests += 1
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={offset}-{offset + length - 1}")
+        return response['Body'].read()
+
+
+class _ReadAhead:
+    """Serves reads from the last fetched window, fetching PROBE_READ_AHEAD bytes at a time."""
+
+    def __init__(self, reader: RangeReader):
+        self.reader = reader
+        self.size = reader.size()
+        self._start = 0
+        self._buffer = b""
+
+    def read(self, offset: int, length: int) -> bytes:
+        if offset < 0 or offset >= self.size:
+            return b""
+        length = min(length, self.size - offset)
+        end = offset + length
+        if offset < self._start or end > self._start + len(self._buffer):
+            self._buffer = self.reader.read_range(offset, max(length, PROBE_READ_AHEAD))
+            self._start = offset
+        return self._buffer[offset - self._start:end - self._start]
+
+
+# --- Entry point ---
+
+def probe_media(reader: RangeReader) -> MediaInfo:
+    """Identifies the container and parses its header. Raises MediaProbeError for unsupported or corrupt files."""
+    data = _ReadAhead(reader)
+    head = data.read(0, 16)
+    if len(head) < 8:
+        raise MediaProbeError("File is too small to be a video.")
+    try:
+        if head[:4] == b"\x1a\x45\xdf\xa3":
+            return _probe_ebml(data)
+        if head[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip", b"pnot"):
+            return _probe_iso_bmff(data)
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        # Fields running past the end of their box/element
+        raise MediaProbeError(f"Corrupt video header: {e}") from e
+    raise MediaProbeError("Unsupported video format (expected MP4, MOV or WebM).")
+
+
+# --- MP4 / MOV ---
+
+def _read_box_header(data: _ReadAhead, offset: int, limit: int) -> Optional[tuple[bytes, int, int]]:
+    """Returns (type, header size, total size) of the box at `offset`, or None past `limit`."""
+    header = data.read(offset, 16)
+    if len(header) < 8 or offset + 8 > limit:
+        return None
+    size, box_type = struct.unpack(">I4s", header[:8])
+    header_size = 8
+    if size == 1:
+        if len(header) < 16:
+            raise MediaProbeError("Truncated box header.")
+        size = struct.unpack(">Q", header[8:16])[0]
+        header_size = 16
+    elif size == 0:
+        size = limit - offset
+    if size < header_size or offset + size > limit:
+        raise MediaProbeError(f"Corrupt '{box_type.decode('latin-1')}' box.")
+    return box_type, header_size, size
+
+
+def _iter_boxes(buf: bytes, start: int, end: int):
+    """Yields (type, payload start, payload end) for the boxes in buf[start:end]."""
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack(">I4s", buf[offset:offset + 8])
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", buf[offset + 8:offset + 16])[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise MediaProbeError(f"Corrupt '{box_type.decode('latin-1')}' box.")
+        yield box_type, offset + header_size, offset + size
+        offset += size
+
+
+def _probe_iso_bmff(data: _ReadAhead) -> MediaInfo:
+    offset = 0
+    brand = None
+    for _ in range(PROBE_MAX_ELEMENTS):
+        box = _read_box_header(data, offset, data.size)
+        if box is None:
+            break
+        box_type, header_size, size = box
+        if box_type == b"ftyp":
+            brand = data.read(offset + header_size, 4)
+        elif box_type == b"moov":
+            if size > PROBE_MAX_HEADER_BYTES:
+                raise MediaProbeError("Video header is implausibly large.")
+            moov = data.read(offset, size)
+            if len(moov) < size:
+                raise MediaProbeError("Truncated 'moov' box.")
+            info = MediaInfo("mov" if brand == b"qt  " else "mp4")
+            _parse_moov(moov, header_size, size, info)
+            return info
+        offset += size
+    raise MediaProbeError("No 'moov' box found; the upload is incomplete or corrupt.")
+
+
+def _full_box_version(buf: bytes, start: int) -> int:
+    return buf[start]
+
+
+def _parse_moov(buf: bytes, start: int, end: int, info: MediaInfo):
+    for box_type, payload, box_end in _iter_boxes(buf, start, end):
+        if box_type == b"mvhd":
+            duration = _parse_duration_box(buf, payload)
+            if duration:
+                info.duration = duration
+        elif box_type == b"mvex" and not info.duration:
+            for child, child_payload, _ in _iter_boxes(buf, payload, box_end):
+                if child == b"mehd":
+                    # Fragmented files: the fragment duration uses the movie timescale from mvhd
+                    info.duration = _parse_mehd(buf, child_payload, start, end)
+        elif box_type == b"trak":
+            _parse_trak(buf, payload, box_end, info)
+
+
+def _parse_duration_box(buf: bytes, payload: int) -> Optional[float]:
+    """Duration in seconds from an mvhd/mdhd payload (both share the same layout)."""
+    if _full_box_version(buf, payload) == 1:
+        timescale, duration = struct.unpack(">IQ", buf[payload + 20:payload + 32])
+    else:
+        timescale, duration = struct.unpack(">II", buf[payload + 12:payload + 20])
+    if not timescale or duration in (0, 0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+        return None
+    return duration / timescale
+
+
+def _parse_mehd(buf: bytes, payload: int, moov_start: int, moov_end: int) -> Optional[float]:
+    timescale = None
+    for box_type, mvhd_payload, _ in _iter_boxes(buf, moov_start, moov_end):
+        if box_type == b"mvhd":
+            offset = mvhd_payload + (20 if _full_box_version(buf, mvhd_payload) == 1 else 12)
+            timescale = struct.unpack(">I", buf[offset:offset + 4])[0]
+    if not timescale:
+        return None
+    if _full_box_version(buf, payload) == 1:
+        duration = struct.unpack(">Q", buf[payload + 4:payload + 12])[0]
+    else:
+        duration = struct.unpack(">I", buf[payload + 4:payload + 8])[0]
+    return duration / timescale if duration else None
+
+
+def _find_box(buf: bytes, start: int, end: int, path: list[bytes]) -> Optional[tuple[int, int]]:
+    """Payload (start, end) of the box at `path` below buf[start:end], or None."""
+    for box_type, payload, box_end in _iter_boxes(buf, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload, box_end
+            return _find_box(buf, payload, box_end, path[1:])
+    return None
+
+
+def _parse_trak(buf: bytes, start: int, end: int, info: MediaInfo):
+    hdlr = _find_box(buf, start, end, [b"mdia", b"hdlr"])
+    if not hdlr:
+        return
+    handler = buf[hdlr[0] + 8:hdlr[0] + 12]
+    stsd = _find_box(buf, start, end, [b"mdia", b"minf", b"stbl", b"stsd"])
+    codec = None
+    entry = None
+    if stsd and struct.unpack(">I", buf[stsd[0] + 4:stsd[0] + 8])[0] > 0:
+        entry = stsd[0] + 8
+        codec = buf[entry + 4:entry + 8].decode("latin-1").strip()
+
+    if handler == b"vide" and info.video_codec is None:
+        info.video_codec = codec
+        tkhd = _find_box(buf, start, end, [b"tkhd"])
+        if tkhd and tkhd[1] - tkhd[0] >= 8:
+            # Presentation size: 16.16 fixed point, the last 8 bytes of tkhd
+            width, height = struct.unpack(">II", buf[tkhd[1] - 8:tkhd[1]])
+            info.width, info.height = width >> 16, height >> 16
+        if (not info.width or not info.height) and entry is not None:
+            # Coded size from the visual sample entry
+            info.width, info.height = struct.unpack(">HH", buf[entry + 32:entry + 36])
+        if not info.duration:
+            mdhd = _find_box(buf, start, end, [b"mdia", b"mdhd"])
+            if mdhd:
+                info.duration = _parse_duration_box(buf, mdhd[0])
+    elif handler == b"soun" and info.audio_codec is None:
+        info.audio_codec = codec
+
+
+# --- WebM / Matroska ---
+
+_EBML_HEADER = 0x1A45DFA3
+_EBML_DOCTYPE = 0x4282
+_SEGMENT = 0x18538067
+_SEEK_HEAD = 0x114D9B74
+_SEEK = 0x4DBB
+_SEEK_ID = 0x53AB
+_SEEK_POSITION = 0x53AC
+_INFO = 0x1549A966
+_TIMECODE_SCALE = 0x2AD7B1
+_DURATION = 0x4489
+_TRACKS = 0x1654AE6B
+_TRACK_ENTRY = 0xAE
+_TRACK_TYPE = 0x83
+_CODEC_ID = 0x86
+_VIDEO = 0xE0
+_PIXEL_WIDTH = 0xB0
+_PIXEL_HEIGHT = 0xBA
+_CLUSTER = 0x1F43B675
+
+
+def _read_vint(buf: bytes, offset: int, keep_marker: bool) -> tuple[Optional[int], int]:
+    """Decodes an EBML variable-length integer. Returns (value, length); value None means "unknown size"."""
+    if offset >= len(buf):
+        raise MediaProbeError("Truncated EBML element.")
+    first = buf[offset]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8 or offset + length > len(buf):
+        raise MediaProbeError("Corrupt EBML element.")
+    value = first if keep_marker else first & (mask - 1)
+    all_ones = (first & (mask - 1)) == mask - 1
+    for byte in buf[offset + 1:offset + length]:
+        value = (value << 8) | byte
+        all_ones = all_ones and byte == 0xFF
+    if not keep_marker and all_ones:
+        return None, length
+    return value, length
+
+
+def _read_element_header(buf: bytes, offset: int) -> tuple[int, Optional[int], int]:
+    """Returns (id, data size or None if unknown, header length) of the element at `offset`."""
+    element_id, id_length = _read_vint(buf, offset, keep_marker=True)
+    size, size_length = _read_vint(buf, offset + id_length, keep_marker=False)
+    return element_id, size, id_length + size_length
+
+
+def _iter_elements(buf: bytes, start: int, end: int):
+    """Yields (id, data start, data end) for the child elements in buf[start:end]."""
+    offset = start
+    while offset < end:
+        element_id, size, header_length = _read_element_header(buf, offset)
+        data_start = offset + header_length
+        data_end = end if size is None else data_start + size
+        if data_end > end:
+            raise MediaProbeError("Corrupt EBML element.")
+        yield element_id, data_start, data_end
+        offset = data_end
+
+
+def _ebml_uint(buf: bytes, start: int, end: int) -> int:
+    return int.from_bytes(buf[start:end], "big")
+
+
+def _probe_ebml(data: _ReadAhead) -> MediaInfo:
+    head = data.read(0, 64)
+    element_id, size, header_length = _read_element_header(head, 0)
+    if size is None or header_length + size > 4096:
+        raise MediaProbeError("Corrupt EBML header.")
+    ebml = data.read(0, header_length + size)
+    doc_type = None
+    for child, child_start, child_end in _iter_elements(ebml, header_length, header_length + size):
+        if child == _EBML_DOCTYPE:
+            doc_type = ebml[child_start:child_end].rstrip(b"\x00").decode("latin-1")
+    if doc_type not in ("webm", "matroska"):
+        raise MediaProbeError(f"Unsupported EBML document type: {doc_type!r}")
+    info = MediaInfo(doc_type)
+
+    segment_offset = header_length + size
+    segment_header = data.read(segment_offset, 16)
+    element_id, segment_size, segment_header_length = _read_element_header(segment_header, 0)
+    if element_id != _SEGMENT:
+        raise MediaProbeError("No Matroska Segment found.")
+    segment_start = segment_offset + segment_header_length
+    segment_end = data.size if segment_size is None else min(data.size, segment_start + segment_size)
+
+    # Level-1 elements by ID -> absolute offset, from the SeekHead (if the walk finds one)
+    seek_positions: dict[int, int] = {}
+    found = set()
+    offset = segment_start
+    for _ in range(PROBE_MAX_ELEMENTS):
+        if offset >= segment_end or {_INFO, _TRACKS} <= found:
+            break
+        header = data.read(offset, 16)
+        element_id, size, element_header_length = _read_element_header(header, 0)
+        if element_id == _CLUSTER or size is None:
+            break
+        if element_id in (_SEEK_HEAD, _INFO, _TRACKS):
+            element = _read_ebml_element(data, offset, element_header_length + size)
+            if element_id == _SEEK_HEAD:
+                seek_positions = _parse_seek_head(element, element_header_length, segment_start)
+            else:
+                _parse_ebml_level1(element_id, element, element_header_length, info)
+                found.add(element_id)
+        offset += element_header_length + size
+
+    # Info/Tracks written after the clusters: jump straight to them
+    for element_id in (_INFO, _TRACKS):
+        if element_id in found or element_id not in seek_positions:
+            continue
+        position = seek_positions[element_id]
+        header = data.read(position, 16)
+        actual_id, size, element_header_length = _read_element_header(header, 0)
+        if actual_id != element_id or size is None:
+            raise MediaProbeError("SeekHead points at the wrong element.")
+        element = _read_ebml_element(data, position, element_header_length + size)
+        _parse_ebml_level1(element_id, element, element_header_length, info)
+        found.add(element_id)
+
+    if _TRACKS not in found:
+        raise MediaProbeError("No track information found; the upload is incomplete or corrupt.")
+    return info
+
+
+def _read_ebml_element(data: _ReadAhead, offset: int, length: int) -> bytes:
+    if length > PROBE_MAX_HEADER_BYTES:
+        raise MediaProbeError("Video header is implausibly large.")
+    element = data.read(offset, length)
+    if len(element) < length:
+        raise MediaProbeError("Truncated EBML element.")
+    return element
+
+
+def _parse_seek_head(buf: bytes, start: int, segment_start: int) -> dict[int, int]:
+    positions = {}
+    for child, child_start, child_end in _iter_elements(buf, start, len(buf)):
+        if child != _SEEK:
+            continue
+        seek_id = position = None
+        for field, field_start, field_end in _iter_elements(buf, child_start, child_end):
+            if field == _SEEK_ID:
+                seek_id = _ebml_uint(buf, field_start, field_end)
+            elif field == _SEEK_POSITION:
+                position = _ebml_uint(buf, field_start, field_end)
+        if seek_id is not None and position is not None:
+            positions[seek_id] = segment_start + position
+    return positions
+
+
+def _parse_ebml_level1(element_id: int, buf: bytes, start: int, info: MediaInfo):
+    if element_id == _INFO:
+        timecode_scale = 1000000 # nanoseconds per tick (Matroska default)
+        duration = None
+        for child, child_start, child_end in _iter_elements(buf, start, len(buf)):
+            if child == _TIMECODE_SCALE:
+                timecode_scale = _ebml_uint(buf, child_start, child_end)
+            elif child == _DURATION:
+                fmt = ">f" if child_end - child_start == 4 else ">d"
+                duration = struct.unpack(fmt, buf[child_start:child_end])[0]
+        if duration:
+            info.duration = duration * timecode_scale / 1e9
+    elif element_id == _TRACKS:
+        for child, child_start, child_end in _iter_elements(buf, start, len(buf)):
+            if child == _TRACK_ENTRY:
+                _parse_track_entry(buf, child_start, child_end, info)
+
+
+def _parse_track_entry(buf: bytes, start: int, end: int, info: MediaInfo):
+    track_type = codec = None
+    width = height = None
+    for child, child_start, child_end in _iter_elements(buf, start, end):
+        if child == _TRACK_TYPE:
+            track_type = _ebml_uint(buf, child_start, child_end)
+        elif child == _CODEC_ID:
+            codec = buf[child_start:child_end].rstrip(b"\x00").decode("latin-1")
+        elif child == _VIDEO:
+            for field, field_start, field_end in _iter_elements(buf, child_start, child_end):
+                if field == _PIXEL_WIDTH:
+                    width = _ebml_uint(buf, field_start, field_end)
+                elif field == _PIXEL_HEIGHT:
+                    height = _ebml_uint(buf, field_start, field_end)
+    if track_type == 1 and info.video_codec is None:
+        info.video_codec, info.width, info.height = codec, width, height
+    elif track_type == 2 and info.audio_codec is None:
+        info.audio_codec = codec
+
+
+# --- Source video rules ---
+
+# Sample entry formats (MP4/MOV) and CodecIDs (WebM/Matroska) the providers can decode
+SUPPORTED_VIDEO_CODECS = {
+    "avc1", "avc3", "hvc1", "hev1", "mp4v", "av01", "vp08", "vp09",
+    "V_MPEG4/ISO/AVC", "V_MPEGH/ISO/HEVC", "V_VP8", "V_VP9", "V_AV1",
+}
+
+
+def source_video_problem(info: MediaInfo, max_duration: float) -> Optional[str]:
+    """Returns why the video can't be used as a source clip (user-facing), or None if it's fine."""
+    if not info.video_codec:
+        return "The uploaded file has no video track."
+    if info.video_codec not in SUPPORTED_VIDEO_CODECS:
+        return f"Unsupported video codec '{info.video_codec}'. Please upload an H.264, H.265, VP8, VP9 or AV1 video."
+    if info.duration is not None and info.duration > max_duration:
+        return f"Video is {info.duration:.0f} seconds long; the limit is {max_duration:.0f} seconds."
+    if info.width is not None and info.height is not None and (info.width == 0 or info.height == 0):
+        return "The uploaded video has no picture (zero width or height)."
+    return None
@@ -0,0 +1,59 @@
+"""
+Bookkeeping for resumable S3 multipart uploads of source videos.
+
+The API starts a multipart upload on S3 and records a session in Redis
+(`multipart_upload:{upload_id}`) with the owner, object key, declared size and
+part size. The browser then asks for presigned part URLs in batches, PUTs the
+parts (in parallel, retrying only the parts that failed), can list the parts S3
+already has to resume after a reload, and finally asks the API to complete or
+abort the upload. The session lets the API check ownership and enforce the size
+limits on every step without trusting the client.
+"""
+
+import json
+import math
+from typing import Optional
+
+from redis_client import async_redis_client
+
+MULTIPART_SESSION_PREFIX = "multipart_upload"
+# Incomplete uploads can be resumed for this long (pair with an S3 lifecycle rule aborting stale uploads)
+MULTIPART_SESSION_TTL = 24 * 3600
+# S3 requires at least 5 MiB for every part but the last; bigger parts mean fewer requests
+MULTIPART_MIN_PART_SIZE = 8 * 1024 * 1024
+MULTIPART_MAX_PARTS = 10000
+# Part URLs handed out per request
+MULTIPART_MAX_PART_URLS_PER_REQUEST = 100
+MULTIPART_PART_URL_EXPIRES = 3600
+
+
+def choose_part_size(size: int) -> int:
+    """Smallest part size (a whole number of MiB, at least MULTIPART_MIN_PART_SIZE) that fits `size` in MULTIPART_MAX_PARTS parts."""
+    mib = 1024 * 1024
+    needed = math.ceil(size / MULTIPART_MAX_PARTS)
+    return max(MULTIPART_MIN_PART_SIZE, math.ceil(needed / mib) * mib)
+
+
+def part_count(size: int, part_size: int) -> int:
+    return max(1, math.ceil(size / part_size))
+
+
+def _session_key(upload_id: str) -> str:
+    return f"{MULTIPART_SESSION_PREFIX}:{upload_id}"
+
+
+async def save_upload_session(upload_id: str, session: dict):
+    await async_redis_client.set(_session_key(upload_id), json.dumps(session), ex=MULTIPART_SESSION_TTL)
+
+
+async def get_upload_session(upload_id: str, user_id: str) -> Optional[dict]:
+    """Returns the upload's session, or None if it doesn't exist (anymore) or belongs to another user."""
+    raw = await async_redis_client.get(_session_key(upload_id))
+    if not raw:
+        return None
+    session = json.loads(raw)
+    return session if session.get('user_id') == user_id else None
+
+
+async def delete_upload_session(upload_id: str):
+    await async_redis_client.delete(_session_key(upload_id))
@@ -0,0 +1,100 @@
+"""
+Helpers for the paginated, cacheable /api/past-videos listing.
+
+Pages are ordered by (created_at, id), newest first, and continue from an opaque
+cursor holding the last row's (created_at, id), so deep pages cost the same as
+the first one and don't shift when new videos are added.
+
+Every user has a library version token in Redis (`past_videos_version:{user_id}`)
+that is replaced whenever one of their videos is added or renamed. ETags are
+built from it, so an unchanged dashboard is answered with a 304 from Redis alone.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from redis_client import redis_client, async_redis_client
+
+PAST_VIDEOS_VERSION_PREFIX = "past_videos_version"
+# Tokens are recreated on demand, so they only need to outlive a typical dashboard session
+PAST_VIDEOS_VERSION_TTL = 30 * 24 * 3600
+
+
+def past_videos_version_key(user_id: str) -> str:
+    return f"{PAST_VIDEOS_VERSION_PREFIX}:{user_id}"
+
+
+def bump_past_videos_version(user_id: str):
+    """Marks the user's video library as changed (a video was added or updated)."""
+    # A fresh random token rather than INCR, so a recreated key can't repeat a token clients still hold
+    redis_client.set(past_videos_version_key(user_id), uuid.uuid4().hex, ex=PAST_VIDEOS_VERSION_TTL)
+
+
+async def async_bump_past_videos_version(user_id: str):
+    """bump_past_videos_version for the API's event loop."""
+    await async_redis_client.set(past_videos_version_key(user_id), uuid.uuid4().hex, ex=PAST_VIDEOS_VERSION_TTL)
+
+
+async def async_get_past_videos_version(user_id: str) -> str:
+    """Returns the user's current library version token, creating one if there is none yet."""
+    key = past_videos_version_key(user_id)
+    version = await async_redis_client.get(key)
+    if version is None:
+        await async_redis_client.set(key, uuid.uuid4().hex, ex=PAST_VIDEOS_VERSION_TTL, nx=True)
+        version = await async_redis_client.get(key)
+    return version
+
+
+def past_videos_etag(version: str, limit: int, cursor: Optional[str]) -> str:
+    """Weak ETag for one page of the listing at the given library version."""
+    page = hashlib.sha256(f"{limit}:{cursor or ''}".encode("utf-8")).hexdigest()[:16]
+    return f'W/"{version}-{page}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as required for GET)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+def encode_cursor(created_at: str, video_id: str) -> str:
+    raw = json.dumps([created_at, str(video_id)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """
+    Returns (created_at, id) from a cursor, with created_at parsed as a timezone-aware datetime.
+    Raises ValueError if it is malformed. Callers build the Supabase filter from the parsed values,
+    never from the cursor's raw text.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, video_id = json.loads(raw)
+        uuid.UUID(str(video_id))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}") from e
+    if not isinstance(created_at, str) or not created_at:
+        raise ValueError("Invalid cursor: missing created_at")
+    try:
+        created_at = datetime.fromisoformat(created_at)
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor: bad created_at: {e}") from e
+    if created_at.tzinfo is None:
+        raise ValueError("Invalid cursor: created_at has no timezone")
+    return created_at, str(uuid.UUID(str(video_id)))
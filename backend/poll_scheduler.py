@@ -0,0 +1,362 @@
+"""
+Shared provider poll scheduler.
+
+Instead of every job running its own `while retries < max_retries: ... time.sleep()`
+loop, jobs hand their outstanding provider task to this scheduler and await a
+Future (see wait()), so a waiting job holds no thread at all. One timer thread keeps
+every pending check in a heap ordered by due time; when checks come due they are
+grouped by provider and run in small batches on that provider's pooled session, so
+thousands of outstanding provider tasks only cost a fixed handful of threads and
+warm connections.
+
+A check is a callable `check(session)` that returns:
+  - None while the provider task is still running (it will be polled again),
+  - a PollPending hint while still running, to pass on a provider's Retry-After
+    or ETA so the next check is scheduled around it,
+  - any other value once the task reached a successful terminal state.
+It should raise for a failed terminal state. `requests` errors are treated as
+transient and retried on the next tick (429/503 responses honor Retry-After).
+
+How long to wait between checks is decided by each provider's PollPolicy:
+exponential backoff with jitter by default, or - when the typical duration of
+the stage is known - long waits early on that shrink as the task approaches
+its expected completion.
+
+Tasks submitted with a `wake_key` can also be checked immediately via wake(),
+e.g. when a provider completion callback arrives (see provider_callbacks.py);
+polling then only acts as a slow fallback.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional
+
+import requests
+
+from http_clients import get_provider_session
+
+# Threads per provider used to run due checks
+POLL_WORKERS_PER_PROVIDER = 4
+# Upper bound on how many due checks one batch runs back-to-back on a session
+POLL_BATCH_SIZE = 25
+
+
+class PollPending:
+    """Returned by a check while the task is still running, carrying scheduling hints from the provider."""
+    __slots__ = ("retry_after", "eta")
+
+    def __init__(self, retry_after: Optional[float] = None, eta: Optional[float] = None):
+        self.retry_after = retry_after # Seconds the provider asked us to wait
+        self.eta = eta # Seconds until the provider expects the task to finish
+
+    @classmethod
+    def from_response(cls, response: requests.Response, eta: Optional[float] = None) -> "PollPending":
+        return cls(retry_after=parse_retry_after(response.headers.get("Retry-After")), eta=eta)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header (delta-seconds or HTTP date) into seconds from now."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_eta(elapsed: float, percent_done: Optional[float]) -> Optional[float]:
+    """Extrapolates the remaining time of a task from its reported progress percentage."""
+    if not percent_done or percent_done <= 0 or percent_done >= 100:
+        return None
+    return elapsed * (100 - percent_done) / percent_done
+
+
+class PollTask:
+    __slots__ = (
+        "provider", "task_id", "check", "policy", "started_at", "deadline", "expected_duration",
+        "label", "attempts", "backoff_step", "on_done", "wake_key", "heap_seq", "wake_pending", "future",
+    )
+
+    def __init__(
+        self,
+        provider: str,
+        task_id: str,
+        check: Callable,
+        policy: "PollPolicy",
+        started_at: float,
+        deadline: float,
+        expected_duration: Optional[float],
+        label: str,
+        on_done: Optional[Callable[["PollTask", Any], None]],
+        wake_key: Optional[str],
+    ):
+        self.provider = provider
+        self.task_id = task_id
+        self.check = check
+        self.policy = policy
+        self.started_at = started_at # Wall-clock time the provider task was submitted
+        self.deadline = deadline # Monotonic
+        self.expected_duration = expected_duration
+        self.label = label
+        self.attempts = 0
+        self.backoff_step = 0
+        self.on_done = on_done
+        self.wake_key = wake_key
+        # Sequence number of this task's live heap entry (None while a check is running)
+        self.heap_seq: Optional[int] = None
+        # Set by a wake() that arrived while a check was running; that check then reschedules at once
+        self.wake_pending = False
+        self.future: Future = Future()
+
+    @property
+    def elapsed(self) -> float:
+        return max(0.0, time.time() - self.started_at)
+
+
+class PollPolicy:
+    """Decides how long to wait before the next check of a provider task."""
+
+    def __init__(self, min_interval: float = 2, max_interval: float = 30, multiplier: float = 1.6, jitter: float = 0.2):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def next_interval(self, task: PollTask, hint: Optional[PollPending] = None) -> float:
+        if hint is not None and hint.retry_after is not None:
+            # The provider told us exactly when to come back; never poll sooner
+            return max(hint.retry_after, self.min_interval)
+
+        if hint is not None and hint.eta is not None:
+            # Check again shortly before the provider's own estimate
+            delay = hint.eta * 0.8
+        elif task.expected_duration and task.elapsed < task.expected_duration:
+            # Halve the remaining gap to the typical completion time: few checks while the
+            # task is surely still running, tight checks around when it usually finishes
+            delay = (task.expected_duration - task.elapsed) / 2
+        else:
+            # No idea (or running long): back off exponentially from the minimum interval
+            delay = self.min_interval * (self.multiplier ** task.backoff_step)
+            task.backoff_step += 1
+
+        delay = min(max(delay, self.min_interval), self.max_interval)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+DEFAULT_POLL_POLICY = PollPolicy()
+
+
+class PollScheduler:
+    def __init__(self, workers_per_provider: int = POLL_WORKERS_PER_PROVIDER, batch_size: int = POLL_BATCH_SIZE):
+        self.workers_per_provider = workers_per_provider
+        self.batch_size = batch_size
+        self._heap: list[tuple[float, int, PollTask]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._tasks: dict[tuple[str, str], PollTask] = {}
+        self._executors: dict[str, ThreadPoolExecutor] = {}
+        self._policies: dict[str, PollPolicy] = {}
+        self._wake_keys: dict[str, PollTask] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    # --- Public API ---
+
+    def submit(
+        self,
+        provider: str,
+        task_id: str,
+        check: Callable[[requests.Session], Any],
+        timeout: float = 300,
+        label: str = "",
+        first_delay: float = 0,
+        started_at: Optional[float] = None,
+        expected_duration: Optional[float] = None,
+        on_done: Optional[Callable[[PollTask, Any], None]] = None,
+        policy: Optional[PollPolicy] = None,
+        wake_key: Optional[str] = None,
+    ) -> Future:
+        """
+        Starts tracking a provider task and returns a Future for its terminal result.
+        The Future resolves to None if the task does not finish within `timeout` seconds.
+        `started_at` (epoch seconds, defaults to now) is when the provider task was submitted and
+        `expected_duration` its typical run time, both used by the provider's PollPolicy.
+        `on_done(task, result)` is called once the task finishes, fails or times out.
+        `policy` overrides the provider's PollPolicy, and `wake_key` lets wake() trigger an early check.
+        Submitting a task that is already tracked returns the existing Future.
+        """
+        key = (provider, task_id)
+        with self._cond:
+            existing = self._tasks.get(key)
+            if existing is not None:
+                return existing.future
+            now = time.monotonic()
+            task = PollTask(
+                provider, task_id, check, policy or self.policy(provider),
+                started_at or time.time(), now + timeout, expected_duration, label, on_done, wake_key,
+            )
+            self._tasks[key] = task
+            if wake_key:
+                self._wake_keys[wake_key] = task
+            self._push(task, now + first_delay)
+            self._ensure_started()
+        return task.future
+
+    async def wait(self, provider: str, task_id: str, check: Callable[[requests.Session], Any], **kwargs) -> Any:
+        """
+        submit() for coroutines: awaits the task's result on the caller's event loop, so
+        however many jobs are waiting on providers, none of them holds a thread meanwhile.
+        Cancelling the caller stops tracking the task.
+        """
+        return await asyncio.wrap_future(self.submit(provider, task_id, check, **kwargs))
+
+    def wake(self, wake_key: str) -> bool:
+        """Moves the task registered under `wake_key` to the front of the queue. Returns False if unknown."""
+        with self._cond:
+            task = self._wake_keys.get(wake_key)
+            if task is None:
+                return False
+            if task.heap_seq is not None:
+                self._push(task, time.monotonic())
+            else:
+                # A check is running and may have read the status just before the callback;
+                # have it reschedule immediately instead of on its normal interval
+                task.wake_pending = True
+            return True
+
+    def set_policy(self, provider: str, policy: PollPolicy):
+        """Sets the polling policy for every task of a provider submitted from now on."""
+        with self._cond:
+            self._policies[provider] = policy
+
+    def policy(self, provider: str) -> PollPolicy:
+        return self._policies.get(provider, DEFAULT_POLL_POLICY)
+
+    def session(self, provider: str) -> requests.Session:
+        """Returns the pooled keep-alive session shared by all checks (and job calls) for a provider."""
+        return get_provider_session(provider)
+
+    @property
+    def outstanding(self) -> int:
+        with self._cond:
+            return len(self._tasks)
+
+    # --- Internals ---
+
+    def _push(self, task: PollTask, due: float):
+        # Caller must hold self._cond. Any earlier heap entry for the task becomes stale.
+        task.heap_seq = next(self._seq)
+        heapq.heappush(self._heap, (due, task.heap_seq, task))
+        self._cond.notify()
+
+    def _ensure_started(self):
+        # Caller must hold self._cond
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._timer_loop, name="poll-scheduler", daemon=True)
+            self._thread.start()
+
+    def _executor(self, provider: str) -> ThreadPoolExecutor:
+        executor = self._executors.get(provider)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=self.workers_per_provider, thread_name_prefix=f"poll-{provider}")
+            self._executors[provider] = executor
+        return executor
+
+    def _timer_loop(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                now = time.monotonic()
+                due_at = self._heap[0][0]
+                if due_at > now:
+                    self._cond.wait(timeout=due_at - now)
+                    continue
+                # Pop everything that is due and group it by provider
+                due_by_provider: dict[str, list[PollTask]] = {}
+                while self._heap and self._heap[0][0] <= now:
+                    _, seq, task = heapq.heappop(self._heap)
+                    if seq != task.heap_seq:
+                        continue # Superseded by a wake()
+                    task.heap_seq = None
+                    due_by_provider.setdefault(task.provider, []).append(task)
+
+                for provider, tasks in due_by_provider.items():
+                    executor = self._executor(provider)
+                    for i in range(0, len(tasks), self.batch_size):
+                        executor.submit(self._run_batch, provider, tasks[i:i + self.batch_size])
+
+    def _run_batch(self, provider: str, tasks: list[PollTask]):
+        session = self.session(provider)
+        for task in tasks:
+            self._run_check(session, task)
+
+    def _run_check(self, session: requests.Session, task: PollTask):
+        if task.future.cancelled():
+            # Nobody is waiting for the result anymore
+            self._finish(task)
+            return
+        task.attempts += 1
+        hint = None
+        try:
+            result = task.check(session)
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"[POLL][{task.provider}] {task.label} check #{task.attempts} for {task.task_id} failed: {e}. Will retry.")
+            response = getattr(e, "response", None)
+            if response is not None and response.status_code in (429, 503):
+                hint = PollPending.from_response(response)
+            result = None
+        except Exception as e:
+            self._finish(task, error=e)
+            return
+
+        if isinstance(result, PollPending):
+            hint, result = result, None
+        if result is not None:
+            self._finish(task, result=result)
+            return
+
+        now = time.monotonic()
+        if now >= task.deadline:
+            logging.error(f"[POLL][{task.provider}] {task.label} gave up on {task.task_id} after {task.attempts} checks.")
+            self._finish(task, result=None)
+            return
+
+        # Always get one last check in right at the deadline
+        next_due = min(now + task.policy.next_interval(task, hint), task.deadline)
+        with self._cond:
+            if task.wake_pending:
+                task.wake_pending = False
+                next_due = now
+            self._push(task, next_due)
+
+    def _finish(self, task: PollTask, result: Any = None, error: Optional[BaseException] = None):
+        with self._cond:
+            self._tasks.pop((task.provider, task.task_id), None)
+            if task.wake_key and self._wake_keys.get(task.wake_key) is task:
+                del self._wake_keys[task.wake_key]
+        if task.on_done:
+            try:
+                task.on_done(task, None if error is not None else result)
+            except Exception as e:
+                logging.error(f"[POLL][{task.provider}] on_done callback failed for {task.task_id}: {e}")
+        if task.future.cancelled():
+            return
+        if error is not None:
+            task.future.set_exception(error)
+        else:
+            task.future.set_result(result)
+
+
+# Process-wide scheduler shared by all jobs in this worker
+poll_scheduler = PollScheduler()
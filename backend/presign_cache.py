@@ -0,0 +1,90 @@
+"""
+In-process cache of S3 presigned URLs.
+
+A job signs the same avatar and source video for several stages (Twelve Labs,
+Lemon Slice, Creatomate) and again on every retry. PresignCache hands back the
+URL it signed earlier for the same (bucket, key, method, content type, extra
+params) for as long as the URL stays valid for at least `safety_margin` more
+seconds, so the provider always gets enough lifetime to fetch it. Entries are
+kept in LRU order and capped at `max_entries`.
+
+URLs stay byte-for-byte identical across retries, which also lets providers
+that cache by URL reuse what they already downloaded.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+PRESIGN_CACHE_MAX_ENTRIES = int(os.getenv("PRESIGN_CACHE_MAX_ENTRIES", "2048"))
+# A cached URL is only reused while it has at least this much lifetime left
+PRESIGN_SAFETY_MARGIN_SECONDS = int(os.getenv("PRESIGN_SAFETY_MARGIN_SECONDS", "600"))
+
+
+class PresignCache:
+    """Bounded LRU of presigned URLs for one boto3 S3 client."""
+
+    def __init__(self, s3_client, max_entries: int = PRESIGN_CACHE_MAX_ENTRIES, safety_margin: float = PRESIGN_SAFETY_MARGIN_SECONDS):
+        self.s3_client = s3_client
+        self.max_entries = max_entries
+        self.safety_margin = safety_margin
+        # cache key -> (expires_at, url)
+        self._entries: "OrderedDict[tuple, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_url(
+        self,
+        bucket: str,
+        key: str,
+        method: str = 'get_object',
+        content_type: Optional[str] = None,
+        expires_in: int = 3600,
+        extra_params: Optional[dict] = None,
+    ) -> str:
+        """
+        Returns a presigned URL for `method` on s3://bucket/key, reusing a cached one when it
+        is still valid for longer than the safety margin. Raises whatever boto3 raises on signing errors.
+        """
+        params = {'Bucket': bucket, 'Key': key}
+        if content_type:
+            params['ContentType'] = content_type
+        if extra_params:
+            params.update(extra_params)
+        cache_key = (method, expires_in) + tuple(sorted((k, str(v)) for k, v in params.items()))
+        now = time.time()
+        with self._lock:
+            cached = self._entries.get(cache_key)
+            if cached and cached[0] - now > self.safety_margin:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        # Stamp the expiry before signing so the cached lifetime never overstates the real one
+        url = self.s3_client.generate_presigned_url(method, Params=params, ExpiresIn=expires_in)
+        # URLs that can't outlive the margin are never worth caching
+        if expires_in > self.safety_margin:
+            with self._lock:
+                self._entries[cache_key] = (now + expires_in, url)
+                self._entries.move_to_end(cache_key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return url
+
+    def get_urls(self, bucket: str, keys: Iterable[str], method: str = 'get_object', expires_in: int = 3600) -> dict[str, str]:
+        """Bulk variant of get_url: presigns every key (reusing cached URLs) and returns {key: url}."""
+        return {key: self.get_url(bucket, key, method=method, expires_in=expires_in) for key in keys}
+
+    def invalidate(self, bucket: str, key: str):
+        """Drops every cached URL for an object, e.g. after it was overwritten or deleted."""
+        with self._lock:
+            for cache_key in [k for k in self._entries if ('Bucket', bucket) in k and ('Key', key) in k]:
+                del self._entries[cache_key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
@@ -0,0 +1,196 @@
+"""
+Read-through cache for rows of the Supabase `profiles` table.
+
+One select of the columns the app uses (credits, plan, subscription status,
+Stripe customer) serves every caller: /api/credits, /api/subscription-status,
+the voice check in continue-generation and seeding the credit ledger.
+Lookups go in-process cache -> Redis -> Supabase. Concurrent misses for the
+same user are coalesced (singleflight) so only one of them hits the database.
+
+Anything that writes a profile (Stripe webhook, profile setup, the credit
+ledger write-behind) must call invalidate_profile()/async_invalidate_profile() after
+the write. The in-process TTL is kept short because other processes only see
+the Redis invalidation.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import redis
+
+from redis_client import redis_client, async_redis_client
+from supabase_client import supabase, get_async_supabase
+
+PROFILE_COLUMNS = "id, credits, subscription_status, subscription_plan, stripe_customer_id"
+PROFILE_CACHE_PREFIX = "profile_cache"
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "300"))
+# In-process copies are only trusted briefly; other processes' invalidations only reach Redis
+PROFILE_LOCAL_TTL = 2
+
+_local: dict[str, tuple[float, dict]] = {}
+_local_lock = threading.Lock()
+
+
+class _Flight:
+    """One in-progress database load that concurrent callers wait on."""
+    __slots__ = ("done", "ok", "result")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = False
+        self.result: Optional[dict] = None
+
+
+# Singleflight state: one in-progress load per user
+_sync_inflight: dict[str, _Flight] = {}
+_async_inflight: dict[str, asyncio.Future] = {}
+
+
+def _cache_key(user_id: str) -> str:
+    return f"{PROFILE_CACHE_PREFIX}:{user_id}"
+
+
+def _get_local(user_id: str) -> Optional[dict]:
+    with _local_lock:
+        cached = _local.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            return dict(cached[1])
+        _local.pop(user_id, None)
+    return None
+
+
+def _set_local(user_id: str, profile: dict):
+    with _local_lock:
+        _local[user_id] = (time.monotonic() + PROFILE_LOCAL_TTL, dict(profile))
+
+
+def _drop_local(user_id: str):
+    with _local_lock:
+        _local.pop(user_id, None)
+
+
+# --- Sync API (worker) ---
+
+def get_profile(user_id: str) -> Optional[dict]:
+    """Returns the user's profile row (PROFILE_COLUMNS), or None if there is none."""
+    profile = _get_local(user_id)
+    if profile is not None:
+        return profile
+    try:
+        cached = redis_client.get(_cache_key(user_id))
+        if cached:
+            profile = json.loads(cached)
+            _set_local(user_id, profile)
+            return profile
+    except redis.exceptions.RedisError as e:
+        logging.warning(f"[PROFILE_CACHE] Redis lookup failed for {user_id}: {e}")
+
+    with _local_lock:
+        flight = _sync_inflight.get(user_id)
+        leader = flight is None
+        if leader:
+            flight = _Flight()
+            _sync_inflight[user_id] = flight
+    if not leader:
+        if flight.done.wait(timeout=10) and flight.ok:
+            return dict(flight.result) if flight.result else None
+        # The leader failed or is stuck - read the database ourselves
+        return _load_profile(user_id)
+
+    try:
+        flight.result = _load_profile(user_id)
+        flight.ok = True
+        return flight.result
+    finally:
+        with _local_lock:
+            _sync_inflight.pop(user_id, None)
+        flight.done.set()
+
+
+def _load_profile(user_id: str) -> Optional[dict]:
+    response = supabase.table('profiles').select(PROFILE_COLUMNS).eq('id', user_id).maybe_single().execute()
+    profile = response.data if response else None
+    if profile:
+        _store(user_id, profile)
+    return profile
+
+
+def _store(user_id: str, profile: dict):
+    _set_local(user_id, profile)
+    try:
+        redis_client.set(_cache_key(user_id), json.dumps(profile), ex=PROFILE_CACHE_TTL)
+    except redis.exceptions.RedisError as e:
+        logging.warning(f"[PROFILE_CACHE] Failed to cache profile for {user_id}: {e}")
+
+
+def invalidate_profile(user_id: str):
+    """Drops the cached profile after a write to the user's `profiles` row."""
+    _drop_local(user_id)
+    try:
+        redis_client.delete(_cache_key(user_id))
+    except redis.exceptions.RedisError as e:
+        logging.error(f"[PROFILE_CACHE] Failed to invalidate profile for {user_id}: {e}")
+
+
+# --- Async API (FastAPI) ---
+
+async def async_get_profile(user_id: str) -> Optional[dict]:
+    """get_profile for the API's event loop."""
+    profile = _get_local(user_id)
+    if profile is not None:
+        return profile
+    try:
+        cached = await async_redis_client.get(_cache_key(user_id))
+        if cached:
+            profile = json.loads(cached)
+            _set_local(user_id, profile)
+            return profile
+    except redis.exceptions.RedisError as e:
+        logging.warning(f"[PROFILE_CACHE] Redis lookup failed for {user_id}: {e}")
+
+    inflight = _async_inflight.get(user_id)
+    if inflight is not None:
+        result = await asyncio.shield(inflight)
+        return dict(result) if result else None
+
+    future = asyncio.get_running_loop().create_future()
+    _async_inflight[user_id] = future
+    try:
+        profile = await _async_load_profile(user_id)
+        future.set_result(profile)
+        return profile
+    except Exception as e:
+        future.set_exception(e)
+        # Mark it retrieved so asyncio doesn't warn when nobody else was waiting
+        future.exception()
+        raise
+    finally:
+        _async_inflight.pop(user_id, None)
+        if not future.done():
+            future.cancel()
+
+
+async def _async_load_profile(user_id: str) -> Optional[dict]:
+    response = await get_async_supabase().table('profiles').select(PROFILE_COLUMNS).eq('id', user_id).maybe_single().execute()
+    profile = response.data if response else None
+    if profile:
+        _set_local(user_id, profile)
+        try:
+            await async_redis_client.set(_cache_key(user_id), json.dumps(profile), ex=PROFILE_CACHE_TTL)
+        except redis.exceptions.RedisError as e:
+            logging.warning(f"[PROFILE_CACHE] Failed to cache profile for {user_id}: {e}")
+    return profile
+
+
+async def async_invalidate_profile(user_id: str):
+    """invalidate_profile for the API's event loop."""
+    _drop_local(user_id)
+    try:
+        await async_redis_client.delete(_cache_key(user_id))
+    except redis.exceptions.RedisError as e:
+        logging.error(f"[PROFILE_CACHE] Failed to invalidate profile for {user_id}: {e}")
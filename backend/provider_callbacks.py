@@ -0,0 +1,109 @@
+"""
+Provider completion callbacks.
+
+Lemon Slice and Creatomate can notify us when a generation/render finishes.
+We hand them a per-job callback URL (signed with an HMAC token so only the
+provider we gave it to can hit it). The API publishes each callback on a
+Redis pub/sub channel, and every worker listens on that channel and wakes the
+matching poll scheduler task, which then runs its status check right away.
+
+The callback only ever triggers a check; the job's result still comes from
+the provider's status API, so a forged or duplicated callback can't inject a
+result. Callbacks that get lost are covered by the (slow) fallback polling.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import redis
+
+from redis_client import redis_client, async_redis_client
+
+# Public base URL of the API (e.g. https://api.rmerge.com). Callbacks are disabled when unset.
+PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", "").rstrip("/")
+PROVIDER_CALLBACK_SECRET = os.getenv("PROVIDER_CALLBACK_SECRET", "")
+PROVIDER_CALLBACK_CHANNEL = "provider_callbacks"
+CALLBACK_PROVIDERS = ("lemon_slice", "creatomate")
+
+
+def callbacks_enabled() -> bool:
+    return bool(PUBLIC_API_URL and PROVIDER_CALLBACK_SECRET)
+
+
+def callback_wake_key(provider: str, job_id: str) -> str:
+    """Poll scheduler wake key for the stage of `job_id` that `provider` calls back about."""
+    return f"{provider}:{job_id}"
+
+
+def _callback_token(provider: str, job_id: str) -> str:
+    return hmac.new(PROVIDER_CALLBACK_SECRET.encode("utf-8"), f"{provider}:{job_id}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def build_callback_url(provider: str, job_id: str) -> Optional[str]:
+    """Returns the signed callback URL to hand to a provider, or None if callbacks are disabled."""
+    if not callbacks_enabled():
+        return None
+    return f"{PUBLIC_API_URL}/api/provider-callback/{provider}/{job_id}?token={_callback_token(provider, job_id)}"
+
+
+def verify_callback_token(provider: str, job_id: str, token: str) -> bool:
+    if not callbacks_enabled() or not token:
+        return False
+    return hmac.compare_digest(_callback_token(provider, job_id), token)
+
+
+def _callback_message(provider: str, job_id: str, status: Optional[str]) -> str:
+    return json.dumps({"wake_key": callback_wake_key(provider, job_id), "status": status, "received_at": time.time()})
+
+
+def publish_provider_callback(provider: str, job_id: str, status: Optional[str] = None) -> int:
+    """Notifies every worker that `provider` reported on `job_id`. Returns the number of listeners reached."""
+    return redis_client.publish(PROVIDER_CALLBACK_CHANNEL, _callback_message(provider, job_id, status))
+
+
+async def async_publish_provider_callback(provider: str, job_id: str, status: Optional[str] = None) -> int:
+    """publish_provider_callback for the API's event loop."""
+    return await async_redis_client.publish(PROVIDER_CALLBACK_CHANNEL, _callback_message(provider, job_id, status))
+
+
+class CallbackListener:
+    """Background thread that wakes poll scheduler tasks when provider callbacks are published."""
+
+    def __init__(self, scheduler, redis_conn: redis.Redis = redis_client):
+        self.scheduler = scheduler
+        self.redis_conn = redis_conn
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._listen, name="provider-callbacks", daemon=True)
+            self._thread.start()
+
+    def _listen(self):
+        while True:
+            pubsub = self.redis_conn.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(PROVIDER_CALLBACK_CHANNEL)
+                logging.info(f"[CALLBACK] Listening for provider callbacks on '{PROVIDER_CALLBACK_CHANNEL}'.")
+                for message in pubsub.listen():
+                    self._handle(message.get('data'))
+            except redis.exceptions.RedisError as e:
+                logging.error(f"[CALLBACK] Callback listener lost its Redis connection: {e}. Resubscribing in 5s...")
+                time.sleep(5)
+            finally:
+                pubsub.close()
+
+    def _handle(self, data):
+        try:
+            wake_key = json.loads(data).get('wake_key')
+        except (TypeError, ValueError):
+            logging.warning(f"[CALLBACK] Ignoring malformed callback message: {data!r}")
+            return
+        if wake_key and self.scheduler.wake(wake_key):
+            logging.info(f"[CALLBACK] Provider callback received for '{wake_key}', checking now.")
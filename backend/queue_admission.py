@@ -0,0 +1,213 @@
+"""
+Admission control and ETAs for new generation jobs.
+
+Before a job is enqueued, the API reads how deep the job streams are
+(XINFO GROUPS: `lag` = entries not yet delivered, `pending` = delivered but not
+acknowledged), how many workers are alive (XINFO CONSUMERS, consumers that
+touched a stream recently) and how long the provider stages usually take
+(the rolling stage_stats history). From that it estimates when the job will
+start and finish, and refuses new jobs with 429 + Retry-After while the backlog
+ahead of them is above QUEUE_MAX_BACKLOG, so a burst can't grow the queue without bound.
+
+Only streams at the job's priority or higher count as "ahead", so a flood of
+free-tier jobs never blocks paying users from enqueueing.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from job_streams import ALL_JOB_STREAMS, JOB_CONSUMER_GROUP
+from redis_client import async_redis_client
+from stage_stats import STAGE_MIN_SAMPLES, STAGE_STATS_PREFIX
+
+# Jobs waiting ahead of a new one above which it is refused
+QUEUE_MAX_BACKLOG = int(os.getenv("QUEUE_MAX_BACKLOG", "500"))
+# Must match the workers' WORKER_MAX_IN_FLIGHT
+WORKER_MAX_IN_FLIGHT = int(os.getenv("WORKER_MAX_IN_FLIGHT", "32"))
+# A consumer that hasn't read, claimed or heartbeated for this long is considered gone
+QUEUE_CONSUMER_ALIVE_MS = int(os.getenv("QUEUE_CONSUMER_ALIVE_MS", "30000"))
+# Queue snapshots are shared between requests for this long
+QUEUE_SNAPSHOT_SECONDS = 2.0
+QUEUE_RETRY_AFTER_MIN = 5
+QUEUE_RETRY_AFTER_MAX = 600
+
+# Provider stages a job goes through, with the duration assumed until enough history exists
+JOB_STAGE_DEFAULT_SECONDS = {"indexing": 60.0, "lip_sync": 180.0, "render": 60.0}
+# Stage durations are re-read from Redis this often
+JOB_DURATION_CACHE_SECONDS = 300
+
+
+@dataclass
+class QueueSnapshot:
+    # stream -> entries not yet delivered to any worker
+    lag: dict[str, int]
+    # Entries delivered but not yet acknowledged, across all streams
+    in_progress: int
+    alive_consumers: int
+
+
+@dataclass
+class QueueEstimate:
+    jobs_ahead: int
+    alive_consumers: int
+    wait_seconds: Optional[float]
+    job_seconds: float
+
+    def as_dict(self) -> dict:
+        now = time.time()
+        start = now + self.wait_seconds if self.wait_seconds is not None else None
+        return {
+            "jobs_ahead": self.jobs_ahead,
+            "workers_available": self.alive_consumers > 0,
+            "estimated_wait_seconds": round(self.wait_seconds) if self.wait_seconds is not None else None,
+            "estimated_start_at": _iso(start),
+            # Excludes time spent reviewing the script in manual mode
+            "estimated_finish_at": _iso(start + self.job_seconds if start is not None else None),
+        }
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp))
+
+
+_snapshot: Optional[tuple[float, QueueSnapshot]] = None
+_snapshot_lock = asyncio.Lock()
+_job_seconds: Optional[tuple[float, float]] = None
+
+
+async def get_queue_snapshot() -> QueueSnapshot:
+    """Lag per stream, entries in progress and live consumers, from one pipelined round trip (briefly cached)."""
+    global _snapshot
+    async with _snapshot_lock:
+        if _snapshot and time.monotonic() - _snapshot[0] < QUEUE_SNAPSHOT_SECONDS:
+            return _snapshot[1]
+
+        pipe = async_redis_client.pipeline(transaction=False)
+        for stream in ALL_JOB_STREAMS:
+            pipe.xinfo_groups(stream)
+            pipe.xinfo_consumers(stream, JOB_CONSUMER_GROUP)
+        results = await pipe.execute(raise_on_error=False)
+
+        lag: dict[str, int] = {}
+        in_progress = 0
+        # Workers read every stream, so a consumer is alive if it's active on any of them
+        consumer_idle: dict[str, int] = {}
+        for index, stream in enumerate(ALL_JOB_STREAMS):
+            groups, consumers = results[2 * index], results[2 * index + 1]
+            group = None
+            if not isinstance(groups, Exception):
+                group = next((g for g in groups if g.get('name') == JOB_CONSUMER_GROUP), None)
+            if group is None:
+                # Stream or group not created yet: nothing queued there
+                lag[stream] = 0
+                continue
+            # `lag` is missing before Redis 7 and None when Redis can't tell (after deletions/trimming)
+            stream_lag = group.get('lag')
+            if stream_lag is None:
+                stream_lag = await _count_undelivered(stream, group.get('last-delivered-id') or '0-0')
+            lag[stream] = int(stream_lag)
+            in_progress += int(group.get('pending') or 0)
+            if not isinstance(consumers, Exception):
+                for consumer in consumers:
+                    # `idle` counts from the last attempted interaction, so a worker blocked on
+                    # empty streams stays alive. (`inactive`, Redis 7.2+, only counts successful
+                    # reads and would make an idle system look like it has no workers.)
+                    idle = consumer.get('idle') or 0
+                    name = consumer.get('name')
+                    consumer_idle[name] = min(int(idle), consumer_idle.get(name, int(idle)))
+
+        alive = sum(1 for idle in consumer_idle.values() if idle < QUEUE_CONSUMER_ALIVE_MS)
+        snapshot = QueueSnapshot(lag=lag, in_progress=in_progress, alive_consumers=alive)
+        _snapshot = (time.monotonic(), snapshot)
+        return snapshot
+
+
+async def _count_undelivered(stream: str, last_delivered_id: str) -> int:
+    """Fallback for a missing `lag`: counts entries after the group's last-delivered-id, up to the admission limit."""
+    entries = await async_redis_client.xrange(stream, min=f"({last_delivered_id}", max='+', count=QUEUE_MAX_BACKLOG + 1)
+    return len(entries)
+
+
+async def get_expected_job_seconds() -> float:
+    """Typical end-to-end processing time of a job: the median of each provider stage's recent durations."""
+    global _job_seconds
+    now = time.monotonic()
+    if _job_seconds and now - _job_seconds[0] < JOB_DURATION_CACHE_SECONDS:
+        return _job_seconds[1]
+
+    pipe = async_redis_client.pipeline(transaction=False)
+    for stage in JOB_STAGE_DEFAULT_SECONDS:
+        pipe.lrange(f"{STAGE_STATS_PREFIX}:{stage}", 0, -1)
+    histories = await pipe.execute()
+
+    total = 0.0
+    for (stage, default), history in zip(JOB_STAGE_DEFAULT_SECONDS.items(), histories):
+        try:
+            samples = sorted(float(v) for v in history)
+        except ValueError:
+            samples = []
+        total += samples[len(samples) // 2] if len(samples) >= STAGE_MIN_SAMPLES else default
+    _job_seconds = (now, total)
+    return total
+
+
+def _jobs_ahead(snapshot: QueueSnapshot, job_stream: str) -> int:
+    """Undelivered entries on the job's stream and every higher-priority one."""
+    ahead = 0
+    for stream in ALL_JOB_STREAMS:
+        ahead += snapshot.lag.get(stream, 0)
+        if stream == job_stream:
+            break
+    return ahead
+
+
+def _wait_seconds(jobs: int, in_progress: int, consumers: int, job_seconds: float) -> Optional[float]:
+    """Time until `jobs` queued entries have been started, assuming every live worker runs WORKER_MAX_IN_FLIGHT jobs."""
+    if consumers <= 0:
+        return None
+    capacity = consumers * WORKER_MAX_IN_FLIGHT
+    free_slots = max(0, capacity - in_progress)
+    if jobs < free_slots:
+        return 0.0
+    # Each round of `capacity` jobs takes about one job duration to clear
+    return math.ceil((jobs - free_slots + 1) / capacity) * job_seconds
+
+
+async def estimate_queue(job_stream: str) -> QueueEstimate:
+    snapshot, job_seconds = await asyncio.gather(get_queue_snapshot(), get_expected_job_seconds())
+    jobs_ahead = _jobs_ahead(snapshot, job_stream)
+    return QueueEstimate(
+        jobs_ahead=jobs_ahead,
+        alive_consumers=snapshot.alive_consumers,
+        wait_seconds=_wait_seconds(jobs_ahead, snapshot.in_progress, snapshot.alive_consumers, job_seconds),
+        job_seconds=job_seconds,
+    )
+
+
+def retry_after_seconds(estimate: QueueEstimate) -> int:
+    """How long a refused client should wait: roughly until the backlog drains back under the limit."""
+    if estimate.alive_consumers <= 0:
+        return QUEUE_RETRY_AFTER_MAX // 10
+    excess = estimate.jobs_ahead - QUEUE_MAX_BACKLOG + 1
+    seconds = math.ceil(excess / (estimate.alive_consumers * WORKER_MAX_IN_FLIGHT)) * estimate.job_seconds
+    return int(min(QUEUE_RETRY_AFTER_MAX, max(QUEUE_RETRY_AFTER_MIN, seconds)))
+
+
+def is_over_backlog(estimate: QueueEstimate) -> bool:
+    return estimate.jobs_ahead >= QUEUE_MAX_BACKLOG
+
+
+async def check_admission(job_stream: str) -> Optional[QueueEstimate]:
+    """Estimate for a job about to go on `job_stream`, or None if the queue can't be inspected (admit it then)."""
+    try:
+        return await estimate_queue(job_stream)
+    except Exception as e:
+        logging.warning(f"[ADMISSION] Could not inspect the job queue, admitting without an estimate: {e}")
+        return None
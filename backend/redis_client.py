@@ -1,4 +1,5 @@
 import redis
+import redis.asyncio
 import os
 from dotenv import load_dotenv
 
@@ -13,6 +14,8 @@ print(f"[REDIS] Connecting to Redis at: {REDIS_URL.replace('://', '://*:*@').spl
 
 # Use decode_responses=True to get strings back instead of bytes
 redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+# Async client for API endpoints that wait on Redis (pub/sub, long-polls) without blocking the event loop
+async_redis_client = redis.asyncio.from_url(REDIS_URL, decode_responses=True)
 
 # Define the stream name we'll use for jobs
 MEME_JOB_STREAM = "meme_jobs"
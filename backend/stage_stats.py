@@ -0,0 +1,65 @@
+"""
+Rolling history of how long provider stages take.
+
+Every finished stage (Twelve Labs indexing, Lemon Slice generation, Creatomate
+render) records its duration in a capped Redis list shared by all workers. The
+poll scheduler uses a low percentile of that history as the stage's expected
+duration, so it can wait out the part of a task that is certainly still running
+and poll tightly only around when the task usually completes.
+"""
+
+import logging
+import threading
+import time
+from typing import Optional
+
+import redis
+
+from redis_client import redis_client
+
+STAGE_STATS_PREFIX = "stage_durations"
+# Samples kept per stage
+STAGE_HISTORY_SIZE = 200
+# Fewer samples than this and we don't trust the history yet
+STAGE_MIN_SAMPLES = 5
+# Percentile used as the expected duration. Kept low so most tasks finish after
+# polling has already tightened, trading a few extra early checks for latency.
+STAGE_EXPECTED_PERCENTILE = 0.25
+# How long an expected duration is cached in-process before re-reading Redis
+STAGE_STATS_CACHE_SECONDS = 300
+
+_expected_cache: dict[str, tuple[float, Optional[float]]] = {}
+_expected_cache_lock = threading.Lock()
+
+
+def record_stage_duration(stage: str, seconds: float):
+    """Adds one observed duration to the stage's rolling history."""
+    key = f"{STAGE_STATS_PREFIX}:{stage}"
+    try:
+        pipe = redis_client.pipeline()
+        pipe.lpush(key, round(seconds, 2))
+        pipe.ltrim(key, 0, STAGE_HISTORY_SIZE - 1)
+        pipe.execute()
+    except redis.exceptions.RedisError as e:
+        logging.warning(f"[STATS] Failed to record duration for stage '{stage}': {e}")
+
+
+def get_expected_stage_duration(stage: str) -> Optional[float]:
+    """Returns the expected duration (in seconds) of a stage from recent history, or None if unknown."""
+    now = time.monotonic()
+    with _expected_cache_lock:
+        cached = _expected_cache.get(stage)
+        if cached and now - cached[0] < STAGE_STATS_CACHE_SECONDS:
+            return cached[1]
+
+    expected = None
+    try:
+        samples = sorted(float(v) for v in redis_client.lrange(f"{STAGE_STATS_PREFIX}:{stage}", 0, -1))
+        if len(samples) >= STAGE_MIN_SAMPLES:
+            expected = samples[int(len(samples) * STAGE_EXPECTED_PERCENTILE)]
+    except (redis.exceptions.RedisError, ValueError) as e:
+        logging.warning(f"[STATS] Failed to read duration history for stage '{stage}': {e}")
+
+    with _expected_cache_lock:
+        _expected_cache[stage] = (now, expected)
+    return expected
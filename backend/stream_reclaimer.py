@@ -0,0 +1,181 @@
+"""
+Reclaims stalled job stream entries.
+
+Entries that a consumer claimed but never acknowledged (worker crashed, was
+killed mid-job, or the handler raised) stay in the group's pending list forever
+unless someone takes them over. The reclaimer periodically XAUTOCLAIMs entries
+that have been idle longer than `min_idle_ms`, checks how often each one has
+already been delivered, and either hands it back to the engine for another
+attempt or moves it to the dead-letter stream with its last recorded error.
+
+Live workers keep their in-flight entries fresh (see JobEngine's heartbeat), so
+only genuinely abandoned entries ever cross the idle threshold.
+
+The reclaimer also bounds the stream's length. Producers don't pass MAXLEN to
+XADD, because that would drop entries no worker has finished yet. Instead, trim()
+removes entries older than both the last `retain_entries` and the oldest entry
+any consumer group still needs: its oldest pending entry or, failing that, its
+last-delivered ID. Approximate trimming lets Redis drop whole macro nodes cheaply.
+"""
+
+import logging
+import time
+from typing import Callable, Optional
+
+import redis
+
+
+class StreamReclaimer:
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        stream: str,
+        group_name: str,
+        consumer_name: str,
+        min_idle_ms: int = 60_000,
+        max_deliveries: int = 3,
+        consumer_max_idle_ms: int = 3_600_000,
+        retain_entries: int = 1000,
+        dead_letter_max_entries: int = 10000,
+        on_dead_letter: Optional[Callable[[str, dict, str], None]] = None,
+    ):
+        self.redis_client = redis_client
+        self.stream = stream
+        self.group_name = group_name
+        self.consumer_name = consumer_name
+        self.min_idle_ms = min_idle_ms
+        self.max_deliveries = max_deliveries
+        self.consumer_max_idle_ms = consumer_max_idle_ms
+        # Acknowledged entries kept for debugging; never applies to entries still needed
+        self.retain_entries = retain_entries
+        self.dead_letter_max_entries = dead_letter_max_entries
+        self.on_dead_letter = on_dead_letter
+        self.dead_letter_stream = f"{stream}:dead"
+        # Hash of message_id -> last error message, shared by all workers
+        self.errors_key = f"{stream}:errors"
+        self._cursor = "0-0"
+
+    def reclaim(self, count: int) -> list[tuple[str, str, dict]]:
+        """
+        Claims up to `count` stalled entries for this consumer. Returns (stream, message_id, fields)
+        tuples that should be processed again; entries over the delivery limit are dead-lettered.
+        """
+        result = self.redis_client.xautoclaim(
+            self.stream,
+            self.group_name,
+            self.consumer_name,
+            min_idle_time=self.min_idle_ms,
+            start_id=self._cursor,
+            count=count,
+        )
+        # [next_start_id, [(message_id, fields), ...], deleted_ids (Redis 7+)]
+        self._cursor = result[0] or "0-0"
+        claimed = result[1] or []
+        if not claimed:
+            return []
+
+        entries = []
+        for message_id, fields in claimed:
+            if not fields:
+                # The entry was trimmed/deleted from the stream; nothing left to process
+                self.redis_client.xack(self.stream, self.group_name, message_id)
+                continue
+
+            deliveries = self._delivery_count(message_id)
+            if deliveries > self.max_deliveries:
+                self.dead_letter(message_id, fields, deliveries)
+                continue
+
+            logging.warning(f"[RECLAIM] Reclaimed stalled job {message_id} (delivery #{deliveries}).")
+            entries.append((self.stream, message_id, fields))
+        return entries
+
+    def record_failure(self, message_id: str, error: str):
+        """Remembers why an attempt failed so it can be attached to a dead-lettered entry."""
+        try:
+            self.redis_client.hset(self.errors_key, message_id, error[:2000])
+        except redis.exceptions.RedisError as e:
+            logging.error(f"[RECLAIM] Failed to record error for {message_id}: {e}")
+
+    def clear_failure(self, message_id: str):
+        try:
+            self.redis_client.hdel(self.errors_key, message_id)
+        except redis.exceptions.RedisError as e:
+            logging.error(f"[RECLAIM] Failed to clear error for {message_id}: {e}")
+
+    def dead_letter(self, message_id: str, fields: dict, deliveries: int):
+        """Moves an entry to the dead-letter stream (with its last error) and acknowledges it."""
+        last_error = self.redis_client.hget(self.errors_key, message_id) or "Abandoned by consumer (no error recorded)"
+        dead_fields = dict(fields)
+        dead_fields.update({
+            "original_id": message_id,
+            "delivery_count": str(deliveries),
+            "last_error": last_error,
+            "dead_lettered_at": str(time.time()),
+        })
+        pipe = self.redis_client.pipeline()
+        pipe.xadd(self.dead_letter_stream, dead_fields, maxlen=self.dead_letter_max_entries, approximate=True)
+        pipe.xack(self.stream, self.group_name, message_id)
+        pipe.hdel(self.errors_key, message_id)
+        pipe.execute()
+        logging.error(f"[RECLAIM] Moved job {message_id} to '{self.dead_letter_stream}' after {deliveries} deliveries. Last error: {last_error}")
+
+        if self.on_dead_letter:
+            try:
+                self.on_dead_letter(message_id, fields, last_error)
+            except Exception as e:
+                logging.error(f"[RECLAIM] Dead-letter callback failed for {message_id}: {e}")
+
+    def prune_consumers(self) -> int:
+        """Deletes other consumers that have nothing pending and have been idle too long."""
+        pruned = 0
+        for consumer in self.redis_client.xinfo_consumers(self.stream, self.group_name):
+            name = consumer.get('name')
+            if name == self.consumer_name:
+                continue
+            if consumer.get('pending', 0) == 0 and consumer.get('idle', 0) > self.consumer_max_idle_ms:
+                self.redis_client.xgroup_delconsumer(self.stream, self.group_name, name)
+                logging.info(f"[RECLAIM] Pruned idle consumer '{name}' from group '{self.group_name}'.")
+                pruned += 1
+        return pruned
+
+    def trim(self) -> int:
+        """
+        Trims entries every consumer group is done with, keeping at least the newest `retain_entries`.
+        Returns the number of entries removed.
+        """
+        if self.redis_client.xlen(self.stream) <= self.retain_entries:
+            return 0
+        groups = self.redis_client.xinfo_groups(self.stream)
+        if not groups:
+            # Without a group nobody has consumed anything yet
+            return 0
+
+        floor = None
+        for group in groups:
+            # Pending entries aren't acknowledged yet; everything after last-delivered-id is still undelivered
+            pending = self.redis_client.xpending(self.stream, group['name'])
+            group_floor = pending['min'] if pending.get('pending') else group.get('last-delivered-id')
+            if not group_floor or group_floor == '0-0':
+                return 0
+            floor = group_floor if floor is None else min(floor, group_floor, key=_stream_id_key)
+
+        newest = self.redis_client.xrevrange(self.stream, count=self.retain_entries)
+        min_id = min(floor, newest[-1][0], key=_stream_id_key)
+        trimmed = self.redis_client.xtrim(self.stream, minid=min_id, approximate=True)
+        if trimmed:
+            logging.info(f"[RECLAIM] Trimmed {trimmed} finished entries from '{self.stream}' (kept from {min_id}).")
+        return trimmed
+
+    def _delivery_count(self, message_id: str) -> int:
+        pending = self.redis_client.xpending_range(
+            self.stream, self.group_name, min=message_id, max=message_id, count=1
+        )
+        if not pending:
+            return 1
+        return int(pending[0].get('times_delivered', 1))
+
+
+def _stream_id_key(stream_id: str) -> tuple[int, int]:
+    milliseconds, _, sequence = stream_id.partition('-')
+    return int(milliseconds), int(sequence or 0)
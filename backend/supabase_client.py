@@ -1,5 +1,6 @@
 import os
-from supabase import create_client, Client
+from typing import Optional
+from supabase import create_client, acreate_client, Client, AsyncClient
 from dotenv import load_dotenv
 
 load_dotenv() # Load environment variables from .env file
@@ -10,4 +11,19 @@ key: str = os.environ.get("SUPABASE_SERVICE_KEY")
 if not url or not key:
     raise EnvironmentError("Supabase URL or Service Key environment variables not set.")
 
-supabase: Client = create_client(url, key) 
\ No newline at end of file
+supabase: Client = create_client(url, key) # Used by the worker (sync code on threads)
+
+# Async client for the API's event loop. Creating it is a coroutine, so it's set up on startup.
+_async_supabase: Optional[AsyncClient] = None
+
+async def init_async_supabase() -> AsyncClient:
+    global _async_supabase
+    if _async_supabase is None:
+        _async_supabase = await acreate_client(url, key)
+    return _async_supabase
+
+def get_async_supabase() -> AsyncClient:
+    """Returns the async client created by init_async_supabase() at API startup."""
+    if _async_supabase is None:
+        raise RuntimeError("Async Supabase client not initialized - call init_async_supabase() on startup.")
+    return _async_supabase
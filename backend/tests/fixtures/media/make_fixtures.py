@@ -0,0 +1,143 @@
+"""
+Writes the small container fixtures used by tests/test_media_probe.py.
+
+The files hold real container headers around a few bytes of filler instead of
+encoded frames, which is all the preflight parser reads. Re-run this script
+from any directory to regenerate them.
+"""
+
+import os
+import struct
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# --- MP4 / MOV ---
+
+def box(box_type: bytes, *children: bytes) -> bytes:
+    payload = b"".join(children)
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def full_box(box_type: bytes, version: int, body: bytes) -> bytes:
+    return box(box_type, struct.pack(">B3x", version) + body)
+
+
+def mvhd(timescale: int, duration: int) -> bytes:
+    # creation/modification time, timescale, duration, then rate, volume, matrix etc. (zeroed)
+    return full_box(b"mvhd", 0, struct.pack(">IIII", 0, 0, timescale, duration) + bytes(80))
+
+
+def tkhd(width: int, height: int) -> bytes:
+    # Fixed fields, then the 16.16 presentation size as the last 8 bytes
+    return full_box(b"tkhd", 0, bytes(72) + struct.pack(">II", width << 16, height << 16))
+
+
+def mdhd(timescale: int, duration: int) -> bytes:
+    return full_box(b"mdhd", 0, struct.pack(">IIII", 0, 0, timescale, duration) + bytes(4))
+
+
+def hdlr(handler: bytes) -> bytes:
+    return full_box(b"hdlr", 0, bytes(4) + handler + bytes(12) + b"\x00")
+
+
+def stsd(codec: bytes, width: int = 0, height: int = 0) -> bytes:
+    # One sample entry: reserved, data reference index, then (for video) the coded size at offset 32
+    entry_body = bytes(6) + struct.pack(">H", 1) + bytes(16) + struct.pack(">HH", width, height) + bytes(50)
+    entry = struct.pack(">I4s", 8 + len(entry_body), codec) + entry_body
+    return full_box(b"stsd", 0, struct.pack(">I", 1) + entry)
+
+
+def trak(handler: bytes, codec: bytes, timescale: int, duration: int, width: int = 0, height: int = 0) -> bytes:
+    return box(
+        b"trak",
+        tkhd(width, height),
+        box(
+            b"mdia",
+            mdhd(timescale, duration),
+            hdlr(handler),
+            box(b"minf", box(b"stbl", stsd(codec, width, height))),
+        ),
+    )
+
+
+def moov(duration_seconds: int) -> bytes:
+    return box(
+        b"moov",
+        mvhd(1000, duration_seconds * 1000),
+        trak(b"vide", b"avc1", 90000, duration_seconds * 90000, 1280, 720),
+        trak(b"soun", b"mp4a", 48000, duration_seconds * 48000),
+    )
+
+
+FTYP = box(b"ftyp", b"isom", struct.pack(">I", 512), b"isomiso2avc1mp41")
+MDAT = box(b"mdat", bytes(4096))
+
+
+# --- WebM ---
+
+def ebml_id(element_id: int) -> bytes:
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+
+
+def ebml_size(size: int) -> bytes:
+    # Always the 8-byte form, so offsets don't depend on the sizes being written
+    return bytes([0x01]) + size.to_bytes(7, "big")
+
+
+def element(element_id: int, *children: bytes) -> bytes:
+    payload = b"".join(children)
+    return ebml_id(element_id) + ebml_size(len(payload)) + payload
+
+
+def uint(element_id: int, value: int) -> bytes:
+    return element(element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big"))
+
+
+def webm_seekhead_after_clusters() -> bytes:
+    """Info and Tracks written after the first Cluster, reachable only through the SeekHead."""
+    info = element(
+        0x1549A966,
+        uint(0x2AD7B1, 1000000),
+        element(0x4489, struct.pack(">d", 12500.0)),
+    )
+    tracks = element(
+        0x1654AE6B,
+        element(0xAE, uint(0x83, 1), element(0x86, b"V_VP9"), element(0xE0, uint(0xB0, 640), uint(0xBA, 360))),
+        element(0xAE, uint(0x83, 2), element(0x86, b"A_OPUS")),
+    )
+    cluster = element(0x1F43B675, uint(0xE7, 0), element(0xA3, bytes(2048)))
+
+    def seek_head(info_position: int, tracks_position: int) -> bytes:
+        return element(
+            0x114D9B74,
+            element(0x4DBB, element(0x53AB, ebml_id(0x1549A966)), element(0x53AC, info_position.to_bytes(8, "big"))),
+            element(0x4DBB, element(0x53AB, ebml_id(0x1654AE6B)), element(0x53AC, tracks_position.to_bytes(8, "big"))),
+        )
+
+    # Positions are relative to the Segment's data; fixed-width fields keep the SeekHead's length stable
+    seek_head_length = len(seek_head(0, 0))
+    info_position = seek_head_length + len(cluster)
+    tracks_position = info_position + len(info)
+    segment_data = seek_head(info_position, tracks_position) + cluster + info + tracks
+
+    header = element(0x1A45DFA3, uint(0x4286, 1), element(0x4282, b"webm"), uint(0x4287, 4))
+    # Segment of unknown size, as written by live encoders
+    segment = ebml_id(0x18538067) + bytes([0x01, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]) + segment_data
+    return header + segment
+
+
+FIXTURES = {
+    "moov_after_mdat.mp4": FTYP + MDAT + moov(12),
+    "missing_moov.mp4": FTYP + MDAT,
+    "truncated_moov.mp4": (FTYP + MDAT + moov(12))[:-200],
+    "over_duration.mp4": FTYP + moov(900) + MDAT,
+    "seekhead_after_clusters.webm": webm_seekhead_after_clusters(),
+}
+
+
+if __name__ == "__main__":
+    for name, content in FIXTURES.items():
+        with open(os.path.join(HERE, name), "wb") as f:
+            f.write(content)
+        print(f"Wrote {name} ({len(content)} bytes)")
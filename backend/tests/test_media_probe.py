@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+import media_probe
+from media_probe import FileRangeReader, MediaProbeError, probe_media, source_video_problem
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "media")
+
+
+class RecordingReader(FileRangeReader):
+    """FileRangeReader that remembers which ranges were fetched."""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.ranges = []
+
+    def read_range(self, offset: int, length: int) -> bytes:
+        self.ranges.append((offset, length))
+        return super().read_range(offset, length)
+
+
+def fixture(name: str) -> str:
+    return os.path.join(FIXTURES, name)
+
+
+def test_mp4_moov_after_mdat(monkeypatch):
+    # A tiny read-ahead, so each read shows up as its own range
+    monkeypatch.setattr(media_probe, "PROBE_READ_AHEAD", 16)
+    reader = RecordingReader(fixture("moov_after_mdat.mp4"))
+
+    info = probe_media(reader)
+
+    assert info.as_dict() == {
+        "container": "mp4",
+        "duration": 12.0,
+        "width": 1280,
+        "height": 720,
+        "video_codec": "avc1",
+        "audio_codec": "mp4a",
+    }
+    # Only the mdat box header is read on the way to moov, never its payload
+    mdat_start = 32
+    mdat_payload = range(mdat_start + 16, mdat_start + 4104)
+    assert not any(offset in mdat_payload for offset, _ in reader.ranges)
+
+
+def test_mp4_missing_moov():
+    with pytest.raises(MediaProbeError, match="No 'moov' box"):
+        probe_media(FileRangeReader(fixture("missing_moov.mp4")))
+
+
+def test_mp4_truncated_moov():
+    with pytest.raises(MediaProbeError, match="moov"):
+        probe_media(FileRangeReader(fixture("truncated_moov.mp4")))
+
+
+def test_webm_info_and_tracks_found_through_seekhead():
+    info = probe_media(FileRangeReader(fixture("seekhead_after_clusters.webm")))
+
+    assert info.as_dict() == {
+        "container": "webm",
+        "duration": 12.5,
+        "width": 640,
+        "height": 360,
+        "video_codec": "V_VP9",
+        "audio_codec": "A_OPUS",
+    }
+    assert source_video_problem(info, max_duration=60) is None
+
+
+def test_over_duration_source_video_is_rejected():
+    info = probe_media(FileRangeReader(fixture("over_duration.mp4")))
+
+    assert info.duration == 900.0
+    assert source_video_problem(info, max_duration=300) == "Video is 900 seconds long; the limit is 300 seconds."
+    assert source_video_problem(info, max_duration=900) is None
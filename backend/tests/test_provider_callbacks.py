@@ -0,0 +1,139 @@
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import provider_callbacks
+from poll_scheduler import PollPending, PollPolicy, PollScheduler
+from provider_callbacks import (
+    PROVIDER_CALLBACK_CHANNEL, CallbackListener, build_callback_url, callback_wake_key,
+    publish_provider_callback, verify_callback_token,
+)
+
+# Far enough out that a result within the test's timeout can only come from a callback
+POLL_INTERVAL = 60
+RESULT_TIMEOUT = 5
+
+
+class InMemoryPubSub:
+    """Just enough of redis-py's PubSub for CallbackListener."""
+
+    def __init__(self, broker: "InMemoryRedis"):
+        self.broker = broker
+        self.messages: queue.Queue = queue.Queue()
+
+    def subscribe(self, channel: str):
+        self.broker.subscribers.setdefault(channel, []).append(self)
+        self.broker.subscribed.set()
+
+    def listen(self):
+        while True:
+            yield self.messages.get()
+
+    def close(self):
+        pass
+
+
+class InMemoryRedis:
+    """Delivers publish() calls to in-process subscribers, standing in for the Redis pub/sub hop."""
+
+    def __init__(self):
+        self.subscribers: dict[str, list[InMemoryPubSub]] = {}
+        self.subscribed = threading.Event()
+
+    def pubsub(self, ignore_subscribe_messages: bool = False):
+        return InMemoryPubSub(self)
+
+    def publish(self, channel: str, message: str) -> int:
+        listeners = self.subscribers.get(channel, [])
+        for pubsub in listeners:
+            pubsub.messages.put({"type": "message", "channel": channel, "data": message})
+        return len(listeners)
+
+
+class StubProvider:
+    """A render job that finishes on demand and then calls back, as Creatomate does."""
+
+    def __init__(self, callback_url: str):
+        self.callback_url = callback_url
+        self.finished = threading.Event()
+        self.checks = 0
+
+    def check(self, session):
+        self.checks += 1
+        if self.finished.is_set():
+            return {"status": "succeeded", "url": "https://cdn.example.com/render.mp4"}
+        return PollPending()
+
+    def finish(self, token: Optional[str] = None) -> int:
+        self.finished.set()
+        return post_callback(self.callback_url, token)
+
+
+def post_callback(url: str, token: Optional[str] = None) -> int:
+    """The API's /api/provider-callback route: verify the token, then publish to the workers."""
+    parsed = urlparse(url)
+    provider, job_id = parsed.path.rsplit("/", 2)[-2:]
+    if token is None:
+        token = parse_qs(parsed.query)["token"][0]
+    if not verify_callback_token(provider, job_id, token):
+        return 403
+    publish_provider_callback(provider, job_id, "succeeded")
+    return 200
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    monkeypatch.setattr(provider_callbacks, "PUBLIC_API_URL", "https://api.example.com")
+    monkeypatch.setattr(provider_callbacks, "PROVIDER_CALLBACK_SECRET", "test-secret")
+    broker = InMemoryRedis()
+    monkeypatch.setattr(provider_callbacks, "redis_client", broker)
+    return broker
+
+
+@pytest.fixture
+def scheduler(broker):
+    scheduler = PollScheduler(workers_per_provider=1)
+    scheduler.set_policy("creatomate", PollPolicy(min_interval=POLL_INTERVAL, max_interval=POLL_INTERVAL, jitter=0))
+    CallbackListener(scheduler, redis_conn=broker).start()
+    assert broker.subscribed.wait(RESULT_TIMEOUT)
+    return scheduler
+
+
+def submit_render(scheduler: PollScheduler, job_id: str) -> tuple[StubProvider, Future]:
+    provider = StubProvider(build_callback_url("creatomate", job_id))
+    future = scheduler.submit(
+        "creatomate", f"render-{job_id}", provider.check,
+        label="Creatomate render", first_delay=POLL_INTERVAL,
+        wake_key=callback_wake_key("creatomate", job_id),
+    )
+    return provider, future
+
+
+def test_callback_resolves_waiting_future_before_next_poll(scheduler):
+    provider, future = submit_render(scheduler, "job-1")
+
+    assert provider.finish() == 200
+
+    assert future.result(timeout=RESULT_TIMEOUT) == {"status": "succeeded", "url": "https://cdn.example.com/render.mp4"}
+    # Resolved by the check the callback triggered, not by a scheduled poll
+    assert provider.checks == 1
+    assert scheduler.outstanding == 0
+
+
+def test_callback_with_bad_token_is_rejected(scheduler, broker):
+    provider, future = submit_render(scheduler, "job-2")
+    other_jobs_token = parse_qs(urlparse(build_callback_url("creatomate", "job-3")).query)["token"][0]
+
+    assert provider.finish(token="not-a-valid-token") == 403
+    assert provider.finish(token=other_jobs_token) == 403
+
+    with pytest.raises(FutureTimeoutError):
+        future.result(timeout=0.5)
+    assert provider.checks == 0
+    assert not broker.subscribers[PROVIDER_CALLBACK_CHANNEL][0].messages.qsize()
+    future.cancel()
+
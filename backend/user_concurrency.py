@@ -0,0 +1,155 @@
+"""
+Per-user limit on jobs in flight across all workers.
+
+Each user's running jobs are leases in the sorted set `user_jobs_inflight:{user_id}`
+(member: `{stream}|{entry ID}`, as entry IDs are only unique per stream; score:
+lease expiry). Workers refresh the leases of the jobs they are running, so a
+crashed worker's slots free themselves once the lease runs out instead of leaking
+like a plain counter would.
+
+A job claimed while its user is at the limit is deferred, not failed: the entry is
+parked on `user_jobs_deferred:{user_id}` and acknowledged on its stream, all in one
+Lua call. When one of that user's jobs finishes, the next parked job goes back to
+the tail of its stream, behind everyone else's work. A user who enqueues dozens of
+jobs therefore runs at most `limit` at a time and re-enters the queue one job at a
+time, so other users' jobs take turns with theirs (round-robin across users).
+"""
+
+import json
+import logging
+import os
+import time
+
+import redis
+
+USER_MAX_IN_FLIGHT = int(os.getenv("USER_MAX_IN_FLIGHT", "2"))
+# Leases are refreshed by the engine's heartbeat; this only matters when a worker dies
+USER_JOB_LEASE_SECONDS = int(os.getenv("USER_JOB_LEASE_SECONDS", "120"))
+
+INFLIGHT_PREFIX = "user_jobs_inflight"
+DEFERRED_PREFIX = "user_jobs_deferred"
+DEFERRED_USERS_KEY = "user_jobs_deferred_users"
+
+# KEYS: leases, deferred list, deferred-users set, stream.
+# ARGV: now, lease expiry, limit, lease member, group, user_id, parked job (JSON), key ttl, message_id.
+# Returns 1 if the job may run now, 0 if it was parked (and acknowledged).
+_ACQUIRE_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZSCORE', KEYS[1], ARGV[4]) or redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[4])
+    redis.call('EXPIRE', KEYS[1], ARGV[8])
+    return 1
+end
+redis.call('RPUSH', KEYS[2], ARGV[7])
+redis.call('SADD', KEYS[3], ARGV[6])
+redis.call('XACK', KEYS[4], ARGV[5], ARGV[9])
+return 0
+"""
+
+# KEYS: leases, deferred list, deferred-users set, then every job stream.
+# ARGV: now, finished job's lease member ('' for none), limit, user_id.
+# Releases the finished job's lease and moves parked jobs back onto their streams
+# while the user is under the limit. Returns the number of jobs re-queued.
+_RELEASE_LUA = """
+if ARGV[2] ~= '' then
+    redis.call('ZREM', KEYS[1], ARGV[2])
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local requeued = 0
+while redis.call('ZCARD', KEYS[1]) + requeued < tonumber(ARGV[3]) do
+    local item = redis.call('LPOP', KEYS[2])
+    if not item then
+        break
+    end
+    local job = cjson.decode(item)
+    local stream = KEYS[#KEYS]
+    for i = 4, #KEYS do
+        if KEYS[i] == job.stream then
+            stream = KEYS[i]
+        end
+    end
+    local args = {stream, '*'}
+    for field, value in pairs(job.fields) do
+        table.insert(args, field)
+        table.insert(args, value)
+    end
+    redis.call('XADD', unpack(args))
+    requeued = requeued + 1
+end
+if redis.call('LLEN', KEYS[2]) == 0 then
+    redis.call('SREM', KEYS[3], ARGV[4])
+end
+return requeued
+"""
+
+
+class UserConcurrencyLimiter:
+    """Acquires/releases per-user job slots for JobEngine. `streams` lists every stream jobs can be re-queued on."""
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        streams: list[str],
+        group_name: str,
+        limit: int = USER_MAX_IN_FLIGHT,
+        lease_seconds: int = USER_JOB_LEASE_SECONDS,
+    ):
+        self.redis_client = redis_client
+        # The last stream is where parked jobs go if their original stream is unknown
+        self.streams = list(streams)
+        self.group_name = group_name
+        self.limit = max(1, limit)
+        self.lease_seconds = lease_seconds
+        self._acquire = redis_client.register_script(_ACQUIRE_LUA)
+        self._release = redis_client.register_script(_RELEASE_LUA)
+
+    @staticmethod
+    def lease_member(stream: str, message_id: str) -> str:
+        return f"{stream}|{message_id}"
+
+    def acquire(self, user_id: str, stream: str, message_id: str, fields: dict) -> bool:
+        """Takes a slot for the job, or parks it until the user has a free slot. Returns True if it may run."""
+        now = time.time()
+        parked = json.dumps({"stream": stream, "fields": fields})
+        admitted = self._acquire(
+            keys=[f"{INFLIGHT_PREFIX}:{user_id}", f"{DEFERRED_PREFIX}:{user_id}", DEFERRED_USERS_KEY, stream],
+            args=[
+                now, now + self.lease_seconds, self.limit, self.lease_member(stream, message_id),
+                self.group_name, user_id, parked, self.lease_seconds * 2, message_id,
+            ],
+        )
+        if not admitted:
+            logging.info(f"[LIMITS] User {user_id} already has {self.limit} job(s) in flight; deferred {message_id} from '{stream}'.")
+        return bool(admitted)
+
+    def release(self, user_id: str, stream: str = "", message_id: str = "") -> int:
+        """
+        Frees the job's slot (if given) and re-queues the user's next parked job(s).
+        Returns how many were re-queued.
+        """
+        member = self.lease_member(stream, message_id) if message_id else ""
+        requeued = self._release(
+            keys=[f"{INFLIGHT_PREFIX}:{user_id}", f"{DEFERRED_PREFIX}:{user_id}", DEFERRED_USERS_KEY] + self.streams,
+            args=[time.time(), member, self.limit, user_id],
+        )
+        if requeued:
+            logging.info(f"[LIMITS] Re-queued {requeued} deferred job(s) for user {user_id}.")
+        return requeued
+
+    def refresh(self, leases: dict[tuple[str, str], str]):
+        """Extends the leases of running jobs ({(stream, message_id): user_id})."""
+        if not leases:
+            return
+        expires_at = time.time() + self.lease_seconds
+        pipe = self.redis_client.pipeline(transaction=False)
+        for (stream, message_id), user_id in leases.items():
+            pipe.zadd(f"{INFLIGHT_PREFIX}:{user_id}", {self.lease_member(stream, message_id): expires_at}, xx=True)
+            pipe.expire(f"{INFLIGHT_PREFIX}:{user_id}", self.lease_seconds * 2)
+        pipe.execute()
+
+    def requeue_ready(self) -> int:
+        """Re-queues parked jobs of users whose slots freed up without a release (e.g. a worker died)."""
+        requeued = 0
+        for user_id in self.redis_client.smembers(DEFERRED_USERS_KEY):
+            requeued += self.release(user_id)
+        return requeued
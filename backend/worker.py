@@ -12,8 +12,30 @@ from typing import Optional
 from supabase_client import supabase # Import the Supabase client
 from postgrest.exceptions import APIError # For Supabase errors
 import logging
-
+import asyncio
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from job_engine import JobEngine
+from stream_reclaimer import StreamReclaimer
+from job_streams import ALL_JOB_STREAMS, JOB_CONSUMER_GROUP, JOB_STREAM_POLICY, StreamScheduler, parse_stream_weights
+from user_concurrency import UserConcurrencyLimiter
+from poll_scheduler import poll_scheduler, PollPending, PollPolicy, estimate_eta
+from stage_stats import record_stage_duration, get_expected_stage_duration
+from provider_callbacks import CallbackListener, build_callback_url, callback_wake_key, callbacks_enabled
+from http_clients import get_provider_session, close_provider_sessions
+from media_cache import (
+    get_s3_object_fingerprint, get_cached_video_summary, cache_video_summary,
+    get_lip_sync_cache_key, get_cached_lip_sync, store_lip_sync_result,
+)
 from redis_client import redis_client, MEME_JOB_STREAM, REDIS_URL # Use the shared client
+from job_status import update_job_status, job_checkpoint_key, JOB_STATUS_TTL
+from credit_ledger import reserve_credit, commit_credit, refund_credit, CreditWriteBehind
+from past_videos import bump_past_videos_version
+from presign_cache import PresignCache
+from media_probe import MediaInfo, MediaProbeError, S3RangeReader, probe_media, source_video_problem
 
 # Load environment variables from the script's directory
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -35,12 +57,32 @@ CREATOMATE_API_KEY = os.getenv("CREATOMATE_API_KEY") # Add Creatomate key
 BRANDED_OUTRO_IMAGE_URL = os.getenv("BRANDED_OUTRO_IMAGE_URL") # Add Outro URL
 CREATOMATE_API_URL = "https://api.creatomate.com/v1" # Define base URL
 CREATOMATE_TEMPLATE_ID = os.getenv("CREATOMATE_TEMPLATE_ID") # Add Template ID
+LEMON_SLICE_DEFAULT_VOICE_ID = "ZRwrL4id6j1HPGFkeCzO" # Default: Sam - American male
+LEMON_SLICE_RESOLUTION = "512" # Default as per docs
+
+TWELVE_LABS_INDEX_NAME = "default_meme_index"
+TWELVE_LABS_INDEX_CACHE_KEY = f"twelve_labs:index_id:{TWELVE_LABS_INDEX_NAME}"
+TWELVE_LABS_INDEX_CACHE_TTL = 7 * 24 * 3600 # Invalidated early if the provider returns 404
 
 AWS_S3_BUCKET_NAME = os.getenv("AWS_S3_BUCKET_NAME")
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_S3_REGION = os.getenv("AWS_S3_REGION", "us-east-1")
 
+# How many jobs a single worker process keeps in flight at once
+WORKER_MAX_IN_FLIGHT = int(os.getenv("WORKER_MAX_IN_FLIGHT", "32"))
+# Threads for the jobs' blocking calls (provider submits, S3, Supabase, Redis). Provider waits are
+# awaited without a thread, so this only bounds overlapping blocking calls, not jobs in flight.
+JOB_BLOCKING_MAX_WORKERS = int(os.getenv("JOB_BLOCKING_MAX_WORKERS", "16"))
+# Stalled-entry reclaiming: entries idle this long are taken over by another worker,
+# and entries delivered more than JOB_MAX_DELIVERIES times go to the dead-letter stream
+JOB_RECLAIM_MIN_IDLE_MS = int(os.getenv("JOB_RECLAIM_MIN_IDLE_MS", "60000"))
+JOB_MAX_DELIVERIES = int(os.getenv("JOB_MAX_DELIVERIES", "3"))
+# Finished entries kept on each job stream (unacknowledged/undelivered ones are never trimmed)
+JOB_STREAM_RETAIN = int(os.getenv("JOB_STREAM_RETAIN", "1000"))
+# Longest source clip accepted by the preflight: the API's 60 s limit plus rounding slack in container durations
+SOURCE_VIDEO_MAX_SECONDS = float(os.getenv("SOURCE_VIDEO_MAX_SECONDS", "61"))
+
 # Validate mandatory config
 if not OPENAI_API_KEY:
     logging.error("Error: OPENAI_API_KEY not found in environment variables.")
@@ -70,31 +112,105 @@ s3_client = boto3.client(
     region_name=AWS_S3_REGION,
     config=boto3.session.Config(signature_version='s3v4')
 )
+# Avatar and video URLs are signed once and reused by every stage and retry of a job
+presign_cache = PresignCache(s3_client)
+_blocking_executor = ThreadPoolExecutor(max_workers=JOB_BLOCKING_MAX_WORKERS, thread_name_prefix="job-io")
+
+# Polling policies per provider: min/max wait between status checks (see poll_scheduler.PollPolicy)
+poll_scheduler.set_policy("twelve_labs", PollPolicy(min_interval=2, max_interval=15))
+poll_scheduler.set_policy("lemon_slice", PollPolicy(min_interval=3, max_interval=30))
+poll_scheduler.set_policy("video_host", PollPolicy(min_interval=2, max_interval=15))
+# Used instead while the provider will call us back on completion; polling is then only a safety net
+CALLBACK_FALLBACK_POLL_POLICY = PollPolicy(min_interval=15, max_interval=60)
+
+# Process-wide Twelve Labs index ID (backed by Redis, see get_twelve_labs_index_id)
+_twelve_labs_index_id: Optional[str] = None
+_twelve_labs_index_lock = threading.Lock()
 
 # --- Helper Functions ---
 
+async def run_blocking(func, *args, **kwargs):
+    """Runs a synchronous call on the bounded job I/O pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_blocking_executor, partial(func, *args, **kwargs))
+
 def get_s3_presigned_url(bucket, key, expiration=3600):
-    """Generates a temporary S3 GET URL."""
+    """Returns a temporary S3 GET URL, reusing one signed earlier while it's still comfortably valid."""
     try:
-        response = s3_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': bucket, 'Key': key},
-            ExpiresIn=expiration
-        )
-        return response
+        return presign_cache.get_url(bucket, key, expires_in=expiration)
     except Exception as e:
         logging.error(f"Error generating presigned S3 URL for {key}: {e}")
         return None
 
-def call_twelve_labs_summarize(video_url: str, custom_job_id: str) -> tuple[Optional[str], Optional[str]]:
-    """Calls Twelve Labs API to index and summarize a video using a persistent index."""
-    logging.info(f"[Job: {custom_job_id}] Starting Twelve Labs processing...")
-    headers = {
-        "x-api-key": TWELVE_LABS_API_KEY
-    }
-    
+def get_twelve_labs_index_id(headers: dict, custom_job_id: str) -> str:
+    """
+    Returns the ID of the persistent Twelve Labs index. The ID is cached in-process and
+    in Redis, so the index is only listed (or created) when no worker knows it yet or
+    after invalidate_twelve_labs_index_id() was called because the provider returned 404.
+    """
+    global _twelve_labs_index_id
+    if _twelve_labs_index_id:
+        return _twelve_labs_index_id
+
+    with _twelve_labs_index_lock:
+        # Another job may have resolved it while we waited for the lock
+        if _twelve_labs_index_id:
+            return _twelve_labs_index_id
+        try:
+            cached_index_id = redis_client.get(TWELVE_LABS_INDEX_CACHE_KEY)
+        except redis.exceptions.RedisError as e:
+            logging.warning(f"[Job: {custom_job_id}][WARN] Could not read cached Twelve Labs index ID: {e}")
+            cached_index_id = None
+
+        if cached_index_id:
+            logging.info(f"[Job: {custom_job_id}] Using cached Twelve Labs index ID: {cached_index_id}")
+            _twelve_labs_index_id = cached_index_id
+            return cached_index_id
+
+        index_id = find_or_create_twelve_labs_index(headers, custom_job_id)
+        try:
+            redis_client.set(TWELVE_LABS_INDEX_CACHE_KEY, index_id, ex=TWELVE_LABS_INDEX_CACHE_TTL)
+        except redis.exceptions.RedisError as e:
+            logging.warning(f"[Job: {custom_job_id}][WARN] Could not cache Twelve Labs index ID: {e}")
+        _twelve_labs_index_id = index_id
+        return index_id
+
+def invalidate_twelve_labs_index_id(stale_index_id: str):
+    """Drops the cached index ID (in-process and Redis) after the provider reported it missing."""
+    global _twelve_labs_index_id
+    logging.warning(f"[WARN] Invalidating cached Twelve Labs index ID {stale_index_id}.")
+    with _twelve_labs_index_lock:
+        if _twelve_labs_index_id == stale_index_id:
+            _twelve_labs_index_id = None
+        try:
+            if redis_client.get(TWELVE_LABS_INDEX_CACHE_KEY) == stale_index_id:
+                redis_client.delete(TWELVE_LABS_INDEX_CACHE_KEY)
+        except redis.exceptions.RedisError as e:
+            logging.warning(f"[WARN] Could not invalidate cached Twelve Labs index ID: {e}")
+
+def wait_for_twelve_labs_index_ready(headers: dict, index_id: str, custom_job_id: str, timeout_seconds: float = 30) -> bool:
+    """Probes a freshly created index with short, growing intervals until the API can see it."""
+    delay = 0.5
+    deadline = time.time() + timeout_seconds
+    while True:
+        try:
+            probe = get_provider_session("twelve_labs").get(f"{TWELVE_LABS_API_URL}/indexes/{index_id}", headers=headers, timeout=10)
+            if probe.ok:
+                logging.info(f"[Job: {custom_job_id}] Twelve Labs index {index_id} is ready.")
+                return True
+            logging.info(f"[Job: {custom_job_id}] Twelve Labs index {index_id} not ready yet (status {probe.status_code}).")
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"[Job: {custom_job_id}][WARN] Readiness probe for index {index_id} failed: {e}")
+        if time.time() + delay > deadline:
+            logging.warning(f"[Job: {custom_job_id}][WARN] Index {index_id} did not report ready within {timeout_seconds}s. Continuing anyway.")
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, 5)
+
+def find_or_create_twelve_labs_index(headers: dict, custom_job_id: str) -> str:
+    """Finds (or creates) the persistent Twelve Labs index and returns its ID."""
     # Use a single persistent index
-    index_name = "default_meme_index"
+    index_name = TWELVE_LABS_INDEX_NAME
     index_id = None
     index_was_created = False
 
@@ -102,7 +218,7 @@ def call_twelve_labs_summarize(video_url: str, custom_job_id: str) -> tuple[Opti
     try:
         logging.info(f"[Job: {custom_job_id}] Checking for index: {index_name}")
         list_params = {"index_name": index_name}
-        indexes_response = requests.get(f"{TWELVE_LABS_API_URL}/indexes", headers=headers, params=list_params)
+        indexes_response = get_provider_session("twelve_labs").get(f"{TWELVE_LABS_API_URL}/indexes", headers=headers, params=list_params)
         indexes_response.raise_for_status()
         indexes_data = indexes_response.json().get('data', [])
         
@@ -129,7 +245,7 @@ def call_twelve_labs_summarize(video_url: str, custom_job_id: str) -> tuple[Opti
                 "addons": ["thumbnail"]
             }
             try:
-                create_response = requests.post(
+                create_response = get_provider_session("twelve_labs").post(
                     f"{TWELVE_LABS_API_URL}/indexes",
                     headers=headers,
                     json=create_index_payload
@@ -145,7 +261,7 @@ def call_twelve_labs_summarize(video_url: str, custom_job_id: str) -> tuple[Opti
                     # Conflict: Highly unlikely if check above worked, but handle defensively
                     logging.info(f"[Job: {custom_job_id}] Index '{index_name}' already exists (409 Conflict during creation attempt). Refetching...")
                     # Refetch specifically by name again
-                    refetch_response = requests.get(f"{TWELVE_LABS_API_URL}/indexes", headers=headers, params=list_params)
+                    refetch_response = get_provider_session("twelve_labs").get(f"{TWELVE_LABS_API_URL}/indexes", headers=headers, params=list_params)
                     refetch_response.raise_for_status()
                     refetch_data = refetch_response.json().get('data', [])
                     if refetch_data:
@@ -158,11 +274,6 @@ def call_twelve_labs_summarize(video_url: str, custom_job_id: str) -> tuple[Opti
                     logging.error(f"[Job: {custom_job_id}][ERROR] HTTP error creating index '{index_name}': {http_err} - {http_err.response.text}")
                     raise ConnectionError(f"Twelve Labs Index Creation Error: {http_err}") from http_err
 
-        # If we just created the index, give it time to provision
-        if index_was_created:
-            logging.info(f"[Job: {custom_job_id}] [DEBUG] Waiting 5 seconds after creating index '{index_name}' for provisioning...")
-            time.sleep(5)
-
         if not index_id:
             raise ValueError(f"Failed to retrieve or create index ID for '{index_name}'.")
 
@@ -170,10 +281,14 @@ def call_twelve_labs_summarize(video_url: str, custom_job_id: str) -> tuple[Opti
         logging.error(f"[Job: {custom_job_id}][ERROR] Error checking or creating index '{index_name}': {e}")
         raise ConnectionError(f"Twelve Labs Index Management Error: {e}") from e
 
-    # Short wait after index creation
-    logging.info(f"[Job: {custom_job_id}] [DEBUG] Ensuring index is ready for video submission...")
-    time.sleep(5)
+    # If we just created the index, wait until the API actually serves it
+    if index_was_created:
+        wait_for_twelve_labs_index_ready(headers, index_id, custom_job_id)
+
+    return index_id
 
+def submit_twelve_labs_task(headers: dict, index_id: str, video_url: str, custom_job_id: str) -> str:
+    """Submits a video URL to a Twelve Labs index and returns the indexing task ID."""
     # 2. Submit video for indexing (upload by URL)
     task_files = {
         "index_id": (None, index_id),
@@ -186,7 +301,7 @@ def call_twelve_labs_summarize(video_url: str, custom_job_id: str) -> tuple[Opti
         logging.info(f"[Job: {custom_job_id}] Video URL: {video_url}") 
         logging.info(f"[Job: {custom_job_id}][DEBUG] Payload for /tasks: {json.dumps({k: v[1] for k, v in task_files.items()}, indent=2)}")
 
-        task_response = requests.post(
+        task_response = get_provider_session("twelve_labs").post(
             f"{TWELVE_LABS_API_URL}/tasks",
             headers=headers,  # Only the API key header; Content-Type is set automatically
             files=task_files
@@ -198,6 +313,10 @@ def call_twelve_labs_summarize(video_url: str, custom_job_id: str) -> tuple[Opti
                 logging.info(f"[Job: {custom_job_id}] Response JSON: {task_response.json()}")
             except Exception:
                 logging.warning("[Job: {custom_job_id}][WARN] Response is not valid JSON for 201 status.")
+        elif task_response.status_code == 404:
+            # The cached index no longer exists on the provider side
+            logging.error(f"[Job: {custom_job_id}][ERROR] Twelve Labs /tasks responded 404 for index {index_id}: {task_response.text}")
+            raise LookupError(f"Twelve Labs index {index_id} not found.")
         elif task_response.status_code != 200: # Handle other non-200s as errors
             logging.error(f"[Job: {custom_job_id}][ERROR] Twelve Labs /tasks responded {task_response.status_code}: {task_response.text}")
             try:
@@ -218,75 +337,137 @@ def call_twelve_labs_summarize(video_url: str, custom_job_id: str) -> tuple[Opti
         logging.error(traceback.format_exc())
         raise ConnectionError(f"Twelve Labs Task Submission Error: {e}") from e
 
-    # 3. Poll task status until ready
-    video_id = None
+    return task_id
+
+async def wait_for_twelve_labs_video(headers: dict, index_id: str, task_id: str, custom_job_id: str, submitted_at: Optional[float] = None) -> tuple[Optional[str], Optional[str]]:
+    """Waits for a Twelve Labs indexing task to finish. Returns (video_id, thumbnail_url), or (None, None) on timeout."""
+    # Poll task status until ready (via the shared poll scheduler)
     status_endpoint = f"{TWELVE_LABS_API_URL}/tasks/{task_id}"
-    max_retries = 20 # e.g., 20 * 5 seconds = 100 seconds timeout
-    retries = 0
-    thumbnail_url = None # Initialize thumbnail url within function scope
-    while retries < max_retries:
-        try:
-            logging.info(f"[Job: {custom_job_id}] Checking Twelve Labs task status ({retries+1}/{max_retries}), Task ID: {task_id}...")
-            status_res = requests.get(status_endpoint, headers=headers)
-            status_res.raise_for_status()
-            status_data = status_res.json()
-            status = status_data.get('status')
-            logging.info(f"[Job: {custom_job_id}] Task status: {status}")
-
-            if status == "ready":
-                video_id = status_data.get('video_id')
-                if not video_id:
-                    raise ValueError("Task ready but no video_id found.")
-                logging.info(f"[Job: {custom_job_id}] Video indexed successfully. Twelve Labs Video ID: {video_id}")
-
-                # --- Verification Step ---
-                try:
-                    verify_url = f"{TWELVE_LABS_API_URL}/indexes/{index_id}/videos/{video_id}"
-                    logging.info(f"[Job: {custom_job_id}][DEBUG] Verifying video metadata at: {verify_url}")
-                    verify_res = requests.get(verify_url, headers=headers)
-                    verify_res.raise_for_status()
-                    video_metadata = verify_res.json()
-                    # v1.3 migration guide says metadata is renamed to system_metadata or user_metadata
-                    logging.info(f"[Job: {custom_job_id}][DEBUG] Verified Video Metadata: system_metadata={video_metadata.get('system_metadata')}, user_metadata={video_metadata.get('user_metadata')}, hls={video_metadata.get('hls')}") 
-                except requests.exceptions.RequestException as verify_err:
-                    logging.warning(f"[Job: {custom_job_id}][WARN] Failed to verify video metadata for {video_id}: {verify_err}")
-                except Exception as json_err:
-                    logging.warning(f"[Job: {custom_job_id}][WARN] Failed to parse video metadata JSON for {video_id}: {json_err}")
-
-                # --- Extract Thumbnail URL ---
-                hls_data = video_metadata.get('hls')
-                if hls_data and isinstance(hls_data, dict):
-                    thumbnail_urls = hls_data.get('thumbnail_urls')
-                    if thumbnail_urls and isinstance(thumbnail_urls, list) and len(thumbnail_urls) > 0:
-                        thumbnail_url = thumbnail_urls[0]
-                        logging.info(f"[Job: {custom_job_id}] Extracted thumbnail URL: {thumbnail_url}")
-                    else:
-                         logging.warning("[Job: {custom_job_id}][WARN] No thumbnail URLs found in hls data.")
-                else:
-                     logging.warning("[Job: {custom_job_id}][WARN] HLS data missing or not a dict in video metadata.")
-                # --- End Thumbnail Extraction ---
-
-                break # Exit polling loop once ready
-            elif status in ["failed", "error"]:
-                raise RuntimeError(f"Twelve Labs indexing failed: {status_data.get('process', {}).get('status')}")
-            
-            retries += 1
-            time.sleep(5) # Wait before polling again
-        except requests.exceptions.RequestException as e:
-             logging.error(f"[Job: {custom_job_id}][ERROR] Error polling Twelve Labs task status: {e}")
-             # Allow retries on temporary polling errors
-             retries += 1
-             time.sleep(5)
-    
+    thumbnail_url = None
+
+    started_at = submitted_at or time.time()
+
+    def check_indexing_task(session: requests.Session) -> Optional[dict]:
+        status_res = session.get(status_endpoint, headers=headers, timeout=15)
+        status_res.raise_for_status()
+        status_data = status_res.json()
+        status = status_data.get('status')
+        logging.info(f"[Job: {custom_job_id}] Twelve Labs task {task_id} status: {status}")
+        if status == "ready":
+            return status_data
+        elif status in ["failed", "error"]:
+            raise RuntimeError(f"Twelve Labs indexing failed: {status_data.get('process', {}).get('status')}")
+        # Schedule the next check around the provider's own progress estimate, if it sent one
+        process = status_data.get('process') or {}
+        eta = process.get('remain_seconds')
+        if eta is None:
+            eta = estimate_eta(time.time() - started_at, process.get('percentage'))
+        return PollPending(eta=eta) if eta is not None else None
+
+    logging.info(f"[Job: {custom_job_id}] Waiting for Twelve Labs task {task_id} to finish indexing...")
+    status_data = await poll_scheduler.wait(
+        "twelve_labs", task_id, check_indexing_task,
+        timeout=100, label=f"[Job: {custom_job_id}]",
+        started_at=started_at,
+        expected_duration=await run_blocking(get_expected_stage_duration, "indexing"),
+        on_done=track_poll_stats(custom_job_id, "indexing"),
+    )
+    video_id = status_data.get('video_id') if status_data else None
+    if status_data and not video_id:
+        raise ValueError("Task ready but no video_id found.")
+
     if not video_id:
-        logging.error(f"[Job: {custom_job_id}][ERROR] Twelve Labs indexing timed out or failed to produce video_id.")
         return None, None
 
-    # Add a short delay before summarizing, relying on the retry loop for robustness
-    logging.info(f"[Job: {custom_job_id}][DEBUG] Waiting 5 seconds before requesting summary...")
-    time.sleep(5)
+    logging.info(f"[Job: {custom_job_id}] Video indexed successfully. Twelve Labs Video ID: {video_id}")
+
+    # --- Verification Step (doubles as the readiness probe before summarizing) ---
+    video_metadata = {}
+    verify_url = f"{TWELVE_LABS_API_URL}/indexes/{index_id}/videos/{video_id}"
+    probe_delay = 0.5
+    max_probes = 5
+    for probe in range(1, max_probes + 1):
+        try:
+            logging.info(f"[Job: {custom_job_id}][DEBUG] Verifying video metadata at: {verify_url}")
+            verify_res = await run_blocking(get_provider_session("twelve_labs").get, verify_url, headers=headers, timeout=15)
+            if verify_res.status_code == 404 and probe < max_probes:
+                # Task reports ready but the video isn't served from the index yet - probe again shortly
+                logging.info(f"[Job: {custom_job_id}][DEBUG] Video {video_id} not visible in index yet, re-probing in {probe_delay}s...")
+                await asyncio.sleep(probe_delay)
+                probe_delay *= 2
+                continue
+            verify_res.raise_for_status()
+            video_metadata = verify_res.json()
+            # v1.3 migration guide says metadata is renamed to system_metadata or user_metadata
+            logging.info(f"[Job: {custom_job_id}][DEBUG] Verified Video Metadata: system_metadata={video_metadata.get('system_metadata')}, user_metadata={video_metadata.get('user_metadata')}, hls={video_metadata.get('hls')}") 
+        except requests.exceptions.RequestException as verify_err:
+            logging.warning(f"[Job: {custom_job_id}][WARN] Failed to verify video metadata for {video_id}: {verify_err}")
+        except Exception as json_err:
+            logging.warning(f"[Job: {custom_job_id}][WARN] Failed to parse video metadata JSON for {video_id}: {json_err}")
+        break
+
+    # --- Extract Thumbnail URL ---
+    hls_data = video_metadata.get('hls')
+    if hls_data and isinstance(hls_data, dict):
+        thumbnail_urls = hls_data.get('thumbnail_urls')
+        if thumbnail_urls and isinstance(thumbnail_urls, list) and len(thumbnail_urls) > 0:
+            thumbnail_url = thumbnail_urls[0]
+            logging.info(f"[Job: {custom_job_id}] Extracted thumbnail URL: {thumbnail_url}")
+        else:
+             logging.warning("[Job: {custom_job_id}][WARN] No thumbnail URLs found in hls data.")
+    else:
+         logging.warning("[Job: {custom_job_id}][WARN] HLS data missing or not a dict in video metadata.")
+    # --- End Thumbnail Extraction ---
+
+    return video_id, thumbnail_url
 
-    # 4. Generate Summary – try up to 3 times with a better prompt
+async def call_twelve_labs_summarize(video_url: str, custom_job_id: str) -> tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    Calls Twelve Labs API to index and summarize a video using a persistent index.
+    Returns (video_id, summary, thumbnail_url); summary is None if it could not be produced.
+    Resumes from the job's checkpoints when a previous attempt already submitted the
+    indexing task (or finished it), instead of submitting the video again.
+    """
+    logging.info(f"[Job: {custom_job_id}] Starting Twelve Labs processing...")
+    headers = {
+        "x-api-key": TWELVE_LABS_API_KEY
+    }
+
+    indexing_checkpoint = await run_blocking(load_checkpoint, custom_job_id, "indexing")
+    index_id = indexing_checkpoint.get("index_id")
+    task_id = indexing_checkpoint.get("task_id")
+    if index_id and task_id:
+        logging.info(f"[Job: {custom_job_id}] Resuming Twelve Labs indexing task {task_id} (submitted at {indexing_checkpoint.get('submitted_at')}).")
+    else:
+        # 1. Check if the persistent index exists (create it if not)
+        index_id = await run_blocking(get_twelve_labs_index_id, headers, custom_job_id)
+        # 2. Submit video for indexing (upload by URL)
+        try:
+            task_id = await run_blocking(submit_twelve_labs_task, headers, index_id, video_url, custom_job_id)
+        except LookupError:
+            # Cached index was deleted on the provider side - resolve it again and retry once
+            await run_blocking(invalidate_twelve_labs_index_id, index_id)
+            index_id = await run_blocking(get_twelve_labs_index_id, headers, custom_job_id)
+            task_id = await run_blocking(submit_twelve_labs_task, headers, index_id, video_url, custom_job_id)
+        await run_blocking(save_checkpoint, custom_job_id, "indexing", task_id, index_id=index_id)
+
+    # 3. Wait for indexing to finish (skipped if a previous attempt already got the video ID)
+    indexed_checkpoint = await run_blocking(load_checkpoint, custom_job_id, "indexed")
+    video_id = indexed_checkpoint.get("task_id")
+    thumbnail_url = indexed_checkpoint.get("thumbnail_url") or None
+    if video_id:
+        logging.info(f"[Job: {custom_job_id}] Resuming with already indexed Twelve Labs video {video_id}.")
+    else:
+        indexing_checkpoint = await run_blocking(load_checkpoint, custom_job_id, "indexing")
+        submitted_at = float(indexing_checkpoint.get("submitted_at") or time.time())
+        video_id, thumbnail_url = await wait_for_twelve_labs_video(headers, index_id, task_id, custom_job_id, submitted_at)
+        if not video_id:
+            logging.error(f"[Job: {custom_job_id}][ERROR] Twelve Labs indexing timed out or failed to produce video_id.")
+            return None, None, None
+        await run_blocking(save_checkpoint, custom_job_id, "indexed", video_id, thumbnail_url=thumbnail_url)
+
+    # 4. Generate Summary – the indexed video was already confirmed visible (see
+    # wait_for_twelve_labs_video), so ask right away and back off only if it isn't served yet
     summarize_payload = {
         "video_id": video_id,
         "type": "summary",
@@ -301,11 +482,13 @@ def call_twelve_labs_summarize(video_url: str, custom_job_id: str) -> tuple[Opti
         "temperature": 0.1  # Lower temperature for more deterministic results
     }
 
-    max_summary_attempts = 3
+    max_summary_attempts = 4
+    retry_delay = 2 # Doubles after each failed attempt (2s, 4s, 8s)
     for attempt in range(1, max_summary_attempts + 1):
         try:
             logging.info(f"[Job: {custom_job_id}] Requesting summary from Twelve Labs for video ID: {video_id} (attempt {attempt})...")
-            summary_response = requests.post(
+            summary_response = await run_blocking(
+                get_provider_session("twelve_labs").post,
                 f"{TWELVE_LABS_API_URL}/summarize",
                 headers=headers,
                 json=summarize_payload,
@@ -317,7 +500,7 @@ def call_twelve_labs_summarize(video_url: str, custom_job_id: str) -> tuple[Opti
             summary = summary_response.json().get('summary')
             if summary:
                 logging.info(f"[Job: {custom_job_id}] Received summary: {summary[:100]}...")
-                return summary, thumbnail_url
+                return video_id, summary, thumbnail_url
             else:
                 raise ValueError("No 'summary' field in response.")
         except (requests.exceptions.RequestException, ValueError) as err:
@@ -325,9 +508,10 @@ def call_twelve_labs_summarize(video_url: str, custom_job_id: str) -> tuple[Opti
             logging.warning(f"[Job: {custom_job_id}][WARN] Summary attempt {attempt} failed: {err}")
             if attempt >= max_summary_attempts:
                 logging.error(f"[Job: {custom_job_id}][ERROR] Failed to get summary after {max_summary_attempts} attempts.")
-                return None, thumbnail_url
-            logging.warning("[Job: {custom_job_id}][WARN] Waiting 15s before retrying summary request...")
-            time.sleep(15)
+                return video_id, None, thumbnail_url
+            logging.warning(f"[Job: {custom_job_id}][WARN] Waiting {retry_delay}s before retrying summary request...")
+            await asyncio.sleep(retry_delay)
+            retry_delay *= 2
 
 def generate_script(summary: str, user_id: str, custom_job_id: str) -> str:
     """Generates a meme script using OpenAI GPT-4o."""
@@ -359,27 +543,8 @@ def generate_script(summary: str, user_id: str, custom_job_id: str) -> str:
         logging.error(f"[Job: {custom_job_id}][ERROR] Error parsing GPT response: {e}")
         raise ValueError(f"Could not parse script from OpenAI: {e}") from e
 
-def call_lemon_slice(avatar_image_s3_key: str, script_text: str, voice_id: Optional[str], custom_job_id: str) -> Optional[str]:
-    """
-    Calls the Lemon Slice API to generate a talking head video.
-    - Needs the S3 key for the user's uploaded avatar image.
-    - Needs the generated script text (max 900 chars enforced).
-    - Accepts an optional voice_id.
-    - Returns a URL to the generated talking head video upon completion.
-    """
-    logging.info(f"[Job: {custom_job_id}] --- Calling Lemon Slice API ---")
-    logging.info(f"[Job: {custom_job_id}] Avatar S3 Key: {avatar_image_s3_key}")
-    # Enforce 900 character limit for LemonSlice
-    if len(script_text) > 900:
-        logging.warning(f"[Job: {custom_job_id}][WARN] Script text exceeds 900 characters ({len(script_text)}). Truncating for LemonSlice.")
-        script_text = script_text[:900]
-    logging.info(f"[Job: {custom_job_id}] Script (first 100 chars for LemonSlice): {script_text[:100]}...")
-    logging.info(f"[Job: {custom_job_id}] Voice ID: {voice_id if voice_id else 'Default (Sam)'}")
-    
-    if not LEMON_SLICE_API_KEY:
-        logging.warning("Lemon Slice API Key missing, cannot proceed.")
-        raise ValueError("Lemon Slice API Key not configured.")
-
+def submit_lemon_slice_generation(avatar_image_s3_key: str, script_text: str, voice_id: Optional[str], headers: dict, custom_job_id: str) -> tuple[Optional[str], Optional[str]]:
+    """Starts a Lemon Slice generation. Returns (lemon_job_id, None), or (None, video_url) if the URL came back directly."""
     # 1. Get a readable URL for the avatar image
     avatar_url = get_s3_presigned_url(AWS_S3_BUCKET_NAME, avatar_image_s3_key)
     if not avatar_url:
@@ -389,26 +554,24 @@ def call_lemon_slice(avatar_image_s3_key: str, script_text: str, voice_id: Optio
     # 2. Construct Lemon Slice API request payload
     lemon_slice_generate_endpoint = "https://lemonslice.com/api/v2/generate"
     # Use provided voice_id or default
-    selected_voice_id = voice_id if voice_id else "ZRwrL4id6j1HPGFkeCzO" # Default: Sam - American male
+    selected_voice_id = voice_id if voice_id else LEMON_SLICE_DEFAULT_VOICE_ID
     
     payload = {
         "img_url": avatar_url,
         "text": script_text,
         "voice_id": selected_voice_id,
-        "resolution": "512", # Default as per docs
+        "resolution": LEMON_SLICE_RESOLUTION,
         # Add other optional params like model, expressiveness if needed
     }
-    headers = {
-        "Authorization": f"Bearer {LEMON_SLICE_API_KEY}",
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
+    callback_url = build_callback_url("lemon_slice", custom_job_id)
+    if callback_url:
+        payload["webhook_url"] = callback_url
 
     # 3. Make the POST request to start generation
     job_id = None
     try:
         logging.info(f"[Job: {custom_job_id}] Submitting generation request to Lemon Slice...")
-        response = requests.post(lemon_slice_generate_endpoint, headers=headers, json=payload, timeout=30)
+        response = get_provider_session("lemon_slice").post(lemon_slice_generate_endpoint, headers=headers, json=payload, timeout=30)
         
         if not response.ok:
             logging.error(f"[Job: {custom_job_id}][ERROR] Lemon Slice /generate responded {response.status_code}: {response.text}")
@@ -423,7 +586,7 @@ def call_lemon_slice(avatar_image_s3_key: str, script_text: str, voice_id: Optio
              direct_url = response_data.get('video_url')
              if direct_url:
                  logging.info("Lemon Slice returned URL directly.")
-                 return direct_url
+                 return None, direct_url
              else:
                  raise ValueError("Lemon Slice did not return job_id or video_url.")
                  
@@ -436,64 +599,125 @@ def call_lemon_slice(avatar_image_s3_key: str, script_text: str, voice_id: Optio
          logging.error(f"[Job: {custom_job_id}][ERROR] Error parsing Lemon Slice /generate response: {e}")
          raise ValueError(f"Error parsing Lemon Slice response: {e}") from e
 
-    # 4. Poll the GET /generations/{job_id} endpoint for completion
+    return job_id, None
+
+async def call_lemon_slice(avatar_image_s3_key: str, script_text: str, voice_id: Optional[str], custom_job_id: str) -> Optional[str]:
+    """
+    Calls the Lemon Slice API to generate a talking head video.
+    - Needs the S3 key for the user's uploaded avatar image.
+    - Needs the generated script text (max 900 chars enforced).
+    - Accepts an optional voice_id.
+    - Returns a URL to the generated talking head video upon completion.
+    """
+    logging.info(f"[Job: {custom_job_id}] --- Calling Lemon Slice API ---")
+    logging.info(f"[Job: {custom_job_id}] Avatar S3 Key: {avatar_image_s3_key}")
+    # Enforce 900 character limit for LemonSlice
+    if len(script_text) > 900:
+        logging.warning(f"[Job: {custom_job_id}][WARN] Script text exceeds 900 characters ({len(script_text)}). Truncating for LemonSlice.")
+        script_text = script_text[:900]
+    logging.info(f"[Job: {custom_job_id}] Script (first 100 chars for LemonSlice): {script_text[:100]}...")
+    logging.info(f"[Job: {custom_job_id}] Voice ID: {voice_id if voice_id else 'Default (Sam)'}")
+    
+    if not LEMON_SLICE_API_KEY:
+        logging.warning("Lemon Slice API Key missing, cannot proceed.")
+        raise ValueError("Lemon Slice API Key not configured.")
+
+    headers = {
+        "Authorization": f"Bearer {LEMON_SLICE_API_KEY}",
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+    }
+
+    # Resume from a previous attempt's checkpoint instead of paying for a second generation
+    lip_synced_checkpoint = await run_blocking(load_checkpoint, custom_job_id, "lip_synced")
+    if lip_synced_checkpoint.get("video_url"):
+        logging.info(f"[Job: {custom_job_id}] Reusing finished Lemon Slice generation {lip_synced_checkpoint.get('task_id')} from checkpoint.")
+        return lip_synced_checkpoint["video_url"]
+
+    # Same avatar + script + voice rendered before (by any job)? Reuse it.
+    lip_sync_cache_key = None
+    avatar_fingerprint = await run_blocking(get_s3_object_fingerprint, s3_client, AWS_S3_BUCKET_NAME, avatar_image_s3_key)
+    if avatar_fingerprint:
+        lip_sync_cache_key = get_lip_sync_cache_key(
+            avatar_fingerprint, script_text, voice_id or LEMON_SLICE_DEFAULT_VOICE_ID, LEMON_SLICE_RESOLUTION
+        )
+        cached = await run_blocking(get_cached_lip_sync, lip_sync_cache_key)
+        cached_url = None
+        if cached and cached.get('s3_key'):
+            cached_url = await run_blocking(get_s3_presigned_url, AWS_S3_BUCKET_NAME, cached['s3_key'])
+        elif cached:
+            cached_url = cached.get('video_url')
+        if cached_url:
+            logging.info(f"[Job: {custom_job_id}] Lip sync cache hit. Skipping Lemon Slice generation.")
+            return cached_url
+
+    lip_sync_checkpoint = await run_blocking(load_checkpoint, custom_job_id, "lip_sync")
+    job_id = lip_sync_checkpoint.get("task_id")
+    if job_id:
+        logging.info(f"[Job: {custom_job_id}] Resuming Lemon Slice job {job_id} from checkpoint.")
+    else:
+        # 1-3. Presign the avatar and submit the generation request
+        job_id, direct_url = await run_blocking(
+            submit_lemon_slice_generation, avatar_image_s3_key, script_text, voice_id, headers, custom_job_id
+        )
+        if direct_url:
+            return direct_url
+        await run_blocking(save_checkpoint, custom_job_id, "lip_sync", job_id)
+    started_at = float(lip_sync_checkpoint.get("submitted_at") or time.time())
+
+    # 4. Poll the GET /generations/{job_id} endpoint for completion (via the shared poll scheduler)
     status_endpoint = f"https://lemonslice.com/api/v2/generations/{job_id}"
-    max_retries = 90 # Increased timeout to 90 * 5s = 450s = 7.5 minutes
-    retries = 0
-    final_video_url = None
 
-    while retries < max_retries:
-        try:
-            # Update status in Redis during polling
-            update_payload = {"status": "processing", "stage": f"lip_sync_polling_{retries+1}"}
-            # Need job_id and user_id here - Assume they are accessible or need to be passed
-            # For now, let's assume custom_job_id is available in this scope (will need adjustment)
-            # update_job_status(custom_job_id, update_payload) 
-            
-            logging.info(f"[Job: {custom_job_id}] Checking Lemon Slice job status ({retries+1}/{max_retries}). Lemon Job ID: {job_id}")
-            status_response = requests.get(status_endpoint, headers=headers, timeout=15)
-            
-            if status_response.status_code == 404:
-                 # Job might not be findable immediately after creation
-                 logging.warning(f"[Job: {custom_job_id}][WARN] Lemon Slice job not found yet (404), retrying...")
-                 retries += 1
-                 time.sleep(5) # Wait longer if 404
-                 continue
-            
-            if not status_response.ok:
-                logging.error(f"[Job: {custom_job_id}][ERROR] Lemon Slice /generations/{job_id} responded {status_response.status_code}: {status_response.text}")
-            status_response.raise_for_status()
-
-            status_data = status_response.json()
-            status = status_data.get('status')
-            logging.info(f"[Job: {custom_job_id}] Lemon Slice Job Status: {status}")
-
-            if status == "completed":
-                final_video_url = status_data.get('video_url')
-                if not final_video_url:
-                     logging.error(f"[Job: {custom_job_id}][ERROR] Lemon Slice job completed but no video_url found.")
-                     raise ValueError("Lemon Slice job completed but no video_url found.")
-                logging.info(f"[Job: {custom_job_id}] Lemon Slice generation complete! Video URL: {final_video_url}")
-                break # Exit polling loop
-            elif status == "failed":
-                error_message = status_data.get('error_message', 'Unknown error')
-                raise RuntimeError(f"Lemon Slice generation failed: {error_message}")
-            elif status in ["processing", "queued", "pending"]: # Assumed statuses
-                # Continue polling
-                pass
-            else:
-                logging.warning(f"[Job: {custom_job_id}][WARN] Unknown Lemon Slice job status received: {status}")
-                # Continue polling cautiously
+    def check_generation(session: requests.Session) -> Optional[str]:
+        status_response = session.get(status_endpoint, headers=headers, timeout=15)
+
+        if status_response.status_code == 404:
+            # Job might not be findable immediately after creation
+            logging.warning(f"[Job: {custom_job_id}][WARN] Lemon Slice job not found yet (404), retrying...")
+            return None
+
+        if not status_response.ok:
+            logging.error(f"[Job: {custom_job_id}][ERROR] Lemon Slice /generations/{job_id} responded {status_response.status_code}: {status_response.text}")
+        status_response.raise_for_status()
+
+        status_data = status_response.json()
+        status = status_data.get('status')
+        logging.info(f"[Job: {custom_job_id}] Lemon Slice Job Status: {status}")
+
+        if status == "completed":
+            video_url = status_data.get('video_url')
+            if not video_url:
+                logging.error(f"[Job: {custom_job_id}][ERROR] Lemon Slice job completed but no video_url found.")
+                raise ValueError("Lemon Slice job completed but no video_url found.")
+            return video_url
+        elif status == "failed":
+            error_message = status_data.get('error_message', 'Unknown error')
+            raise RuntimeError(f"Lemon Slice generation failed: {error_message}")
+        elif status not in ["processing", "queued", "pending"]: # Assumed statuses
+            logging.warning(f"[Job: {custom_job_id}][WARN] Unknown Lemon Slice job status received: {status}")
+            # Continue polling cautiously
+        # Use progress/ETA fields if the response includes them
+        eta = status_data.get('eta_seconds')
+        if eta is None:
+            eta = estimate_eta(time.time() - started_at, status_data.get('progress'))
+        return PollPending.from_response(status_response, eta=eta)
+
+    logging.info(f"[Job: {custom_job_id}] Waiting for Lemon Slice job {job_id} to complete...")
+    final_video_url = await poll_scheduler.wait(
+        "lemon_slice", job_id, check_generation,
+        timeout=450, label=f"[Job: {custom_job_id}]", # 7.5 minutes
+        started_at=started_at,
+        expected_duration=await run_blocking(get_expected_stage_duration, "lip_sync"),
+        on_done=track_poll_stats(custom_job_id, "lip_sync"),
+        policy=CALLBACK_FALLBACK_POLL_POLICY if callbacks_enabled() else None,
+        wake_key=callback_wake_key("lemon_slice", custom_job_id),
+    )
+    if final_video_url:
+        logging.info(f"[Job: {custom_job_id}] Lemon Slice generation complete! Video URL: {final_video_url}")
+        await run_blocking(save_checkpoint, custom_job_id, "lip_synced", job_id, video_url=final_video_url)
+        if lip_sync_cache_key:
+            await run_blocking(store_lip_sync_result, s3_client, AWS_S3_BUCKET_NAME, lip_sync_cache_key, final_video_url)
 
-            retries += 1
-            time.sleep(5) # Wait 5 seconds before polling again
-        
-        except requests.exceptions.RequestException as e:
-            logging.error(f"[Job: {custom_job_id}][ERROR] Error polling Lemon Slice job status: {e}")
-            # Allow retries on temporary polling errors
-            retries += 1
-            time.sleep(5)
-    
     if not final_video_url:
         logging.error(f"[Job: {custom_job_id}][ERROR] Lemon Slice generation timed out or failed.")
         return None
@@ -547,10 +771,13 @@ def call_creatomate(lemon_slice_video_url: str, original_video_s3_key: Optional[
         "template_id": CREATOMATE_TEMPLATE_ID,
         "modifications": modifications,
     }
+    callback_url = build_callback_url("creatomate", custom_job_id)
+    if callback_url:
+        payload["webhook_url"] = callback_url
 
     try:
         logging.info(f"[Job: {custom_job_id}] Sending render request to Creatomate using Template ID: {CREATOMATE_TEMPLATE_ID}...")
-        response = requests.post(f"{CREATOMATE_API_URL}/renders", headers=headers, json=payload, timeout=30)
+        response = get_provider_session("creatomate").post(f"{CREATOMATE_API_URL}/renders", headers=headers, json=payload, timeout=30)
         
         if not response.ok:
              logging.error(f"[Job: {custom_job_id}][ERROR] Creatomate /renders responded {response.status_code}: {response.text}")
@@ -579,55 +806,134 @@ def call_creatomate(lemon_slice_video_url: str, original_video_s3_key: Optional[
         logging.error(f"[Job: {custom_job_id}][ERROR] Unexpected error during Creatomate processing: {e}")
         return None 
 
-def verify_url_accessible(url: str, timeout_seconds: int = 120, check_interval: int = 10) -> bool:
-    """Polls a URL with HEAD requests until it gets a 2xx status or times out."""
-    logging.info(f"Verifying URL accessibility: {url} (Timeout: {timeout_seconds}s, Interval: {check_interval}s)")
-    start_time = time.time()
-    while time.time() - start_time < timeout_seconds:
-        try:
-            # Use HEAD request to avoid downloading the whole file
-            # Increased request timeout slightly as well
-            response = requests.head(url, timeout=15, allow_redirects=True)
-            if 200 <= response.status_code < 300:
-                logging.info(f"URL is accessible (Status: {response.status_code}).")
-                return True
-            else:
-                logging.warning(f"URL check failed (Status: {response.status_code}), retrying in {check_interval}s...")
+async def verify_url_accessible(url: str, timeout_seconds: int = 120, custom_job_id: Optional[str] = None, started_at: Optional[float] = None) -> bool:
+    """
+    Polls a URL with HEAD requests (via the shared poll scheduler) until it gets a 2xx status or times out.
+    For a job's final render, pass the job ID and when the render was submitted so the wait is
+    tracked as the job's "render" stage.
+    """
+    logging.info(f"Verifying URL accessibility: {url} (Timeout: {timeout_seconds}s)")
+
+    def check_url(session: requests.Session) -> Optional[bool]:
+        # Use HEAD request to avoid downloading the whole file
+        response = session.head(url, timeout=15, allow_redirects=True)
+        if 200 <= response.status_code < 300:
+            logging.info(f"URL is accessible (Status: {response.status_code}).")
+            return True
+        logging.warning(f"URL check failed (Status: {response.status_code}), retrying...")
+        return PollPending.from_response(response)
+
+    poll_options = {}
+    if custom_job_id:
+        poll_options = {
+            "started_at": started_at,
+            "expected_duration": await run_blocking(get_expected_stage_duration, "render"),
+            "on_done": track_poll_stats(custom_job_id, "render"),
+            "policy": CALLBACK_FALLBACK_POLL_POLICY if callbacks_enabled() else None,
+            "wake_key": callback_wake_key("creatomate", custom_job_id),
+        }
+    if await poll_scheduler.wait("video_host", url, check_url, timeout=timeout_seconds, label="[URL check]", **poll_options):
+        return True
 
-        except requests.exceptions.Timeout:
-            logging.warning(f"URL check request timed out, retrying in {check_interval}s...")
-        except requests.exceptions.RequestException as e:
-            logging.warning(f"URL check error: {e}, retrying in {check_interval}s...")
-        
-        time.sleep(check_interval)
-        
     logging.error(f"[ERROR] URL verification timed out after {timeout_seconds} seconds.")
     return False
 
-def update_job_status(job_id: str, status_data: dict, user_id: Optional[str] = None):
-    """Updates the job status hash in Redis, optionally including user_id."""
+def save_checkpoint(job_id: str, stage: str, task_id: Optional[str] = None, **extra):
+    """
+    Records a resumable stage in the job's checkpoint hash (`job_ckpt:{job_id}`, kept out of
+    the client-facing status): the stage name, the provider task ID (if any) and when it was
+    submitted. Extra values are stored alongside. Fields are namespaced as `ckpt:{stage}:{name}`
+    so earlier stages stay readable after later ones are written.
+    """
+    submitted_at = time.time()
+    fields = {
+        "checkpoint_stage": stage,
+        "checkpoint_task_id": task_id,
+        "checkpoint_submitted_at": submitted_at,
+        f"ckpt:{stage}:task_id": task_id,
+        f"ckpt:{stage}:submitted_at": submitted_at,
+    }
+    for name, value in extra.items():
+        fields[f"ckpt:{stage}:{name}"] = value
+    checkpoint_key = job_checkpoint_key(job_id)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hset(checkpoint_key, mapping={k: str(v) if v is not None else '' for k, v in fields.items()})
+        pipe.expire(checkpoint_key, JOB_STATUS_TTL)
+        pipe.execute()
+    except redis.exceptions.RedisError as e:
+        logging.error(f"[ERROR] Failed to save checkpoint '{stage}' for job {job_id}: {e}")
+
+def load_checkpoint(job_id: str, stage: str) -> dict:
+    """Returns the saved checkpoint fields for a stage (task_id, submitted_at, extras), or {} if none."""
+    prefix = f"ckpt:{stage}:"
     try:
-        status_key = f"job_status:{job_id}"
-        
-        # Add user_id to the status data if provided and not already present
-        if user_id and 'user_id' not in status_data:
-            status_data['user_id'] = user_id
-            
-        # Ensure all values are strings or primitive types suitable for Redis hash
-        update_payload = {k: str(v) if v is not None else '' for k, v in status_data.items()}
-            
-        redis_client.hset(status_key, mapping=update_payload)
-        redis_client.expire(status_key, 3600 * 24) 
-        logging.info(f"[Status Update] Job {job_id}: {update_payload}")
+        saved = redis_client.hgetall(job_checkpoint_key(job_id))
     except redis.exceptions.RedisError as e:
-        logging.error(f"[ERROR] Failed to update Redis job status for {job_id}: {e}")
+        logging.error(f"[ERROR] Failed to load checkpoint '{stage}' for job {job_id}: {e}")
+        return {}
+    return {k[len(prefix):]: v for k, v in saved.items() if k.startswith(prefix) and v != ''}
+
+def track_poll_stats(job_id: str, stage: str):
+    """
+    Builds a poll scheduler on_done callback that adds the number of status checks to the
+    `polls:{stage}` counter in the job's checkpoint hash and, if the stage finished, records
+    how long it took.
+    """
+    def on_done(task, result):
+        try:
+            checkpoint_key = job_checkpoint_key(job_id)
+            pipe = redis_client.pipeline()
+            pipe.hincrby(checkpoint_key, f"polls:{stage}", task.attempts)
+            pipe.expire(checkpoint_key, JOB_STATUS_TTL)
+            pipe.execute()
+        except redis.exceptions.RedisError as e:
+            logging.error(f"[ERROR] Failed to record poll count for job {job_id}: {e}")
+        if result is not None:
+            record_stage_duration(stage, task.elapsed)
+    return on_done
+
+def preflight_source_video(video_s3_key: str, custom_job_id: str) -> Optional[MediaInfo]:
+    """
+    Reads the source video's container header from S3 (ranged GETs only) and checks its
+    duration and codec. Raises ValueError with a user-facing message if the video can't be used.
+    Returns None without checking if S3 couldn't be read; the providers will report that themselves.
+    """
+    reader = S3RangeReader(s3_client, AWS_S3_BUCKET_NAME, video_s3_key)
+    try:
+        info = probe_media(reader)
+    except MediaProbeError as e:
+        logging.warning(f"[Job: {custom_job_id}] Preflight rejected {video_s3_key}: {e}")
+        raise ValueError(f"The uploaded video can't be processed: {e}")
     except Exception as e:
-         logging.error(f"[ERROR] Unexpected error updating job status for {job_id}: {e}")
+        logging.warning(f"[Job: {custom_job_id}][WARN] Preflight could not read {video_s3_key}, skipping it: {e}")
+        return None
+    logging.info(f"[Job: {custom_job_id}] Preflight of {video_s3_key} ({reader.requests} ranged reads): {info}")
+    problem = source_video_problem(info, SOURCE_VIDEO_MAX_SECONDS)
+    if problem:
+        raise ValueError(problem)
+    return info
 
 # --- Main Worker Loop --- 
 
+def is_retryable_job_error(error: Exception) -> bool:
+    """
+    ValueError means the job itself can't succeed (bad input, unusable video, empty script),
+    so it fails right away. Anything else (provider failures and timeouts, network, Redis or
+    Supabase errors) is re-raised by the job processors: the entry stays pending, the reclaimer
+    redelivers it (resuming from its checkpoints) and dead-letters it with its last error
+    after JOB_MAX_DELIVERIES attempts.
+    """
+    return not isinstance(error, ValueError)
+
+def mark_job_retrying(custom_job_id: str, error_message: str):
+    try:
+        update_job_status(custom_job_id, {"status": "processing", "stage": "retrying", "last_error": error_message})
+    except Exception as e:
+        logging.error(f"[ERROR] Failed to update status to retrying: {e}")
+
 # Renamed the original function
-def process_continue_job(redis_message_id: str, job_data: dict):
+async def process_continue_job(redis_message_id: str, job_data: dict):
     """Processes the continuation of a job after script review."""
     custom_job_id = job_data.get('job_id')
     if not custom_job_id:
@@ -639,7 +945,7 @@ def process_continue_job(redis_message_id: str, job_data: dict):
     thumbnail_url = None
     try:
         status_key = f"job_status:{custom_job_id}"
-        saved_status = redis_client.hgetall(status_key)
+        saved_status = await run_blocking(redis_client.hgetall, status_key)
         if not saved_status:
             raise ValueError(f"No status found in Redis for job {custom_job_id}")
         if isinstance(next(iter(saved_status.values())), bytes):
@@ -647,6 +953,10 @@ def process_continue_job(redis_message_id: str, job_data: dict):
         user_id = saved_status.get('user_id')
         if not user_id:
             raise ValueError(f"Missing user_id in saved status for job {custom_job_id}")
+        if await run_blocking(load_checkpoint, custom_job_id, "finished"):
+            # Redelivered after it already completed - nothing left to do
+            logging.info(f"[Job: {custom_job_id}] Continue job already finished (checkpoint found). Skipping redelivered entry.")
+            return
         script = job_data.get('script')
         if not script:
             raise ValueError(f"Missing 'script' in continue job data for job {custom_job_id}")
@@ -659,51 +969,54 @@ def process_continue_job(redis_message_id: str, job_data: dict):
         logging.info(f"Retrieved Data - User: {user_id}, Avatar: {avatar_s3_key}, Video: {video_s3_key}, Voice: {voice_id}")
         logging.info(f"Using Script: {script[:100]}...")
         # Only LemonSlice and Creatomate are called here, never any summarization or moderation.
-        def get_user_credits(user_id):
-            response = supabase.table('profiles').select('credits').eq('id', user_id).maybe_single().execute()
-            return response.data.get('credits', 0) if response.data else 0
-        current_credits = get_user_credits(user_id)
-        if current_credits <= 0:
+        # Holds one credit for this job; a redelivered job reuses its reservation instead of paying twice
+        if not await run_blocking(reserve_credit, user_id, custom_job_id):
             try:
-                update_job_status(custom_job_id, {"status": "failed", "error_message": "Insufficient credits.", "stage": "error"}, user_id)
+                await run_blocking(update_job_status, custom_job_id, {"status": "failed", "error_message": "Insufficient credits.", "stage": "error"}, user_id)
             except Exception as e:
                 logging.error(f"[ERROR] Failed to update status to failed for insufficient credits: {e}")
             logging.info(f"[WORKER][CREDITS] User {user_id} has insufficient credits. Job {custom_job_id} failed.")
             return
-        supabase.table('profiles').update({'credits': current_credits - 1}).eq('id', user_id).execute()
-        logging.info(f"[WORKER][CREDITS] Deducted 1 credit from user {user_id} for job {custom_job_id}.")
         try:
-            update_job_status(custom_job_id, {"stage": "lip_syncing"})
+            await run_blocking(update_job_status, custom_job_id, {"stage": "lip_syncing"})
         except Exception as e:
             logging.error(f"[ERROR] Failed to update status to lip_syncing: {e}")
-        lemon_slice_video_url = call_lemon_slice(avatar_s3_key, script, voice_id, custom_job_id)
+        lemon_slice_video_url = await call_lemon_slice(avatar_s3_key, script, voice_id, custom_job_id)
         if not lemon_slice_video_url:
             logging.error(f"[Job: {custom_job_id}][ERROR] Lemon Slice video generation failed.")
-            raise ValueError("Failed to generate Lemon Slice video.")
+            raise RuntimeError("Failed to generate Lemon Slice video.")
         try:
-            update_job_status(custom_job_id, {"stage": "rendering_final"})
+            await run_blocking(update_job_status, custom_job_id, {"stage": "rendering_final"})
         except Exception as e:
             logging.error(f"[ERROR] Failed to update status to rendering_final: {e}")
-        final_video_url = call_creatomate(
-            lemon_slice_video_url=lemon_slice_video_url,
-            original_video_s3_key=video_s3_key,
-            script_text=script,
-            custom_job_id=custom_job_id
-        )
-        if not final_video_url:
-            logging.error(f"[Job: {custom_job_id}][ERROR] Creatomate video rendering failed.")
-            raise ValueError("Failed to render final video with Creatomate.")
+        final_video_url = (await run_blocking(load_checkpoint, custom_job_id, "render")).get("video_url")
+        if final_video_url:
+            logging.info(f"[Job: {custom_job_id}] Reusing Creatomate render from checkpoint: {final_video_url}")
+        else:
+            final_video_url = await run_blocking(
+                call_creatomate,
+                lemon_slice_video_url=lemon_slice_video_url,
+                original_video_s3_key=video_s3_key,
+                script_text=script,
+                custom_job_id=custom_job_id
+            )
+            if not final_video_url:
+                logging.error(f"[Job: {custom_job_id}][ERROR] Creatomate video rendering failed.")
+                raise RuntimeError("Failed to render final video with Creatomate.")
+            await run_blocking(save_checkpoint, custom_job_id, "render", video_url=final_video_url)
         try:
-            update_job_status(custom_job_id, {"stage": "verifying_url"})
+            await run_blocking(update_job_status, custom_job_id, {"stage": "verifying_url"})
         except Exception as e:
             logging.error(f"[ERROR] Failed to update status to verifying_url: {e}")
-        if not verify_url_accessible(final_video_url):
+        render_checkpoint = await run_blocking(load_checkpoint, custom_job_id, "render")
+        render_submitted_at = float(render_checkpoint.get("submitted_at") or time.time())
+        if not await verify_url_accessible(final_video_url, custom_job_id=custom_job_id, started_at=render_submitted_at):
             raise RuntimeError("Generated video URL did not become accessible.")
         logging.info(f"Job {custom_job_id} completed successfully. Final URL: {final_video_url}")
         
         # Update Redis with completed status and final video URL
         try:
-            update_job_status(custom_job_id, {
+            await run_blocking(update_job_status, custom_job_id, {
                 "status": "completed", 
                 "stage": "finished",
                 "final_url": final_video_url
@@ -720,25 +1033,35 @@ def process_continue_job(redis_message_id: str, job_data: dict):
                 "title": "Untitled Video",
                 "thumbnail_url": None if not thumbnail_url or not thumbnail_url.strip() else thumbnail_url
             }
-            db_response = supabase.table("generated_videos").insert(insert_data).execute()
+            db_response = await run_blocking(supabase.table("generated_videos").insert(insert_data).execute)
             if db_response.data:
                 logging.info(f"Successfully saved video details to Supabase for job {custom_job_id}")
+                # Invalidates the dashboard's cached past-videos pages
+                await run_blocking(bump_past_videos_version, user_id)
             else:
                 logging.error(f"[ERROR] Failed to save video details to Supabase for job {custom_job_id}. Response: {db_response}")
         except APIError as e:
             logging.error(f"[ERROR] Supabase API Error saving video details for job {custom_job_id}: {e}")
         except Exception as e:
             logging.error(f"[ERROR] Unexpected error saving video details to Supabase for job {custom_job_id}: {e}")
+        await run_blocking(save_checkpoint, custom_job_id, "finished", final_url=final_video_url)
+        await run_blocking(commit_credit, custom_job_id)
     except Exception as e:
         error_message = f"Continue Job failed: {type(e).__name__} - {str(e)}"
+        if is_retryable_job_error(e):
+            # Keeps the credit reservation; the dead-letter path refunds it if every attempt fails
+            logging.warning(f"[WARN] {error_message}. Leaving it for another attempt.")
+            await run_blocking(mark_job_retrying, custom_job_id, error_message)
+            raise
         logging.error(f"[ERROR] {error_message}")
+        await run_blocking(refund_credit, custom_job_id)
         fail_user_id = user_id if 'user_id' in locals() and user_id else None
         try:
-            update_job_status(custom_job_id, {"status": "failed", "error_message": str(e), "stage": "error"}, fail_user_id)
+            await run_blocking(update_job_status, custom_job_id, {"status": "failed", "error_message": str(e), "stage": "error"}, fail_user_id)
         except Exception as ex:
             logging.error(f"[ERROR] Failed to update status to failed in exception handler: {ex}")
 
-def process_new_job(redis_message_id: str, job_data_str: str):
+async def process_new_job(redis_message_id: str, job_data_str: str):
     """Processes the initial part of a job: Upload -> Script Gen -> Stop for Review."""
     logging.info(f"\n[WORKER_NEW_JOB] --- Starting to process NEW job from Redis Stream. Message ID: {redis_message_id} ---") # Log entry
     logging.info(f"[WORKER_NEW_JOB] Raw job_data_str from stream: {job_data_str}") # Log raw data
@@ -756,7 +1079,7 @@ def process_new_job(redis_message_id: str, job_data_str: str):
              logging.error(f"[WORKER_NEW_JOB][ERROR] Job data missing required 'user_id'. Message ID: {redis_message_id}") # Log error
              # Do not raise immediately, try to update status as 'error_parsing' if custom_job_id is available
              if custom_job_id:
-                 update_job_status(custom_job_id, {"status": "error", "stage": "parsing_payload", "error_message": "Missing user_id"}, "SYSTEM_ERROR")
+                 await run_blocking(update_job_status, custom_job_id, {"status": "error", "stage": "parsing_payload", "error_message": "Missing user_id"}, "SYSTEM_ERROR")
              return # Exit if essential data is missing
 
         if not custom_job_id:
@@ -765,15 +1088,20 @@ def process_new_job(redis_message_id: str, job_data_str: str):
              # update_job_status(redis_message_id, {"status": "error", "stage": "parsing_payload", "error_message": "Missing job_id"}, user_id if user_id else "SYSTEM_ERROR") # Cannot do this without job_id
              return # Exit if essential data is missing
 
+        if await run_blocking(load_checkpoint, custom_job_id, "script_review"):
+            # Redelivered after the script was already produced - don't clobber the review state
+            logging.info(f"[WORKER_NEW_JOB] Job {custom_job_id} already reached script review (checkpoint found). Skipping redelivered entry.")
+            return
+
         # --- BEGIN TEMPORARY DEBUGGING STATUS UPDATE ---
         logging.info(f"[WORKER_NEW_JOB][DEBUG] Attempting PRELIMINARY status update for job_id: {custom_job_id}")
-        update_job_status(custom_job_id, {"status": "received_by_worker", "stage": "initial_parse_complete", "redis_message_id": redis_message_id}, user_id)
+        await run_blocking(update_job_status, custom_job_id, {"status": "received_by_worker", "stage": "initial_parse_complete", "redis_message_id": redis_message_id}, user_id)
         logging.info(f"[WORKER_NEW_JOB][DEBUG] PRELIMINARY status update for job_id: {custom_job_id} attempted.")
         # --- END TEMPORARY DEBUGGING STATUS UPDATE ---
 
         # Initial status update (this was the original one, now serves as a second update)
         logging.info(f"[WORKER_NEW_JOB] Attempting to write 'processing' status for job {custom_job_id}: {{'status': 'processing', 'stage': 'starting', 'user_id': '{user_id}'}}") # Log status update
-        update_job_status(custom_job_id, {"status": "processing", "stage": "starting"}, user_id)
+        await run_blocking(update_job_status, custom_job_id, {"status": "processing", "stage": "starting"}, user_id)
         logging.info(f"[WORKER_NEW_JOB] Successfully wrote 'processing' status for job {custom_job_id}.") # Log success
         
         video_s3_key = job_data.get('video_s3_key') 
@@ -786,6 +1114,19 @@ def process_new_job(redis_message_id: str, job_data_str: str):
              raise ValueError("Job data missing required 'avatar_s3_key'")
         logging.info(f"[WORKER_NEW_JOB] Job {custom_job_id} details - User ID: {user_id}, Video Key: {video_s3_key}, Avatar Key: {avatar_s3_key}") # Log details
 
+        if video_s3_key:
+            # Reject unusable videos from their header alone, before any provider time is spent
+            source_info = await run_blocking(preflight_source_video, video_s3_key, custom_job_id)
+            if source_info:
+                # Kept on the job status for the continuation step and the client
+                await run_blocking(update_job_status, custom_job_id, {
+                    "source_duration": round(source_info.duration, 3) if source_info.duration is not None else None,
+                    "source_width": source_info.width,
+                    "source_height": source_info.height,
+                    "source_container": source_info.container,
+                    "source_video_codec": source_info.video_codec,
+                })
+
         # --- Pipeline Steps up to Script Generation --- 
         script = None
         summary = None # Initialize summary
@@ -797,35 +1138,45 @@ def process_new_job(redis_message_id: str, job_data_str: str):
             # Only call Twelve Labs if NOT manual_script_mode
             logging.info(f"[WORKER_NEW_JOB] Job {custom_job_id}: Starting video summarization.")
             try:
-                update_job_status(custom_job_id, {"stage": "summarizing"})
+                await run_blocking(update_job_status, custom_job_id, {"stage": "summarizing"})
             except Exception as e:
                 logging.error(f"[ERROR] Failed to update status to summarizing: {e}")
-            video_url = get_s3_presigned_url(AWS_S3_BUCKET_NAME, video_s3_key)
-            if not video_url:
-                logging.error(f"[WORKER_NEW_JOB][ERROR] Job {custom_job_id}: Failed to get S3 presigned URL for input video {video_s3_key}.")
-                raise ValueError("Failed to get S3 presigned URL for input video.")
-            summary, thumbnail_url = call_twelve_labs_summarize(video_url, custom_job_id)
-            if summary is None:
-                logging.error(f"[Job: {custom_job_id}][ERROR] Twelve Labs summarization failed. Cannot generate script.")
-                raise ValueError("Failed to get video summary from Twelve Labs.")
+            # Same clip summarized before (by content, not S3 key)? Then skip Twelve Labs entirely.
+            video_fingerprint = await run_blocking(get_s3_object_fingerprint, s3_client, AWS_S3_BUCKET_NAME, video_s3_key)
+            cached_summary = await run_blocking(get_cached_video_summary, video_fingerprint) if video_fingerprint else None
+            if cached_summary:
+                summary = cached_summary['summary']
+                thumbnail_url = cached_summary.get('thumbnail_url') or None
+                logging.info(f"[WORKER_NEW_JOB] Job {custom_job_id}: Video summary cache hit (Twelve Labs video {cached_summary.get('video_id')}).")
+            else:
+                video_url = await run_blocking(get_s3_presigned_url, AWS_S3_BUCKET_NAME, video_s3_key)
+                if not video_url:
+                    logging.error(f"[WORKER_NEW_JOB][ERROR] Job {custom_job_id}: Failed to get S3 presigned URL for input video {video_s3_key}.")
+                    raise RuntimeError("Failed to get S3 presigned URL for input video.")
+                twelve_labs_video_id, summary, thumbnail_url = await call_twelve_labs_summarize(video_url, custom_job_id)
+                if summary is None:
+                    logging.error(f"[Job: {custom_job_id}][ERROR] Twelve Labs summarization failed. Cannot generate script.")
+                    raise RuntimeError("Failed to get video summary from Twelve Labs.")
+                if video_fingerprint:
+                    await run_blocking(cache_video_summary, video_fingerprint, twelve_labs_video_id, summary, thumbnail_url)
             logging.info(f"[WORKER_NEW_JOB] Job {custom_job_id}: Video summarization complete. Summary length: {len(summary) if summary else 0}")
             try:
-                update_job_status(custom_job_id, {"stage": "generating_script"})
+                await run_blocking(update_job_status, custom_job_id, {"stage": "generating_script"})
             except Exception as e:
                 logging.error(f"[ERROR] Failed to update status to generating_script: {e}")
-            script = generate_script(summary, user_id, custom_job_id)
+            script = await run_blocking(generate_script, summary, user_id, custom_job_id)
             logging.info(f"[WORKER_NEW_JOB] Job {custom_job_id}: Script generation from summary complete. Script length: {len(script) if script else 0}")
         else:
             # Avatar-only flow: Generate default script
             logging.info(f"[WORKER_NEW_JOB][INFO] Job {custom_job_id}: Video S3 key not provided. Generating default script.") # Log info
-            update_job_status(custom_job_id, {"stage": "generating_script"}) # Update stage
+            await run_blocking(update_job_status, custom_job_id, {"stage": "generating_script"}) # Update stage
             script = "Hello from ReMerge AI! This video was generated using just an avatar."
             thumbnail_url = None # No thumbnail for avatar-only
             logging.info(f"[WORKER_NEW_JOB] Job {custom_job_id}: Default script generated.") # Log step result
 
         # --- Stop for Review ---
         logging.info(f"[WORKER_NEW_JOB] Job {custom_job_id} paused for script review. Storing to Redis.") # Log step
-        update_job_status(custom_job_id, {
+        await run_blocking(update_job_status, custom_job_id, {
             "status": "pending_review", 
             "stage": "script_ready_for_review",
             "generated_script": script, 
@@ -834,10 +1185,15 @@ def process_new_job(redis_message_id: str, job_data_str: str):
             "thumbnail_url": thumbnail_url if thumbnail_url and thumbnail_url.strip() else None, # Save optional thumbnail
             "summary": summary if summary else "" # Save summary for context if available
         }, user_id)
+        await run_blocking(save_checkpoint, custom_job_id, "script_review")
         logging.info(f"[WORKER_NEW_JOB] Job {custom_job_id}: Status updated to pending_review in Redis.") # Log step result
 
     except Exception as e:
         error_message = f"New Job failed: {type(e).__name__} - {str(e)}"
+        if custom_job_id and is_retryable_job_error(e):
+            logging.warning(f"[WORKER_NEW_JOB][WARN] Job {custom_job_id}: {error_message}. Leaving it for another attempt.")
+            await run_blocking(mark_job_retrying, custom_job_id, error_message)
+            raise
         # Ensure custom_job_id is defined for logging, even if parsing failed early
         job_id_for_status_log = custom_job_id if custom_job_id else redis_message_id
         logging.error(f"[WORKER_NEW_JOB][ERROR] Processing for job {job_id_for_status_log} failed: {error_message}") # Log error
@@ -849,18 +1205,63 @@ def process_new_job(redis_message_id: str, job_data_str: str):
         
         # Ensure user_id is available for failure update, even if parsing failed
         fail_user_id = user_id if 'user_id' in locals() and user_id else None
-        update_job_status(job_id_for_status_log, {"status": "failed", "error_message": str(e), "stage": "error"}, fail_user_id)
+        await run_blocking(update_job_status, job_id_for_status_log, {"status": "failed", "error_message": str(e), "stage": "error"}, fail_user_id)
         logging.error(f"[WORKER_NEW_JOB] Job {job_id_for_status_log} status updated to failed in Redis.") # Log error status update
-        # Do not re-raise, allow worker to acknowledge and continue
+        # Permanent failure: don't re-raise, so the entry is acknowledged
+
+def mark_job_dead_lettered(message_id: str, message_data: dict, last_error: str):
+    """Marks the job behind a dead-lettered stream entry as failed so the user isn't left waiting."""
+    try:
+        job_data = json.loads(message_data.get('job_data') or '{}')
+    except json.JSONDecodeError:
+        job_data = {}
+    custom_job_id = job_data.get('job_id')
+    if not custom_job_id:
+        return
+    refund_credit(custom_job_id)
+    update_job_status(custom_job_id, {
+        "status": "failed",
+        "stage": "error",
+        "error_message": "Job could not be processed after repeated attempts.",
+        "last_error": last_error,
+    }, job_data.get('user_id'))
+
+def job_owner(message_data: dict) -> Optional[str]:
+    """user_id of a stream entry's job, used for the per-user in-flight limit (None for jobs without one)."""
+    try:
+        return json.loads(message_data.get('job_data') or '{}').get('user_id')
+    except (json.JSONDecodeError, AttributeError):
+        return None
+
+async def dispatch_job(message_id: str, message_data: dict):
+    """Routes a single stream entry to the matching job processor based on its job_type."""
+    # Extract job data string and job type (message_data is already decoded by redis-py)
+    job_data_str = message_data.get('job_data')
+    job_type = message_data.get('job_type', 'new') # Default to 'new' if type is missing
+
+    if not job_data_str:
+        logging.error(f"[ERROR] Message {message_id} missing 'job_data'. Skipping and Acknowledging.")
+        return
+
+    # Dispatch based on job_type
+    if job_type == 'continue':
+        # Parse job_data string for continue job
+        job_data_dict = json.loads(job_data_str)
+        await process_continue_job(message_id, job_data_dict)
+    elif job_type == 'new':
+        await process_new_job(message_id, job_data_str)
+    else:
+        logging.warning(f"[WARN] Unknown job_type '{job_type}' for message {message_id}. Treating as 'new'.")
+        await process_new_job(message_id, job_data_str) # Fallback to new job processing
 
 if __name__ == "__main__":
     logging.info("Starting worker...")
     # Check Redis connection on startup
     try:
         # Now REDIS_URL and MEME_JOB_STREAM are in scope
-        logging.info(f"Worker attempting to connect to Redis at {REDIS_URL.replace('://', '://*:*@').split('@')[-1]} and listen to stream '{MEME_JOB_STREAM}'...")
+        logging.info(f"Worker attempting to connect to Redis at {REDIS_URL.replace('://', '://*:*@').split('@')[-1]} and listen to streams {ALL_JOB_STREAMS}...")
         redis_client.ping()
-        logging.info(f"Worker successfully connected to Redis. Listening to stream '{MEME_JOB_STREAM}'.")
+        logging.info(f"Worker successfully connected to Redis. Listening to streams {ALL_JOB_STREAMS}.")
         
         # Debug: Check if stream exists and has entries
         try:
@@ -875,79 +1276,63 @@ if __name__ == "__main__":
         logging.critical(f"FATAL: Worker could not connect to Redis. Exiting. Error: {e}")
         exit(1)
 
-    # Use a unique consumer ID for this worker instance
-    consumer_name = f"worker-{os.getpid()}"
-    group_name = "meme_job_consumers"
+    # Use a unique consumer ID for this worker instance (containers all tend to run as PID 1)
+    consumer_name = f"worker-{socket.gethostname()}-{os.getpid()}"
+    group_name = JOB_CONSUMER_GROUP
 
-    # Ensure the consumer group exists
-    try:
-        redis_client.xgroup_create(MEME_JOB_STREAM, group_name, id='$', mkstream=True)
-        logging.info(f"Consumer group '{group_name}' created or already exists.")
-    except redis.exceptions.ResponseError as e:
-        if "BUSYGROUP Consumer Group name already exists" not in str(e):
-            logging.error(f"Error creating/checking consumer group: {e}")
-            # Decide if fatal or not
-        else:
-             logging.info(f"Consumer group '{group_name}' already exists.")
-
-    while True:
+    # Ensure the consumer group exists on every job stream. Groups start at '0' so jobs
+    # enqueued on a lane before any worker created its group are still picked up.
+    for stream in ALL_JOB_STREAMS:
         try:
-            logging.debug("[DEBUG] Waiting for new jobs...")
-            # Read from the stream, block for up to 5 seconds if no new messages
-            # '>' means read new messages not yet delivered to this group
-            # Use count=1 to process one job at a time
-            response = redis_client.xreadgroup(
-                group_name, 
-                consumer_name, 
-                {MEME_JOB_STREAM: '>'}, 
-                count=1, 
-                block=5000 # Block for 5000ms (5 seconds)
-            )
-
-            if not response:
-                pending = redis_client.xpending(MEME_JOB_STREAM, group_name)
-                if pending and isinstance(pending, dict) and pending.get('count', 0) > 0:
-                    logging.debug(f"[DEBUG] {pending['count']} pending jobs found. Oldest: {pending.get('min')}, newest: {pending.get('max')}")
-                continue
-
-            # Response format: [[stream_name, [[message_id, {field: value}]]]]
-            stream_name, messages = response[0]
-            message_id, message_data_bytes = messages[0]
-
-            logging.info(f"\nReceived Job - Stream: {stream_name}, Message ID: {message_id}")
-            
-            # message_data_bytes should already be decoded by redis-py
-            message_data = message_data_bytes 
-
-            # Extract job data string and job type
-            job_data_str = message_data.get('job_data')
-            job_type = message_data.get('job_type', 'new') # Default to 'new' if type is missing
-
-            if not job_data_str:
-                 logging.error(f"[ERROR] Message {message_id} missing 'job_data'. Skipping and Acknowledging.")
-                 redis_client.xack(MEME_JOB_STREAM, group_name, message_id)
-                 continue
-
-            # Dispatch based on job_type
-            if job_type == 'continue':
-                 # Parse job_data string for continue job
-                 job_data_dict = json.loads(job_data_str) 
-                 process_continue_job(message_id, job_data_dict)
-            elif job_type == 'new':
-                 process_new_job(message_id, job_data_str)
+            redis_client.xgroup_create(stream, group_name, id='0', mkstream=True)
+            logging.info(f"Consumer group '{group_name}' created on stream '{stream}'.")
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP Consumer Group name already exists" not in str(e):
+                logging.error(f"Error creating/checking consumer group on '{stream}': {e}")
+                # Decide if fatal or not
             else:
-                 logging.warning(f"[WARN] Unknown job_type '{job_type}' for message {message_id}. Treating as 'new'.")
-                 process_new_job(message_id, job_data_str) # Fallback to new job processing
-
-            redis_client.xack(MEME_JOB_STREAM, group_name, message_id)
-            logging.info(f"Acknowledged job {message_id}.")
-
-        except redis.exceptions.ConnectionError as e:
-            logging.error(f"Redis connection error in main loop: {e}. Attempting to reconnect...")
-            time.sleep(5) # Wait before retrying connection/read
-        except Exception as e:
-            logging.error(f"Unexpected error in worker loop: {e}", exc_info=True)
-            # No longer need to manually print traceback if exc_info=True is used with logging.error or logging.exception
-            time.sleep(2) # Brief pause before trying again
-
- 
\ No newline at end of file
+                 logging.info(f"Consumer group '{group_name}' already exists on '{stream}'.")
+
+    reclaimers = [
+        StreamReclaimer(
+            redis_client,
+            stream,
+            group_name,
+            consumer_name,
+            min_idle_ms=JOB_RECLAIM_MIN_IDLE_MS,
+            max_deliveries=JOB_MAX_DELIVERIES,
+            retain_entries=JOB_STREAM_RETAIN,
+            on_dead_letter=mark_job_dead_lettered,
+        )
+        for stream in ALL_JOB_STREAMS
+    ]
+    scheduler = StreamScheduler(
+        ALL_JOB_STREAMS,
+        weights=parse_stream_weights(os.getenv("JOB_STREAM_WEIGHTS")),
+        policy=JOB_STREAM_POLICY,
+    )
+    engine = JobEngine(
+        redis_client,
+        ALL_JOB_STREAMS,
+        group_name,
+        consumer_name,
+        dispatch_job,
+        max_in_flight=WORKER_MAX_IN_FLIGHT,
+        reclaimers=reclaimers,
+        scheduler=scheduler,
+        # Jobs of a user already at USER_MAX_IN_FLIGHT wait their turn instead of taking every slot
+        limiter=UserConcurrencyLimiter(redis_client, ALL_JOB_STREAMS, group_name),
+        job_owner=job_owner,
+    )
+    # Wake waiting jobs as soon as Lemon Slice / Creatomate call back
+    if callbacks_enabled():
+        CallbackListener(poll_scheduler).start()
+    # Writes credit balances changed by this worker's jobs back to Supabase
+    credit_write_behind = CreditWriteBehind()
+    credit_write_behind.start()
+    try:
+        asyncio.run(engine.run())
+    finally:
+        credit_write_behind.stop()
+        _blocking_executor.shutdown(wait=False)
+        close_provider_sessions()
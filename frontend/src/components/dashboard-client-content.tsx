@@ -28,6 +28,8 @@ export default function DashboardClientComponent() {
   const [credits, setCredits] = useState<number | string>('Loading...');
   const [loading, setLoading] = useState(true);
   const [pastVideos, setPastVideos] = useState<VideoCreation[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const supabase = createClient();
 
   // State for inline editing
@@ -75,6 +77,7 @@ export default function DashboardClientComponent() {
                 if (videosResponse.ok) {
                     const videoData = await videosResponse.json();
                     setPastVideos(videoData.videos || []);
+                    setNextCursor(videoData.next_cursor || null);
                 } else {
                     console.error("Failed to fetch past videos");
                     // If the endpoint doesn't exist yet, we'll use sample data
@@ -132,6 +135,7 @@ export default function DashboardClientComponent() {
         if (event === 'SIGNED_OUT') {
             setCredits('N/A');
             setPastVideos([]);
+            setNextCursor(null);
         }
         if (event === 'SIGNED_IN'){
              fetchData(); // Refetch data on sign in
@@ -194,6 +198,36 @@ export default function DashboardClientComponent() {
     }).format(date);
   };
 
+  // Loads the next (older) page of past videos
+  const handleLoadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    const { data: { session } } = await supabase.auth.getSession();
+    if (!session) {
+        toast.error("Authentication error.");
+        return;
+    }
+    setLoadingMore(true);
+    try {
+        const response = await fetch(`${process.env.NEXT_PUBLIC_BACKEND_API_URL}/api/past-videos?cursor=${encodeURIComponent(nextCursor)}`, {
+            headers: {
+                'Authorization': `Bearer ${session.access_token}`
+            }
+        });
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => ({}));
+            throw new Error(errorData.detail || "Failed to load more videos");
+        }
+        const videoData = await response.json();
+        setPastVideos(prevVideos => [...prevVideos, ...(videoData.videos || [])]);
+        setNextCursor(videoData.next_cursor || null);
+    } catch (error) {
+        console.error("Error loading more videos:", error);
+        toast.error((error as Error).message || "Could not load more videos.");
+    } finally {
+        setLoadingMore(false);
+    }
+  };
+
   // --- Edit Title Handlers ---
   const handleEditClick = (video: VideoCreation) => {
     setEditingVideoId(video.id);
@@ -335,6 +369,7 @@ export default function DashboardClientComponent() {
                 </CardHeader>
                 <CardContent>
                     {pastVideos.length > 0 ? (
+                        <>
                         <div className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-3 gap-8">
                             {pastVideos.map(video => (
                                 <div key={video.id} className="bg-card/80 backdrop-blur-sm rounded-lg overflow-hidden border border-border transition-shadow hover:shadow-lg hover:border-primary/20">
@@ -387,6 +422,14 @@ export default function DashboardClientComponent() {
                                 </div>
                             ))}
                         </div>
+                        {nextCursor && (
+                            <div className="flex justify-center mt-8">
+                                <Button variant="outline" size="lg" onClick={handleLoadMore} disabled={loadingMore}>
+                                    {loadingMore ? "Loading..." : "Load More"}
+                                </Button>
+                            </div>
+                        )}
+                        </>
                     ) : (
                         <div className="text-center py-16 border border-dashed border-border rounded-lg bg-muted/10">
                             <p className="text-xl text-muted-foreground mb-6">You haven't created any videos yet</p>
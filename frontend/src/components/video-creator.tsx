@@ -30,13 +30,18 @@ import { useRouter } from 'next/navigation'
 import Link from 'next/link'
 import { navigationGuard } from '@/lib/navigationLock'; // Adjust path if necessary
 
+// Job status arrives over the status stream; the poll is only a safety net
+const STATUS_FALLBACK_POLL_MS = 15000;
+const STATUS_STREAM_RECONNECT_MS = 3000;
+
 // Simple XHR upload function
 async function uploadFileToS3(file: File, token: string, uploadType: 'video' | 'avatar', duration?: number): Promise<{ upload_url: string, object_key: string }> {
   const apiUrl = `${process.env.NEXT_PUBLIC_BACKEND_API_URL}/api/upload-url`;
   const body: any = {
     filename: file.name,
     content_type: file.type || 'application/octet-stream',
-    upload_type: uploadType
+    upload_type: uploadType,
+    size: file.size // Checked against the size limit and signed into the upload URL
   };
   if (uploadType === 'video' && duration !== undefined) {
     body.duration = duration;
@@ -175,7 +180,11 @@ export default function VideoCreator() {
   const [isGenerating, setIsGenerating] = useState(false);
   const [generatedJobId, setGeneratedJobId] = useState<string | null>(null);
   const [jobStatus, setJobStatus] = useState<any>(null);
-  const [pollingIntervalId, setPollingIntervalId] = useState<ReturnType<typeof setInterval> | undefined>(undefined);
+  // Live job status: the open stream, its pending reconnect and the slow fallback poll
+  const statusJobIdRef = useRef<string | null>(null);
+  const statusSourceRef = useRef<EventSource | null>(null);
+  const statusReconnectRef = useRef<ReturnType<typeof setTimeout> | undefined>(undefined);
+  const fallbackPollRef = useRef<ReturnType<typeof setInterval> | undefined>(undefined);
   const [resultVideoUrl, setResultVideoUrl] = useState<string | null>(null);
   
   // Script states  
@@ -425,167 +434,213 @@ export default function VideoCreator() {
     }
   };
   
-  // Stop polling
-  const stopPolling = useCallback(() => {
-    if (pollingIntervalId) {
-      clearInterval(pollingIntervalId);
-      setPollingIntervalId(undefined);
+  // Stop the status stream and its fallback poll
+  const stopStatusUpdates = useCallback(() => {
+    statusJobIdRef.current = null;
+    if (statusSourceRef.current) {
+      statusSourceRef.current.close();
+      statusSourceRef.current = null;
+    }
+    if (statusReconnectRef.current) {
+      clearTimeout(statusReconnectRef.current);
+      statusReconnectRef.current = undefined;
+    }
+    if (fallbackPollRef.current) {
+      clearInterval(fallbackPollRef.current);
+      fallbackPollRef.current = undefined;
     }
-  }, [pollingIntervalId]);
+  }, []);
   
-  // Poll job status
-  const pollJobStatus = useCallback(async (jobId: string, token: string) => {
-    if (activeStep === "review" && !jobStatus?.final_url) { // Allow one final poll if final_url might be coming
+  // Apply a job status received from the status stream or the fallback poll
+  const handleStatusData = useCallback((statusData: any) => {
+    if (activeStep === "review" && !jobStatus?.final_url) { // Allow one final update if final_url might be coming
       console.log("Currently in review, but allowing a check for final URL if status was recently completed.")
     }
     
+    console.log("[JOB STATUS] 📡 Raw status data received:", JSON.stringify(statusData));
+    setJobStatus(statusData); // Update jobStatus state immediately
+    
+    // PRIMARY CHECK: Check for completed Creatomate video
+    if (statusData.status === 'completed' && statusData.final_url) {
+      console.log("✅✅✅ [JOB STATUS] Backend confirms: FINAL URL VERIFIED AND VIDEO IS READY! ✅✅✅");
+      console.log("[JOB STATUS] Final URL to display:", statusData.final_url);
+      
+      // --- FORCE VIDEO DISPLAY LOGIC ---
+      setResultVideoUrl(statusData.final_url); 
+      setActiveStep("result"); 
+      setShowVideoReadyNotification(true); 
+      
+      toast.success("Video Ready! Displaying now...", {
+        duration: 10000, // Increased duration
+        position: "top-center",
+        style: { background: 'linear-gradient(to right, #00b09b, #96c93d)', color: 'white', fontWeight: 'bold', fontSize: '1.1rem' },
+      });
+      
+      console.log("[JOB STATUS] Stopping status updates because video is completed and URL is present.");
+      stopStatusUpdates(); 
+      return; // Explicitly return after handling completion
+    }
+    
+    // Handle pending review
+    if (statusData.status === 'pending_review' && statusData.stage === 'script_ready_for_review') {
+      console.log("[JOB STATUS] 📝 Script ready for review. Current scriptLoaded state:", scriptLoaded);
+      if (!scriptLoaded && statusData.generated_script) {
+        console.log("[JOB STATUS] Setting new script from backend.");
+        setEditedScript(statusData.generated_script);
+        setScriptLoaded(true);
+      } else if (scriptLoaded) {
+        console.log("[JOB STATUS] Script already loaded, not overwriting user edits.");
+      }
+      // Only switch to review if not already generating/continued
+      if (activeStep !== "generating") {
+        setActiveStep("review");
+        // Note: We no longer stop updates here to avoid missing status transitions after user continues.
+      }
+      return; // Explicitly return, but status updates continue
+    }
+    
+    // Handle failed status
+    if (statusData.status === 'failed') {
+      console.error("[JOB STATUS] ❌ Generation failed:", statusData.error_message);
+      toast.error(`Generation failed: ${statusData.error_message || 'Unknown error'}`, { duration: 7000 });
+      setActiveStep("upload"); // Or some other appropriate step
+      console.log("[JOB STATUS] Stopping status updates due to failure.");
+      stopStatusUpdates();
+      return; // Explicitly return
+    }
+    
+    // Handle interim processing stages
+    if (statusData.status === 'processing') {
+      console.log(`[JOB STATUS] ⏳ Job still processing. Stage: ${statusData.stage}`);
+      if (statusData.stage === "verifying_url") {
+        console.log("[JOB STATUS] 🔍 URL verification in progress by backend...");
+        toast.info("Verifying final video URL... Almost there!", { position: "top-center" });
+      }
+    } 
+    // SECONDARY CHECK: Double-check for completed status again
+    // This is important in case the URL verification completed
+    // but the message above didn't catch it (race condition)
+    else if (statusData.status === 'completed' && statusData.final_url) {
+      console.log("[JOB STATUS] 🎉 Found completed status with final_url in follow-up check!");
+      console.log("[JOB STATUS] Final URL to display:", statusData.final_url);
+      
+      // Force video display
+      setResultVideoUrl(statusData.final_url); 
+      setActiveStep("result"); 
+      setShowVideoReadyNotification(true); 
+      
+      toast.success("Video Ready! Displaying now...", {
+        duration: 10000,
+        position: "top-center", 
+        style: { background: 'linear-gradient(to right, #00b09b, #96c93d)', color: 'white', fontWeight: 'bold', fontSize: '1.1rem' },
+      });
+      
+      console.log("[JOB STATUS] Stopping status updates because video is completed and URL is present (follow-up check).");
+      stopStatusUpdates(); 
+      return;
+    }
+    else {
+      console.log(`[JOB STATUS] ⏳ Job status is '${statusData.status}', stage is '${statusData.stage}'. Waiting for updates.`);
+    }
+  }, [activeStep, jobStatus, scriptLoaded, stopStatusUpdates]);
+  
+  // The stream's event handlers outlive renders, so they always call the latest handler
+  const handleStatusDataRef = useRef(handleStatusData);
+  useEffect(() => {
+    handleStatusDataRef.current = handleStatusData;
+  }, [handleStatusData]);
+  
+  // Fallback poll of the job status, in case the stream misses something
+  const pollJobStatus = useCallback(async (jobId: string, token: string) => {
     try {
-      console.log(`[POLL STATUS] ⏱️ Checking job ${jobId} status. Current activeStep: ${activeStep}`);
+      console.log(`[POLL STATUS] ⏱️ Fallback check of job ${jobId} status.`);
       const response = await fetch(`${process.env.NEXT_PUBLIC_BACKEND_API_URL}/api/job-status/${jobId}`, {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       
       if (!response.ok) {
         if (response.status === 404) {
-          console.log(`[POLL STATUS] Job ${jobId} not found yet (404), continuing poll.`);
+          console.log(`[POLL STATUS] Job ${jobId} not found yet (404), continuing.`);
           return; 
         }
         console.error(`[POLL STATUS] Failed to fetch job status (${response.status}) for job ${jobId}:`, await response.text());
-        throw new Error(`Failed to fetch job status (${response.status})`);
-      }
-      
-      const statusData = await response.json();
-      console.log("[POLL STATUS] 📡 Raw status data received:", JSON.stringify(statusData));
-      setJobStatus(statusData); // Update jobStatus state immediately
-      
-      // PRIMARY CHECK: Check for completed Creatomate video
-      if (statusData.status === 'completed' && statusData.final_url) {
-        console.log("✅✅✅ [POLL STATUS] Backend confirms: FINAL URL VERIFIED AND VIDEO IS READY! ✅✅✅");
-        console.log("[POLL STATUS] Final URL to display:", statusData.final_url);
-        
-        // --- FORCE VIDEO DISPLAY LOGIC ---
-        setResultVideoUrl(statusData.final_url); 
-        setActiveStep("result"); 
-        setShowVideoReadyNotification(true); 
-        
-        toast.success("Video Ready! Displaying now...", {
-          duration: 10000, // Increased duration
-          position: "top-center",
-          style: { background: 'linear-gradient(to right, #00b09b, #96c93d)', color: 'white', fontWeight: 'bold', fontSize: '1.1rem' },
-        });
-        
-        console.log("[POLL STATUS] Stopping polling because video is completed and URL is present.");
-        stopPolling(); 
-        return; // Explicitly return after handling completion
+        return;
       }
       
-      // Handle pending review
-      if (statusData.status === 'pending_review' && statusData.stage === 'script_ready_for_review') {
-        console.log("[POLL STATUS] 📝 Script ready for review. Current scriptLoaded state:", scriptLoaded);
-        if (!scriptLoaded && statusData.generated_script) {
-          console.log("[POLL STATUS] Setting new script from backend.");
-          setEditedScript(statusData.generated_script);
-          setScriptLoaded(true);
-        } else if (scriptLoaded) {
-          console.log("[POLL STATUS] Script already loaded, not overwriting user edits.");
-        }
-        // Only switch to review if not already generating/continued
-        if (activeStep !== "generating") {
-          setActiveStep("review");
-          // Note: We no longer stop polling here to avoid missing status transitions after user continues.
-        }
-        return; // Explicitly return, but polling continues via interval
+      handleStatusDataRef.current(await response.json());
+    } catch (error) {
+      console.error("[POLL STATUS] Error in pollJobStatus function:", error);
+    }
+  }, []);
+  
+  // Open the job's status stream (SSE). EventSource can't send the Authorization header, so each
+  // connection uses a single-use ticket; when the stream drops, a new one is opened with a new ticket.
+  const openStatusStream = useCallback(async (jobId: string) => {
+    const reconnect = () => {
+      if (statusJobIdRef.current === jobId) {
+        statusReconnectRef.current = setTimeout(() => openStatusStream(jobId), STATUS_STREAM_RECONNECT_MS);
       }
-      
-      // Handle failed status
-      if (statusData.status === 'failed') {
-        console.error("[POLL STATUS] ❌ Generation failed:", statusData.error_message);
-        toast.error(`Generation failed: ${statusData.error_message || 'Unknown error'}`, { duration: 7000 });
-        setActiveStep("upload"); // Or some other appropriate step
-        console.log("[POLL STATUS] Stopping polling due to failure.");
-        stopPolling();
-        return; // Explicitly return
+    };
+    try {
+      const { data: { session } } = await supabase.auth.getSession();
+      if (!session) throw new Error("Not authenticated");
+      const ticketResponse = await fetch(`${process.env.NEXT_PUBLIC_BACKEND_API_URL}/api/job-status/${jobId}/events/ticket`, {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${session.access_token}` }
+      });
+      if (!ticketResponse.ok) {
+        throw new Error(`Failed to open status stream (${ticketResponse.status})`);
       }
+      const { ticket } = await ticketResponse.json();
+      if (statusJobIdRef.current !== jobId) return; // Stopped meanwhile
       
-      // Handle interim processing stages
-      if (statusData.status === 'processing') {
-        console.log(`[POLL STATUS] ⏳ Job still processing. Stage: ${statusData.stage}`);
-        if (statusData.stage === "verifying_url") {
-          console.log("[POLL STATUS] 🔍 URL verification in progress by backend...");
-          toast.info("Verifying final video URL... Almost there!", { position: "top-center" });
+      const source = new EventSource(`${process.env.NEXT_PUBLIC_BACKEND_API_URL}/api/job-status/${jobId}/events?ticket=${encodeURIComponent(ticket)}`);
+      statusSourceRef.current = source;
+      // The stream sends the full status once, then only the fields that changed
+      let currentStatus: any = {};
+      source.addEventListener('status', (event) => {
+        currentStatus = JSON.parse((event as MessageEvent).data);
+        handleStatusDataRef.current(currentStatus);
+      });
+      source.addEventListener('update', (event) => {
+        currentStatus = { ...currentStatus, ...JSON.parse((event as MessageEvent).data) };
+        handleStatusDataRef.current(currentStatus);
+      });
+      source.onerror = () => {
+        // The ticket is spent, so the browser's own reconnect would be rejected
+        source.close();
+        if (statusSourceRef.current === source) {
+          statusSourceRef.current = null;
+          reconnect();
         }
-      } 
-      // SECONDARY CHECK: Double-check for completed status again
-      // This is important in case the URL verification completed
-      // but the message above didn't catch it (race condition)
-      else if (statusData.status === 'completed' && statusData.final_url) {
-        console.log("[POLL STATUS] 🎉 Found completed status with final_url in follow-up check!");
-        console.log("[POLL STATUS] Final URL to display:", statusData.final_url);
-        
-        // Force video display
-        setResultVideoUrl(statusData.final_url); 
-        setActiveStep("result"); 
-        setShowVideoReadyNotification(true); 
-        
-        toast.success("Video Ready! Displaying now...", {
-          duration: 10000,
-          position: "top-center", 
-          style: { background: 'linear-gradient(to right, #00b09b, #96c93d)', color: 'white', fontWeight: 'bold', fontSize: '1.1rem' },
-        });
-        
-        console.log("[POLL STATUS] Stopping polling because video is completed and URL is present (follow-up check).");
-        stopPolling(); 
-        return;
-      }
-      else {
-        console.log(`[POLL STATUS] ⏳ Job status is '${statusData.status}', stage is '${statusData.stage}'. Continuing to poll.`);
-      }
-
+      };
     } catch (error) {
-      console.error("[POLL STATUS] Error in pollJobStatus function:", error);
-      toast.error(`Critical error checking status: ${(error as Error).message}`);
-      // Optionally stop polling on repeated critical errors to prevent spam
-      // stopPolling(); 
+      console.error("[STATUS STREAM] Could not open status stream:", error);
+      reconnect();
     }
-  }, [activeStep, scriptLoaded, stopPolling]);
+  }, [supabase]);
   
-  // Start polling job status
-  const startPollingJobStatus = useCallback((jobId: string, token: string) => {
-    // Clear any existing polling
-    if (pollingIntervalId) {
-      clearInterval(pollingIntervalId);
-      setPollingIntervalId(undefined);
-    }
-    
-    console.log("🚀 STARTING TO POLL FOR VIDEO STATUS - Job ID:", jobId);
-    
-    // Execute one poll immediately
-    pollJobStatus(jobId, token);
+  // Start following the job status: the stream, plus one slow fallback poll
+  const startStatusUpdates = useCallback((jobId: string, token: string) => {
+    stopStatusUpdates();
+    statusJobIdRef.current = jobId;
     
-    // Always set up regular polling; a separate effect will stop it when appropriate
-    let intervalId: ReturnType<typeof setInterval> | undefined = setInterval(() => {
-      console.log("📊 Polling job status...");
-      pollJobStatus(jobId, token);
-    }, 2000); // Poll every 2 seconds for faster updates
-
-    setPollingIntervalId(intervalId);
-  }, [pollingIntervalId, pollJobStatus]);
+    console.log("🚀 STARTING STATUS UPDATES FOR VIDEO - Job ID:", jobId);
+    openStatusStream(jobId);
+    fallbackPollRef.current = setInterval(() => pollJobStatus(jobId, token), STATUS_FALLBACK_POLL_MS);
+  }, [stopStatusUpdates, openStatusStream, pollJobStatus]);
   
-  // Effect to ensure polling is stopped when step changes to review
+  // Effect to ensure status updates are stopped when step changes to review
   useEffect(() => {
     if (activeStep === "review") {
-      stopPolling();
+      stopStatusUpdates();
     }
-  }, [activeStep, stopPolling]);
+  }, [activeStep, stopStatusUpdates]);
   
-  // Cleanup polling on unmount
+  // Cleanup status updates on unmount
   useEffect(() => {
-    return () => {
-      if (pollingIntervalId) {
-        clearInterval(pollingIntervalId);
-      }
-    };
-  }, [pollingIntervalId]);
+    return () => stopStatusUpdates();
+  }, [stopStatusUpdates]);
   
   // AGGRESSIVE STATE SYNC: Effect to force result view when job is complete and URL is available
   useEffect(() => {
@@ -604,16 +659,13 @@ export default function VideoCreator() {
           setResultVideoUrl(jobStatus.final_url); // Update if somehow different
         }
       }
-      // We might also want to stop polling here again, just in case
-      if (pollingIntervalId) {
-        console.log("[EFFECT SYNC] Stopping any lingering polling.");
-        stopPolling();
-      }
+      // We might also want to stop status updates here again, just in case
+      stopStatusUpdates();
     } else {
       console.log("[EFFECT SYNC] Job not yet completed or final_url missing.",
                   `Status: ${jobStatus?.status}, URL: ${jobStatus?.final_url ? 'present' : 'missing'}`);
     }
-  }, [jobStatus, activeStep, resultVideoUrl, stopPolling, pollingIntervalId]); // Added resultVideoUrl, stopPolling, pollingIntervalId
+  }, [jobStatus, activeStep, resultVideoUrl, stopStatusUpdates]);
   
   // Handle generation start
   const handleStartGeneration = async (manual = false) => {
@@ -658,7 +710,7 @@ export default function VideoCreator() {
       setJobStatus(null);
       setResultVideoUrl(null);
       setActiveStep(manual ? "review" : "generating");
-      stopPolling();
+      stopStatusUpdates();
       
       if (manual) {
         setEditedScript(" "); // Initialize with a space for manual mode
@@ -690,18 +742,23 @@ export default function VideoCreator() {
       
       const result = await response.json();
       setGeneratedJobId(result.job_id);
-      toast.success("Video generation started!");
+      const waitSeconds = result.queue?.estimated_wait_seconds;
+      if (typeof waitSeconds === "number" && waitSeconds >= 60) {
+        toast.success(`Video generation queued! Expected to start in about ${Math.round(waitSeconds / 60)} min.`);
+      } else {
+        toast.success("Video generation started!");
+      }
       
       // After successful generation request, decrement local credit count
       setUserCredits(prev => prev !== null ? prev - 1 : null);
       
-      // Start polling for status updates
-      // For manual mode, we don't start polling here, as no backend job is created yet.
-      // Polling will start if/when the user continues from the review step.
-      // However, the current logic enqueues for both, so polling is needed.
+      // Start following status updates
+      // For manual mode, we don't start updates here, as no backend job is created yet.
+      // Updates will start if/when the user continues from the review step.
+      // However, the current logic enqueues for both, so updates are needed.
       // If manual mode truly skipped initial backend call, this would change.
       // For now, the backend receives the job for both, worker handles manual_script_mode.
-      startPollingJobStatus(result.job_id, token);
+      startStatusUpdates(result.job_id, token);
       
     } catch (error) {
       console.error("Generation start error:", error);
@@ -721,7 +778,7 @@ export default function VideoCreator() {
     
     setIsGenerating(true);
     setActiveStep("generating");
-    stopPolling();
+    stopStatusUpdates();
     
     try {
       const { data: { session }, error: sessionError } = await supabase.auth.getSession();
@@ -749,8 +806,8 @@ export default function VideoCreator() {
       
       toast.success("Generation continuing!");
       
-      // Start polling again
-      startPollingJobStatus(generatedJobId, token);
+      // Start following status updates again
+      startStatusUpdates(generatedJobId, token);
       
     } catch (error) {
       console.error("Generation continuation error:", error);
@@ -1047,33 +1104,6 @@ export default function VideoCreator() {
     return () => body.classList.remove("hide-main-header");
   }, [activeStep]);
 
-  // --------- Fallback long-poller if regular polling misses the completion ---------
-  useEffect(() => {
-    if (!generatedJobId || resultVideoUrl) return; // nothing to do
-    let intervalId: ReturnType<typeof setInterval> | undefined;
-    const setupFallback = async () => {
-      const { data: { session } } = await supabase.auth.getSession();
-      if (!session) return;
-      const token = session.access_token;
-      intervalId = setInterval(async () => {
-        try {
-          const res = await fetch(`${process.env.NEXT_PUBLIC_BACKEND_API_URL}/api/job-status/${generatedJobId}`, {
-            headers: { 'Authorization': `Bearer ${token}` }
-          });
-          if (!res.ok) return;
-          const data = await res.json();
-          if (data.status === 'completed' && data.final_url) {
-            setResultVideoUrl(data.final_url);
-            setJobStatus(data);
-            setActiveStep('result');
-            clearInterval(intervalId);
-          }
-        } catch {}
-      }, 15000); // every 15s
-    };
-    setupFallback();
-    return () => { if (intervalId) clearInterval(intervalId); };
-  }, [generatedJobId, resultVideoUrl, supabase, activeStep]);
 
   return (
     <div className="space-y-8">